@@ -0,0 +1,6 @@
+"""
+Benchmarks for the Laboratory Exam Manager application.
+
+Run a benchmark from the repository root, e.g.:
+    python -m benchmarks.bench_reference_index
+"""
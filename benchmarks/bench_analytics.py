@@ -0,0 +1,85 @@
+"""
+Benchmark: abnormal rates over exam history, nested models vs. columnar frame.
+"""
+import random
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from data.defaults import REFERENCE_RANGES
+from models.exam import CompleteExamResult
+from utils.analytics import (
+    ABNORMAL_RATE_COLUMNS, abnormal_rates, read_parquet, records_to_frame, write_parquet
+)
+
+N_RECORDS = 20_000
+
+def build_records(n: int) -> List[Tuple[int, CompleteExamResult]]:
+    """Builds n records covering every exam of the reference table."""
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    records = []
+    for i in range(n):
+        results = {}
+        for category, exams in REFERENCE_RANGES.items():
+            results[category] = {}
+            for exam, ref in exams.items():
+                value = rng.uniform(ref['min'] * 0.7, ref['max'] * 1.3)
+                status = "BAIXO" if value < ref['min'] else "ALTO" if value > ref['max'] else "NORMAL"
+                results[category][exam] = {
+                    'value': value,
+                    'unit': ref['unit'],
+                    'reference': f"{ref['min']}-{ref['max']}",
+                    'status': status
+                }
+        records.append((i + 1, CompleteExamResult.from_trusted({
+            'exam_type': "ROTINA",
+            'date': start + timedelta(days=i % 365),
+            'results': results,
+            'patient_id': f"P{i % 500:04d}"
+        })))
+    return records
+
+def nested_rates(records: List[Tuple[int, CompleteExamResult]]) -> dict:
+    """Abnormal rates computed by walking the nested models."""
+    counts = defaultdict(lambda: [0, 0, 0])
+    for _, record in records:
+        for category, exams in record.results.items():
+            for exam, res in exams.items():
+                c = counts[(category, exam)]
+                c[0] += 1
+                c[1] += res.status == "ALTO"
+                c[2] += res.status == "BAIXO"
+    return {key: ((alto + baixo) / total) for key, (total, alto, baixo) in counts.items()}
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+def main() -> None:
+    records = build_records(N_RECORDS)
+    df, t_flatten = timed(lambda: records_to_frame(records))
+    _, t_nested = timed(lambda: nested_rates(records))
+    _, t_frame = timed(lambda: abnormal_rates(df[ABNORMAL_RATE_COLUMNS]))
+    
+    print(f"Records: {N_RECORDS}, values: {len(df)}")
+    print(f"flatten to frame          : {t_flatten * 1000:8.1f} ms (once)")
+    print(f"abnormal rates, nested    : {t_nested * 1000:8.1f} ms")
+    print(f"abnormal rates, columnar  : {t_frame * 1000:8.1f} ms")
+    
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            _, t_write = timed(lambda: write_parquet(df, root))
+            _, t_read = timed(lambda: read_parquet(root, columns=ABNORMAL_RATE_COLUMNS))
+            _, t_pruned = timed(lambda: read_parquet(root, columns=ABNORMAL_RATE_COLUMNS, categories=["GLICEMIA"]))
+            print(f"parquet write             : {t_write * 1000:8.1f} ms")
+            print(f"parquet read (3 columns)  : {t_read * 1000:8.1f} ms")
+            print(f"parquet read (1 category) : {t_pruned * 1000:8.1f} ms")
+    except ImportError as e:
+        print(f"Parquet skipped: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark: rows/s of the chunked result file ingestion on a synthetic 1M-row file.
+"""
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from data.defaults import ANALYZER_CODES, REFERENCE_RANGES
+from utils.history_store import ExamHistoryStore
+from utils.ingest import DEFAULT_COLUMNS, INGEST_CHUNK_SIZE, build_records, ingest_results, prepare_chunk, read_result_chunks
+from utils.reference_index import REFERENCE_INDEX
+
+N_ROWS = 1_000_000
+ROWS_PER_SAMPLE = 20
+
+def write_result_file(path: str, n: int, block: int = 100_000) -> None:
+    """
+    Writes n result rows, ROWS_PER_SAMPLE per sample, with comma decimals and a few bad rows.
+    
+    Rows are generated in blocks, so the peak memory measured afterwards is the ingestion's.
+    """
+    rng = np.random.default_rng(42)
+    codes = np.array(list(ANALYZER_CODES))
+    maxs = np.array([REFERENCE_RANGES[cat][exam]['max'] for cat, exam in ANALYZER_CODES.values()])
+    
+    for offset in range(0, n, block):
+        sample = np.arange(offset, min(offset + block, n)) // ROWS_PER_SAMPLE
+        code_idx = rng.integers(0, len(codes), len(sample))
+        values = np.round(rng.uniform(0, maxs[code_idx] * 1.3), 2).astype(str)
+        values = np.char.replace(values, '.', ',')
+        values[rng.random(len(sample)) < 0.001] = "?"
+        days = pd.Timestamp("2020-01-01") + pd.to_timedelta(sample % 1800, unit="D")
+        
+        pd.DataFrame({
+            'sample_id': np.char.add("S", sample.astype(str)),
+            'patient_id': np.char.add("P", (sample % 20_000).astype(str)),
+            'date': days.strftime("%Y-%m-%d"),
+            'code': codes[code_idx],
+            'value': values
+        }).to_csv(path, mode='a' if offset else 'w', header=not offset, index=False)
+
+def main() -> None:
+    code_ids = {code: REFERENCE_INDEX.get_id(cat, exam) for code, (cat, exam) in ANALYZER_CODES.items()}
+    
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "results.csv")
+        t0 = time.perf_counter()
+        write_result_file(path, N_ROWS)
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"Rows: {N_ROWS}, file: {size_mb:.1f} MB (generated in {time.perf_counter() - t0:.1f} s)")
+        
+        # Parsing, validation and grouping alone, without the database
+        t0 = time.perf_counter()
+        records = 0
+        for chunk in read_result_chunks(path, DEFAULT_COLUMNS, chunk_size=INGEST_CHUNK_SIZE):
+            rows, _ = prepare_chunk(chunk, code_ids)
+            records += sum(1 for _ in build_records(rows))
+        t_parse = time.perf_counter() - t0
+        print(f"parse + validate + group  : {t_parse:8.2f} s  {N_ROWS / t_parse:12,.0f} rows/s  ({records} records)")
+        
+        # Full pipeline into a fresh history store
+        store = ExamHistoryStore(os.path.join(root, "history.db"))
+        report = ingest_results(path, store)
+        print(
+            f"full ingestion            : {report.elapsed_seconds:8.2f} s  "
+            f"{report.rows / report.elapsed_seconds:12,.0f} rows/s  "
+            f"({report.records} records, {report.error_count} errors)"
+        )
+        store.close()
+    
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"peak RSS                  : {peak_mb:8.1f} MB (chunk size {INGEST_CHUNK_SIZE} rows)")
+
+if __name__ == "__main__":
+    main()
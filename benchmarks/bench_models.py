@@ -0,0 +1,50 @@
+"""
+Benchmark: construct/dump cost per 10k profiles, validated vs. trusted paths.
+"""
+import timeit
+import warnings
+from datetime import datetime
+from typing import Any, Dict, List
+
+from data.defaults import REFERENCE_RANGES
+from models.exam import ExamProfile, ExamProfileView
+
+N_PROFILES = 10_000
+REPEAT = 3
+
+def build_dicts(n: int) -> List[Dict[str, Any]]:
+    """Builds n profile dicts in the shape kept by the profile stores."""
+    categories = {cat: list(exams) for cat, exams in REFERENCE_RANGES.items()}
+    now = datetime.now()
+    return [
+        {
+            'name': f"Perfil {i}",
+            'categories': categories,
+            'description': "Perfil de teste",
+            'is_default': False,
+            'created_at': now,
+            'last_used': now
+        }
+        for i in range(n)
+    ]
+
+def main() -> None:
+    warnings.simplefilter('ignore', DeprecationWarning)
+    dicts = build_dicts(N_PROFILES)
+    models = [ExamProfile(**d) for d in dicts]
+    
+    cases = {
+        "construct ExamProfile(**d)       ": lambda: [ExamProfile(**d) for d in dicts],
+        "construct from_trusted(d)        ": lambda: [ExamProfile.from_trusted(d) for d in dicts],
+        "construct ExamProfileView        ": lambda: [ExamProfileView.from_trusted(d) for d in dicts],
+        "dump .dict()                     ": lambda: [m.dict() for m in models],
+        "dump .to_trusted_dict()          ": lambda: [m.to_trusted_dict() for m in models],
+    }
+    
+    print(f"Profiles per run: {N_PROFILES}")
+    for label, fn in cases.items():
+        t = min(timeit.repeat(fn, number=1, repeat=REPEAT))
+        print(f"{label}: {t * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Benchmark: per-report PDF setup cost, rebuilt styles vs. the shared style registry.
+"""
+import timeit
+
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import TableStyle
+
+from utils.pdf_exporter import PDFExporter, get_style_registry
+
+N_REPORTS = 1_000
+TABLES_PER_REPORT = 6
+REPEAT = 5
+
+def legacy_setup() -> None:
+    """Reproduces the per-exporter style setup done before the shared registry."""
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name='CatHeader', parent=styles['Heading2'], spaceAfter=10, spaceBefore=20))
+    for _ in range(TABLES_PER_REPORT):
+        TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 14),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ])
+
+def shared_setup() -> None:
+    """Per-exporter setup with the shared registry."""
+    exporter = PDFExporter("ROTINA", "01/01/2025", {})
+    for _ in range(TABLES_PER_REPORT):
+        exporter._registry.table_style
+
+def main() -> None:
+    get_style_registry()
+    t_legacy = min(timeit.repeat(legacy_setup, number=N_REPORTS, repeat=REPEAT))
+    t_shared = min(timeit.repeat(shared_setup, number=N_REPORTS, repeat=REPEAT))
+    
+    print(f"Reports per run: {N_REPORTS} ({TABLES_PER_REPORT} tables each)")
+    print(f"Rebuilt styles:  {t_legacy / N_REPORTS * 1e6:.1f} us/report")
+    print(f"Shared registry: {t_shared / N_REPORTS * 1e6:.1f} us/report")
+    print(f"Speedup: {t_legacy / t_shared:.1f}x")
+
+if __name__ == "__main__":
+    main()
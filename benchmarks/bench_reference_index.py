@@ -0,0 +1,75 @@
+"""
+Benchmark: cost of 10k status classifications, string parsing vs. compiled index,
+and of resolving sex- and age-specific ranges one by one vs. for a whole column.
+"""
+import random
+import timeit
+from typing import Dict, List
+
+import numpy as np
+
+from data.defaults import REFERENCE_RANGES
+from utils.formatter import get_status_from_values, get_result_status
+from utils.reference_index import REFERENCE_INDEX
+
+N_CLASSIFICATIONS = 10_000
+N_RESOLUTIONS = 1_000_000
+REPEAT = 5
+
+def build_entries(n: int) -> List[Dict]:
+    """Builds n random result entries in both the legacy and the indexed shape."""
+    rng = random.Random(42)
+    keys = [(cat, exam) for cat, exams in REFERENCE_RANGES.items() for exam in exams]
+    entries = []
+    for _ in range(n):
+        cat, exam = rng.choice(keys)
+        ref = REFERENCE_RANGES[cat][exam]
+        value = str(round(rng.uniform(0, ref['max'] * 1.5), 2))
+        entries.append({
+            'value': value,
+            'reference': f"{ref['min']}-{ref['max']}",
+            'ref_id': REFERENCE_INDEX.get_id(cat, exam)
+        })
+    return entries
+
+def main() -> None:
+    entries = build_entries(N_CLASSIFICATIONS)
+    
+    def legacy() -> None:
+        for vals in entries:
+            get_status_from_values(vals['value'], vals['reference'])
+    
+    def indexed() -> None:
+        for vals in entries:
+            get_result_status(vals)
+    
+    t_legacy = min(timeit.repeat(legacy, number=1, repeat=REPEAT))
+    t_indexed = min(timeit.repeat(indexed, number=1, repeat=REPEAT))
+    
+    print(f"Classifications per run: {N_CLASSIFICATIONS}")
+    print(f"get_status_from_values (parse 'min-max'): {t_legacy * 1000:.2f} ms")
+    print(f"get_result_status (compiled index):       {t_indexed * 1000:.2f} ms")
+    print(f"Speedup: {t_legacy / t_indexed:.2f}x")
+    
+    rng = np.random.default_rng(42)
+    ref_ids = rng.integers(0, len(REFERENCE_INDEX), N_RESOLUTIONS)
+    sexes = rng.choice(np.array(["M", "F", None], dtype=object), N_RESOLUTIONS)
+    ages = rng.uniform(0, 95, N_RESOLUTIONS)
+    sample = list(zip(ref_ids[:N_CLASSIFICATIONS].tolist(), sexes[:N_CLASSIFICATIONS], ages[:N_CLASSIFICATIONS].tolist()))
+    
+    def scalar() -> None:
+        for ref_id, sex, age in sample:
+            REFERENCE_INDEX.resolve(ref_id, sex, age)
+    
+    def vectorized() -> None:
+        REFERENCE_INDEX.resolve_many(ref_ids, sexes, ages)
+    
+    t_scalar = min(timeit.repeat(scalar, number=1, repeat=REPEAT)) / N_CLASSIFICATIONS
+    t_vector = min(timeit.repeat(vectorized, number=1, repeat=REPEAT))
+    
+    print()
+    print(f"resolve (bisect per value):        {t_scalar * 1e6:.2f} µs per value")
+    print(f"resolve_many ({N_RESOLUTIONS} values):    {t_vector * 1000:.1f} ms ({t_vector / N_RESOLUTIONS * 1e9:.0f} ns per value)")
+
+if __name__ == "__main__":
+    main()
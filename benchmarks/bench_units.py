@@ -0,0 +1,56 @@
+"""
+Benchmark: cost of converting 1M results between conventional and SI units,
+one by one vs. for a whole column, and of reading a column with mixed units.
+"""
+import timeit
+
+import numpy as np
+
+from utils.reference_index import REFERENCE_INDEX
+from utils.units import UNIT_CONVENTIONAL, UNIT_REGISTRY, UNIT_SI
+
+N_CONVERSIONS = 1_000_000
+N_SCALAR = 10_000
+REPEAT = 5
+
+def main() -> None:
+    rng = np.random.default_rng(42)
+    ref_ids = rng.integers(0, len(REFERENCE_INDEX), N_CONVERSIONS)
+    values = rng.uniform(0, 200, N_CONVERSIONS)
+    
+    # Mixed units as a partner file would send them: conventional, SI or blank
+    units = np.where(
+        rng.random(N_CONVERSIONS) < 0.5,
+        UNIT_REGISTRY.unit_array(UNIT_SI)[ref_ids],
+        UNIT_REGISTRY.unit_array(UNIT_CONVENTIONAL)[ref_ids]
+    )
+    units[rng.random(N_CONVERSIONS) < 0.1] = None
+    
+    sample = list(zip(values[:N_SCALAR].tolist(), ref_ids[:N_SCALAR].tolist()))
+    
+    def scalar() -> None:
+        for value, ref_id in sample:
+            UNIT_REGISTRY.convert(value, ref_id, UNIT_SI)
+    
+    def to_si() -> None:
+        UNIT_REGISTRY.convert(values, ref_ids, UNIT_SI)
+    
+    def from_si() -> None:
+        UNIT_REGISTRY.to_conventional(values, ref_ids, UNIT_SI)
+    
+    def mixed() -> None:
+        UNIT_REGISTRY.to_canonical(values, ref_ids, units)
+    
+    t_scalar = min(timeit.repeat(scalar, number=1, repeat=REPEAT)) / N_SCALAR
+    t_to_si = min(timeit.repeat(to_si, number=1, repeat=REPEAT))
+    t_from_si = min(timeit.repeat(from_si, number=1, repeat=REPEAT))
+    t_mixed = min(timeit.repeat(mixed, number=1, repeat=REPEAT))
+    
+    print(f"Values per run: {N_CONVERSIONS}")
+    print(f"convert (one value per call):  {t_scalar * 1e6:.2f} µs per value ({t_scalar * N_CONVERSIONS:.1f} s per run)")
+    print(f"convert to SI:                 {t_to_si * 1000:.1f} ms ({t_to_si / N_CONVERSIONS * 1e9:.1f} ns per value)")
+    print(f"to_conventional from SI:       {t_from_si * 1000:.1f} ms ({t_from_si / N_CONVERSIONS * 1e9:.1f} ns per value)")
+    print(f"to_canonical (mixed units):    {t_mixed * 1000:.1f} ms ({t_mixed / N_CONVERSIONS * 1e9:.1f} ns per value)")
+
+if __name__ == "__main__":
+    main()
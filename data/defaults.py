@@ -18,11 +18,29 @@ CHECKUP_CATEGORIES: Dict[str, List[str]] = {
     ]
 }
 
-# Reference ranges for lab exams
+# Reference ranges for lab exams. 'min'/'max' is the range used when sex and
+# age are unknown; sex-specific bounds (gender_specific) and age bands
+# ([age_min, age_max) in years, optionally for one sex) refine it, the most
+# specific match winning (see utils.reference_index)
 REFERENCE_RANGES = {
     'HEMOGRAMA': {
-        'Hemoglobina': {'min': 13.5, 'max': 17.5, 'unit': 'g/dL'},
-        'Hematócrito': {'min': 41.0, 'max': 53.0, 'unit': '%'},
+        'Hemoglobina': {
+            'min': 13.5, 'max': 17.5, 'unit': 'g/dL',
+            'gender_specific': True, 'male_min': 13.5, 'male_max': 17.5, 'female_min': 12.0, 'female_max': 15.5,
+            'age_bands': [
+                {'age_min': 0, 'age_max': 2, 'min': 10.5, 'max': 13.5},
+                {'age_min': 2, 'age_max': 12, 'min': 11.5, 'max': 15.5},
+                {'age_min': 12, 'age_max': 18, 'sex': 'F', 'min': 12.0, 'max': 16.0},
+                {'age_min': 12, 'age_max': 18, 'sex': 'M', 'min': 13.0, 'max': 16.0}
+            ]
+        },
+        'Hematócrito': {
+            'min': 41.0, 'max': 53.0, 'unit': '%',
+            'gender_specific': True, 'male_min': 41.0, 'male_max': 53.0, 'female_min': 36.0, 'female_max': 46.0,
+            'age_bands': [
+                {'age_min': 0, 'age_max': 12, 'min': 34.0, 'max': 44.0}
+            ]
+        },
         'Leucócitos': {'min': 4.0, 'max': 10.0, 'unit': 'x 10³/µL'},
         'Plaquetas': {'min': 150.0, 'max': 450.0, 'unit': 'x 10³/µL'},
         'VCM': {'min': 80.0, 'max': 100.0, 'unit': 'fL'},
@@ -34,17 +52,27 @@ REFERENCE_RANGES = {
     'GLICEMIA': {
         'Glicose': {'min': 70.0, 'max': 99.0, 'unit': 'mg/dL'},
         'Hemoglobina Glicada': {'min': 4.0, 'max': 5.7, 'unit': '%'},
-        'Insulina': {'min': 2.6, 'max': 24.9, 'unit': 'µU/mL'}
+        'Insulina': {'min': 2.6, 'max': 24.9, 'unit': 'µU/mL'},
+        'HOMA-IR': {'min': 0, 'max': 2.7, 'unit': ''}
     },
     'FUNÇÃO RENAL': {
-        'Creatinina': {'min': 0.7, 'max': 1.2, 'unit': 'mg/dL'},
-        'Ureia': {'min': 15.0, 'max': 45.0, 'unit': 'mg/dL'}
+        'Creatinina': {
+            'min': 0.7, 'max': 1.2, 'unit': 'mg/dL',
+            'gender_specific': True, 'male_min': 0.7, 'male_max': 1.2, 'female_min': 0.5, 'female_max': 0.9,
+            'age_bands': [
+                {'age_min': 0, 'age_max': 12, 'min': 0.3, 'max': 0.7}
+            ]
+        },
+        'Ureia': {'min': 15.0, 'max': 45.0, 'unit': 'mg/dL'},
+        'TFG (CKD-EPI)': {'min': 90.0, 'max': 200.0, 'unit': 'mL/min/1,73m²'}
     },
     'PERFIL LIPÍDICO': {
         'Colesterol Total': {'min': 0, 'max': 200.0, 'unit': 'mg/dL'},
         'HDL': {'min': 40.0, 'max': 60.0, 'unit': 'mg/dL'},
         'LDL': {'min': 0, 'max': 130.0, 'unit': 'mg/dL'},
-        'Triglicerídeos': {'min': 0, 'max': 150.0, 'unit': 'mg/dL'}
+        'Triglicerídeos': {'min': 0, 'max': 150.0, 'unit': 'mg/dL'},
+        'Colesterol Não-HDL': {'min': 0, 'max': 160.0, 'unit': 'mg/dL'},
+        'LDL (Friedewald)': {'min': 0, 'max': 130.0, 'unit': 'mg/dL'}
     },
     'FUNÇÃO TIREOIDEANA': {
         'TSH': {'min': 0.4, 'max': 4.0, 'unit': 'mUI/L'},
@@ -52,7 +80,15 @@ REFERENCE_RANGES = {
         'T3': {'min': 80.0, 'max': 200.0, 'unit': 'ng/dL'}
     },
     'PSA': {
-        'PSA Total': {'min': 0, 'max': 4.0, 'unit': 'ng/mL'},
+        'PSA Total': {
+            'min': 0, 'max': 4.0, 'unit': 'ng/mL',
+            'age_bands': [
+                {'age_min': 0, 'age_max': 50, 'min': 0, 'max': 2.5},
+                {'age_min': 50, 'age_max': 60, 'min': 0, 'max': 3.5},
+                {'age_min': 60, 'age_max': 70, 'min': 0, 'max': 4.5},
+                {'age_min': 70, 'min': 0, 'max': 6.5}
+            ]
+        },
         'PSA Livre': {'min': 0, 'max': 1.0, 'unit': 'ng/mL'},
     },
     'HORMÔNIOS FEMININOS': {
@@ -63,6 +99,114 @@ REFERENCE_RANGES = {
     }
 }
 
+# Analytes computed from other results instead of entered: category -> exam ->
+# formula name (see utils.derived.FORMULAS), input exams as (category, exam),
+# in the order the formula takes them, and whether the formula also takes
+# the patient's sex and age. Inputs may themselves be derived. Their reference
+# ranges are in REFERENCE_RANGES, but default profiles leave them out.
+DERIVED_ANALYTES = {
+    'GLICEMIA': {
+        'HOMA-IR': {
+            'formula': 'homa_ir',
+            'inputs': [('GLICEMIA', 'Glicose'), ('GLICEMIA', 'Insulina')]
+        }
+    },
+    'FUNÇÃO RENAL': {
+        'TFG (CKD-EPI)': {
+            'formula': 'ckd_epi_2021',
+            'inputs': [('FUNÇÃO RENAL', 'Creatinina')],
+            'patient': True
+        }
+    },
+    'PERFIL LIPÍDICO': {
+        'Colesterol Não-HDL': {
+            'formula': 'difference',
+            'inputs': [('PERFIL LIPÍDICO', 'Colesterol Total'), ('PERFIL LIPÍDICO', 'HDL')]
+        },
+        'LDL (Friedewald)': {
+            'formula': 'friedewald_ldl',
+            'inputs': [('PERFIL LIPÍDICO', 'Colesterol Não-HDL'), ('PERFIL LIPÍDICO', 'Triglicerídeos')]
+        }
+    }
+}
+
+# SI units of the exams whose REFERENCE_RANGES unit is conventional:
+# SI value = conventional value * factor + offset (see utils.units).
+# Results are always stored in the conventional unit
+SI_UNITS = {
+    'HEMOGRAMA': {
+        'Hemoglobina': {'unit': 'g/L', 'factor': 10.0},
+        'Hematócrito': {'unit': 'L/L', 'factor': 0.01},
+        'Leucócitos': {'unit': 'x 10⁹/L', 'factor': 1.0},
+        'Plaquetas': {'unit': 'x 10⁹/L', 'factor': 1.0},
+        'CHCM': {'unit': 'g/L', 'factor': 10.0}
+    },
+    'GLICEMIA': {
+        'Glicose': {'unit': 'mmol/L', 'factor': 0.0555},
+        # IFCC units: mmol/mol = 10.929 x (NGSP % - 2.15)
+        'Hemoglobina Glicada': {'unit': 'mmol/mol', 'factor': 10.929, 'offset': -23.5},
+        'Insulina': {'unit': 'pmol/L', 'factor': 6.0}
+    },
+    'FUNÇÃO RENAL': {
+        'Creatinina': {'unit': 'µmol/L', 'factor': 88.4},
+        'Ureia': {'unit': 'mmol/L', 'factor': 0.1665}
+    },
+    'PERFIL LIPÍDICO': {
+        'Colesterol Total': {'unit': 'mmol/L', 'factor': 0.02586},
+        'HDL': {'unit': 'mmol/L', 'factor': 0.02586},
+        'LDL': {'unit': 'mmol/L', 'factor': 0.02586},
+        'Triglicerídeos': {'unit': 'mmol/L', 'factor': 0.01129},
+        'Colesterol Não-HDL': {'unit': 'mmol/L', 'factor': 0.02586},
+        'LDL (Friedewald)': {'unit': 'mmol/L', 'factor': 0.02586}
+    },
+    'FUNÇÃO TIREOIDEANA': {
+        'T4 Livre': {'unit': 'pmol/L', 'factor': 12.87},
+        'T3': {'unit': 'nmol/L', 'factor': 0.01536}
+    },
+    'PSA': {
+        'PSA Total': {'unit': 'µg/L', 'factor': 1.0},
+        'PSA Livre': {'unit': 'µg/L', 'factor': 1.0}
+    },
+    'HORMÔNIOS FEMININOS': {
+        'Estradiol': {'unit': 'pmol/L', 'factor': 3.671},
+        'FSH': {'unit': 'UI/L', 'factor': 1.0},
+        'LH': {'unit': 'UI/L', 'factor': 1.0},
+        'Progesterona': {'unit': 'nmol/L', 'factor': 3.18}
+    }
+}
+
+# Analyzer/LIS test codes mapped to (category, exam) of REFERENCE_RANGES,
+# used when ingesting result files exported by the lab instruments
+ANALYZER_CODES = {
+    'HGB': ('HEMOGRAMA', 'Hemoglobina'),
+    'HCT': ('HEMOGRAMA', 'Hematócrito'),
+    'WBC': ('HEMOGRAMA', 'Leucócitos'),
+    'PLT': ('HEMOGRAMA', 'Plaquetas'),
+    'MCV': ('HEMOGRAMA', 'VCM'),
+    'MCH': ('HEMOGRAMA', 'HCM'),
+    'MCHC': ('HEMOGRAMA', 'CHCM'),
+    'RDW': ('HEMOGRAMA', 'RDW'),
+    'MPV': ('HEMOGRAMA', 'VPM'),
+    'GLU': ('GLICEMIA', 'Glicose'),
+    'HBA1C': ('GLICEMIA', 'Hemoglobina Glicada'),
+    'INS': ('GLICEMIA', 'Insulina'),
+    'CREA': ('FUNÇÃO RENAL', 'Creatinina'),
+    'UREA': ('FUNÇÃO RENAL', 'Ureia'),
+    'CHOL': ('PERFIL LIPÍDICO', 'Colesterol Total'),
+    'HDL': ('PERFIL LIPÍDICO', 'HDL'),
+    'LDL': ('PERFIL LIPÍDICO', 'LDL'),
+    'TRIG': ('PERFIL LIPÍDICO', 'Triglicerídeos'),
+    'TSH': ('FUNÇÃO TIREOIDEANA', 'TSH'),
+    'FT4': ('FUNÇÃO TIREOIDEANA', 'T4 Livre'),
+    'T3': ('FUNÇÃO TIREOIDEANA', 'T3'),
+    'TPSA': ('PSA', 'PSA Total'),
+    'FPSA': ('PSA', 'PSA Livre'),
+    'E2': ('HORMÔNIOS FEMININOS', 'Estradiol'),
+    'FSH': ('HORMÔNIOS FEMININOS', 'FSH'),
+    'LH': ('HORMÔNIOS FEMININOS', 'LH'),
+    'PROG': ('HORMÔNIOS FEMININOS', 'Progesterona')
+}
+
 # Default descriptions for profiles
 DEFAULT_DESCRIPTIONS = {
     'SAÚDE DO HOMEM': "Checkup voltado à saúde masculina",
@@ -13,6 +13,7 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(me
 
 # Import local modules
 from utils.profile_manager import ExamProfileManager
+from utils.resources import get_profile_store
 from data.defaults import REFERENCE_RANGES, CHECKUP_CATEGORIES
 
 # Configure Streamlit page
@@ -25,7 +26,7 @@ st.set_page_config(
 
 # Initialize session state variables
 if 'profile_manager' not in st.session_state:
-    st.session_state.profile_manager = ExamProfileManager()
+    st.session_state.profile_manager = ExamProfileManager(get_profile_store())
 
 if 'current_exam_results' not in st.session_state:
     st.session_state.current_exam_results = {}
@@ -72,13 +73,8 @@ def main():
     
     # Recently used profiles
     st.header("Perfis Recentes")
-    profiles = st.session_state.profile_manager.get_all_profiles()
-    
-    # Sort profiles by last used date (most recent first)
-    profiles.sort(key=lambda p: p['last_used'], reverse=True)
-    
     # Show top 3 most recently used profiles
-    recent_profiles = profiles[:3]
+    recent_profiles = st.session_state.profile_manager.recent(3)
     
     if recent_profiles:
         col1, col2, col3 = st.columns(3)
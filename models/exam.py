@@ -2,9 +2,47 @@
 Data models for exam profiles and reference ranges.
 """
 from datetime import datetime
-from typing import Dict, List, Optional, Any, Set
+from typing import Dict, List, Literal, Mapping, NamedTuple, Optional, Any, Set, Tuple
 from pydantic import BaseModel
 
+# Models are validated when built from untrusted input (forms, JSON imports).
+# Data the application serialized itself can be reloaded with from_trusted(),
+# which skips validation, and dumped with to_trusted_dict(). pydantic-core
+# validation is already fast, so from_trusted() saves little (about 15-30%
+# for large profiles in benchmarks/bench_models.py, nothing for small ones);
+# the dump (about 3x) and the read-only views (about 2.5x) save more.
+
+_object_setattr = object.__setattr__
+
+def _construct(cls: Any, values: Dict[str, Any]) -> Any:
+    """
+    Creates a model instance from complete, already valid field values.
+    
+    Equivalent to BaseModel.model_construct() with every field given, minus
+    its per-field default handling, which makes it cheaper than model_construct()
+    (not than validation, which costs about the same for small models).
+    """
+    instance = cls.__new__(cls)
+    _object_setattr(instance, '__dict__', values)
+    _object_setattr(instance, '__pydantic_fields_set__', set(values))
+    _object_setattr(instance, '__pydantic_extra__', None)
+    _object_setattr(instance, '__pydantic_private__', None)
+    return instance
+
+def as_datetime(value: Any) -> datetime:
+    """Returns a datetime from a datetime or an ISO string."""
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+class AgeBandRange(BaseModel):
+    """Reference bounds for an age band [age_min, age_max), optionally for one sex only."""
+    age_min: float = 0.0
+    age_max: Optional[float] = None
+    sex: Optional[Literal['M', 'F']] = None
+    min: float
+    max: float
+
 class ReferenceRange(BaseModel):
     """Represents a reference range for an exam."""
     min: Optional[float] = None
@@ -15,6 +53,7 @@ class ReferenceRange(BaseModel):
     male_max: Optional[float] = None
     female_min: Optional[float] = None
     female_max: Optional[float] = None
+    age_bands: List[AgeBandRange] = []
     description: Optional[str] = None
 
 class ExamProfile(BaseModel):
@@ -37,6 +76,66 @@ class ExamProfile(BaseModel):
     def get_category_count(self) -> int:
         """Returns the number of categories with at least one exam."""
         return len([cat for cat, exams in self.categories.items() if exams])
+    
+    @classmethod
+    def from_trusted(cls, data: Mapping[str, Any]) -> "ExamProfile":
+        """
+        Builds a profile from data the application serialized itself, without validation.
+        
+        Args:
+            data: Profile data as produced by to_trusted_dict() or dict().
+            
+        Returns:
+            ExamProfile instance.
+        """
+        return _construct(cls, {
+            'name': data['name'],
+            'categories': {cat: list(exams) for cat, exams in data['categories'].items()},
+            'description': data.get('description', ""),
+            'is_default': data.get('is_default', False),
+            'created_at': as_datetime(data['created_at']),
+            'last_used': as_datetime(data['last_used'])
+        })
+    
+    def to_trusted_dict(self) -> Dict[str, Any]:
+        """Returns the profile data as a plain dict, without the serialization machinery."""
+        return {
+            'name': self.name,
+            'categories': {cat: list(exams) for cat, exams in self.categories.items()},
+            'description': self.description,
+            'is_default': self.is_default,
+            'created_at': self.created_at,
+            'last_used': self.last_used
+        }
+
+class ExamProfileView(NamedTuple):
+    """Read-only, lightweight view of a profile."""
+    name: str
+    categories: Mapping[str, Tuple[str, ...]]
+    description: str
+    is_default: bool
+    created_at: datetime
+    last_used: datetime
+    
+    @classmethod
+    def from_trusted(cls, data: Mapping[str, Any]) -> "ExamProfileView":
+        """Builds a view from data the application serialized itself."""
+        return cls(
+            data['name'],
+            {cat: tuple(exams) for cat, exams in data['categories'].items()},
+            data.get('description', ""),
+            data.get('is_default', False),
+            as_datetime(data['created_at']),
+            as_datetime(data['last_used'])
+        )
+    
+    def get_exam_count(self) -> int:
+        """Returns the total number of exams contained in the profile."""
+        return sum(len(exams) for exams in self.categories.values())
+    
+    def get_category_count(self) -> int:
+        """Returns the number of categories with at least one exam."""
+        return len([cat for cat, exams in self.categories.items() if exams])
 
 class ExamResult(BaseModel):
     """Represents the result of a specific exam."""
@@ -44,6 +143,27 @@ class ExamResult(BaseModel):
     unit: str
     reference: str
     status: str = "NORMAL"  # NORMAL, ALTO, BAIXO
+    
+    @classmethod
+    def from_trusted(cls, data: Mapping[str, Any]) -> "ExamResult":
+        """Builds a result from data the application serialized itself, without validation."""
+        return _construct(cls, {
+            'value': data['value'],
+            'unit': data['unit'],
+            'reference': data['reference'],
+            'status': data.get('status', "NORMAL")
+        })
+    
+    def to_trusted_dict(self) -> Dict[str, Any]:
+        """Returns the result data as a plain dict."""
+        return {'value': self.value, 'unit': self.unit, 'reference': self.reference, 'status': self.status}
+
+class ExamResultView(NamedTuple):
+    """Read-only, lightweight view of an exam result."""
+    value: float
+    unit: str
+    reference: str
+    status: str = "NORMAL"
 
 class CategoryResults(BaseModel):
     """Represents the results for a category of exams."""
@@ -55,6 +175,63 @@ class CompleteExamResult(BaseModel):
     exam_type: str
     date: datetime
     results: Dict[str, Dict[str, ExamResult]] 
+    patient_id: Optional[str] = None
     
     class Config:
-        arbitrary_types_allowed = True
\ No newline at end of file
+        arbitrary_types_allowed = True
+    
+    @classmethod
+    def from_trusted(cls, data: Mapping[str, Any]) -> "CompleteExamResult":
+        """
+        Builds a complete result from data the application serialized itself, without validation.
+        
+        Args:
+            data: Data as produced by to_trusted_dict() or dict().
+            
+        Returns:
+            CompleteExamResult instance.
+        """
+        return _construct(cls, {
+            'exam_type': data['exam_type'],
+            'date': as_datetime(data['date']),
+            'results': {
+                cat: {exam: ExamResult.from_trusted(vals) for exam, vals in exams.items()}
+                for cat, exams in data['results'].items()
+            },
+            'patient_id': data.get('patient_id')
+        })
+    
+    def to_trusted_dict(self) -> Dict[str, Any]:
+        """Returns the complete result data as a plain dict."""
+        return {
+            'exam_type': self.exam_type,
+            'date': self.date,
+            'results': {
+                cat: {exam: res.to_trusted_dict() for exam, res in exams.items()}
+                for cat, exams in self.results.items()
+            },
+            'patient_id': self.patient_id
+        }
+
+class CompleteExamResultView(NamedTuple):
+    """Read-only, lightweight view of a complete set of exam results."""
+    exam_type: str
+    date: datetime
+    results: Mapping[str, Mapping[str, ExamResultView]]
+    patient_id: Optional[str] = None
+    
+    @classmethod
+    def from_trusted(cls, data: Mapping[str, Any]) -> "CompleteExamResultView":
+        """Builds a view from data the application serialized itself."""
+        return cls(
+            data['exam_type'],
+            as_datetime(data['date']),
+            {
+                cat: {
+                    exam: ExamResultView(vals['value'], vals['unit'], vals['reference'], vals.get('status', "NORMAL"))
+                    for exam, vals in exams.items()
+                }
+                for cat, exams in data['results'].items()
+            },
+            data.get('patient_id')
+        )
\ No newline at end of file
@@ -2,13 +2,33 @@
 Validation logic for exam data.
 """
 import logging
+import math
+import re
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Decimal number with comma or dot separator, as accepted in result fields
+_DECIMAL_PATTERN = re.compile(r"\s*[+-]?(?:\d+(?:[.,]\d*)?|[.,]\d+)(?:[eE][+-]?\d+)?\s*")
 
 class ValidationError(Exception):
     """Custom exception for validation errors."""
     pass
 
+class FieldError(NamedTuple):
+    """A value rejected by batch validation."""
+    category: str
+    exam: str
+    value: str
+    message: str
+
+class BatchValidation(NamedTuple):
+    """Outcome of validating a whole result set."""
+    values: Dict[str, Dict[str, float]]
+    errors: List[FieldError]
+
 class ExamDataValidator:
     """Validates exam data."""
     
@@ -49,7 +69,7 @@ class ExamDataValidator:
             Converted float value or None if empty.
             
         Raises:
-            ValidationError: If the value is invalid or negative.
+            ValidationError: If the value is invalid, not finite or negative.
         """
         if not value.strip():
             return None
@@ -59,9 +79,93 @@ class ExamDataValidator:
         except ValueError as ve:
             logging.error(f"Invalid value for {exam_name}: {value}")
             raise ValidationError(f"Invalid value for {exam_name}: {value}") from ve
+        
+        # float() accepts "nan" and "inf", which are not results
+        if not math.isfinite(val):
+            logging.error(f"Invalid value for {exam_name}: {value}")
+            raise ValidationError(f"Invalid value for {exam_name}: {value}")
             
         if val < 0:
             logging.error(f"Negative value not allowed ({exam_name}).")
             raise ValidationError(f"Negative value not allowed ({exam_name}).")
             
-        return val
\ No newline at end of file
+        return val
+    
+    @staticmethod
+    def validate_numeric_series(values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+        """
+        Validates many numeric exam values at once, with the rules of validate_numeric_value.
+        
+        Nothing is raised or logged per value, so this is suited to bulk input.
+        
+        Args:
+            values: Values as strings (comma or dot decimals); missing values count as empty.
+        
+        Returns:
+            (numbers, errors): float Series aligned with values, NaN where the
+            value is empty or invalid, and a Series of error messages indexed
+            by the invalid entries only.
+        """
+        empty = values.isna().to_numpy(copy=True)
+        if pd.api.types.is_numeric_dtype(values):
+            numbers = values.astype(float)
+        else:
+            numbers = pd.to_numeric(values, errors='coerce').astype(float)
+            # Only values that failed the fast path pay for trimming and the decimal comma
+            retry = numbers.isna().to_numpy() & ~empty
+            if retry.any():
+                text = values[retry].astype(str).str.strip()
+                numbers[retry] = pd.to_numeric(text.str.replace(',', '.', regex=False), errors='coerce')
+                empty[retry] = (text == "").to_numpy()
+        
+        invalid = ~np.isfinite(numbers.to_numpy()) & ~empty
+        negative = (numbers < 0).to_numpy()
+        
+        errors = pd.concat([
+            "Invalid value: " + values[invalid].astype(str),
+            pd.Series("Negative value not allowed.", index=values.index[negative], dtype=object)
+        ]).sort_index()
+        
+        numbers[invalid | negative] = np.nan
+        return numbers, errors
+    
+    @staticmethod
+    def validate_batch(raw: Mapping[str, Mapping[str, str]]) -> BatchValidation:
+        """
+        Validates a whole result set in one pass, with the rules of validate_numeric_value.
+        
+        Every value is checked, so all errors are reported together, and none
+        is raised: the caller decides how to show them. Values are matched
+        against a precompiled pattern before conversion, so invalid input
+        costs no exception.
+        
+        Args:
+            raw: Mapping of category -> exam -> value as typed (comma or dot decimals).
+        
+        Returns:
+            BatchValidation with the valid values by category (empty values
+            omitted) and one FieldError per rejected value, in input order.
+        """
+        values: Dict[str, Dict[str, float]] = {}
+        errors: List[FieldError] = []
+        for category, exams in raw.items():
+            valid = values[category] = {}
+            for exam, text in exams.items():
+                if not text.strip():
+                    continue
+                # Matched first, so invalid input never raises
+                if _DECIMAL_PATTERN.fullmatch(text) is None:
+                    errors.append(FieldError(category, exam, text, f"Invalid value for {exam}: {text}"))
+                    continue
+                number = float(text.replace(',', '.'))
+                # The pattern accepts exponents, so large ones overflow to inf
+                if not math.isfinite(number):
+                    errors.append(FieldError(category, exam, text, f"Invalid value for {exam}: {text}"))
+                elif number < 0:
+                    errors.append(FieldError(category, exam, text, f"Negative value not allowed ({exam})."))
+                else:
+                    valid[exam] = number
+        
+        if errors:
+            logging.info(f"Batch validation rejected {len(errors)} values")
+        return BatchValidation(values, errors)
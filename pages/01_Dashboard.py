@@ -0,0 +1,130 @@
+"""
+Dashboard Page - Operational metrics of the exam history
+"""
+import logging
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+from datetime import datetime, timedelta
+
+from utils.resources import get_history_store
+
+# Page config
+st.set_page_config(
+    page_title="Painel | Gerenciador de Exames Laboratoriais",
+    page_icon="📊",
+    layout="wide"
+)
+
+# Number of days shown in the exams-per-day chart
+DAILY_WINDOW_DAYS = 30
+
+# Number of exam types shown in the profile usage ranking
+TOP_PROFILES = 10
+
+def display_summary(exam_rates, profile_usage, daily):
+    """Displays the headline metrics."""
+    total_exams = int(profile_usage['Exames'].sum()) if not profile_usage.empty else 0
+    today = datetime.now().date().isoformat()
+    exams_today = int(daily.loc[daily['Dia'] == today, 'Exames'].sum()) if not daily.empty else 0
+    total_values = int(exam_rates['Total'].sum()) if not exam_rates.empty else 0
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Total de Exames", total_exams)
+    col2.metric("Exames Hoje", exams_today)
+    
+    if total_values:
+        col3.metric("Resultados ALTO", f"{exam_rates['ALTO'].sum() / total_values:.1%}")
+        col4.metric("Resultados BAIXO", f"{exam_rates['BAIXO'].sum() / total_values:.1%}")
+    else:
+        col3.metric("Resultados ALTO", "-")
+        col4.metric("Resultados BAIXO", "-")
+
+def display_daily_counts(daily):
+    """Displays the exams-per-day chart."""
+    st.header("Exames por Dia")
+    
+    if daily.empty:
+        st.info(f"Nenhum exame registrado nos últimos {DAILY_WINDOW_DAYS} dias.")
+        return
+    
+    fig = px.bar(daily, x='Dia', y='Exames')
+    fig.update_layout(height=320, margin=dict(l=10, r=10, t=10, b=10))
+    st.plotly_chart(fig, use_container_width=True)
+
+def display_abnormal_rates(exam_rates):
+    """Displays ALTO/BAIXO rates per category and per exam."""
+    st.header("Resultados Alterados")
+    
+    if exam_rates.empty:
+        st.info("Nenhum resultado registrado.")
+        return
+    
+    # Category totals come from the per-exam aggregates, which are few rows
+    by_category = exam_rates.groupby('Categoria', as_index=False)[['Total', 'ALTO', 'BAIXO']].sum()
+    by_category['% ALTO'] = by_category['ALTO'] / by_category['Total'] * 100
+    by_category['% BAIXO'] = by_category['BAIXO'] / by_category['Total'] * 100
+    
+    fig = px.bar(
+        by_category,
+        x='Categoria',
+        y=['% ALTO', '% BAIXO'],
+        barmode='group'
+    )
+    fig.update_layout(height=360, margin=dict(l=10, r=10, t=10, b=10), yaxis_title="%", legend_title="")
+    st.plotly_chart(fig, use_container_width=True)
+    
+    categories = ["Todas"] + sorted(exam_rates['Categoria'].unique())
+    selected = st.selectbox("Categoria", categories)
+    
+    df = exam_rates if selected == "Todas" else exam_rates[exam_rates['Categoria'] == selected]
+    df = df.assign(
+        **{
+            '% ALTO': (df['ALTO'] / df['Total'] * 100).round(1),
+            '% BAIXO': (df['BAIXO'] / df['Total'] * 100).round(1)
+        }
+    )
+    st.dataframe(df, use_container_width=True, hide_index=True)
+
+def display_profile_usage(profile_usage):
+    """Displays the most used exam profiles."""
+    st.header("Perfis Mais Utilizados")
+    
+    if profile_usage.empty:
+        st.info("Nenhum exame registrado.")
+        return
+    
+    st.dataframe(profile_usage.head(TOP_PROFILES), use_container_width=True, hide_index=True)
+
+def main():
+    """Main function for the dashboard page."""
+    st.title("Painel de Operações")
+    
+    # All numbers come from aggregates maintained as exams are saved,
+    # so the page cost does not grow with the size of the history
+    try:
+        store = get_history_store()
+        daily = pd.DataFrame(
+            store.daily_counts(start=datetime.now() - timedelta(days=DAILY_WINDOW_DAYS - 1)),
+            columns=['Dia', 'Exames']
+        )
+        exam_rates = pd.DataFrame(
+            store.exam_counts(),
+            columns=['Categoria', 'Exame', 'Total', 'ALTO', 'BAIXO']
+        )
+        profile_usage = pd.DataFrame(
+            store.exam_type_counts(),
+            columns=['Perfil', 'Exames']
+        )
+    except Exception as e:
+        logging.error(f"Could not load dashboard metrics: {e}")
+        st.error("Não foi possível carregar as métricas do histórico de exames.")
+        return
+    
+    display_summary(exam_rates, profile_usage, daily)
+    display_daily_counts(daily)
+    display_abnormal_rates(exam_rates)
+    display_profile_usage(profile_usage)
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,23 @@
 """
 New Exam Page - For entering exam results
 """
+import logging
 import streamlit as st
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, time
 import io
 import base64
+import numpy as np
 
-from utils.formatter import ExamResultFormatter, get_status_from_values
-from utils.pdf_exporter import PDFExporter
+from utils.formatter import ExamResultFormatter, classify_results, get_reference_text, get_value_text
+from utils.pdf_exporter import PDF_CACHE, get_pdf_bytes, pdf_cache_key
 from models.validation import ExamDataValidator, ValidationError
 from data.defaults import REFERENCE_RANGES
+from utils.reference_index import REFERENCE_INDEX
+from utils.derived import DERIVED_ENGINE
+from utils.units import CANONICAL_DECIMALS, UNIT_CONVENTIONAL, UNIT_REGISTRY, UNIT_SYSTEM_LABELS
+from utils.history_store import build_complete_result
+from utils.resources import get_history_store
 
 # Page config
 st.set_page_config(
@@ -22,14 +29,21 @@ st.set_page_config(
 # Initialize validator
 validator = ExamDataValidator()
 
+# Sex options offered, mapped to the codes of the reference index
+SEX_OPTIONS = {
+    "Não informado": None,
+    "Masculino": "M",
+    "Feminino": "F"
+}
+
 def create_download_link(pdf_bytes, filename):
     """Creates a download link for a PDF file."""
     b64 = base64.b64encode(pdf_bytes).decode()
     href = f'<a href="data:application/pdf;base64,{b64}" download="{filename}">Baixar PDF</a>'
     return href
 
-def display_results(results, exam_type, date_str):
-    """Displays the exam results."""
+def display_results(results, exam_type, date_str, unit_system=UNIT_CONVENTIONAL):
+    """Displays the exam results in the chosen unit system."""
     st.header("Resultados do Exame")
     
     # Display date and type
@@ -42,12 +56,12 @@ def display_results(results, exam_type, date_str):
             with st.expander(category, expanded=True):
                 # Create a dataframe for each category
                 data = []
-                for exam_name, vals in exams.items():
-                    status = get_status_from_values(vals['value'], vals['reference'])
+                statuses = classify_results(exams)
+                for (exam_name, vals), status in zip(exams.items(), statuses):
                     data.append({
                         "Exame": exam_name,
-                        "Resultado": f"{vals['value']} {vals['unit']}",
-                        "Referência": f"{vals['reference']} {vals['unit']}",
+                        "Resultado": get_value_text(vals, unit_system),
+                        "Referência": get_reference_text(vals, unit_system=unit_system),
                         "Status": status
                     })
                 
@@ -81,26 +95,22 @@ def display_results(results, exam_type, date_str):
             index=0
         )
     
-    # Create PDF exporter
-    exporter = PDFExporter(exam_type, date_str, results)
-    exporter.set_orientation(orientation)
-    
-    # Generate PDF
-    pdf_bytes = exporter.export()
-    
     # Create download button
     filename = f"Exame_{exam_type}_{date_str.replace('/', '_')}.pdf"
     
     with col2:
-        st.download_button(
-            label="Baixar PDF",
-            data=pdf_bytes,
-            file_name=filename,
-            mime="application/pdf"
-        )
+        # Render the PDF only on request; cached PDFs are offered right away
+        pdf_key = pdf_cache_key(exam_type, date_str, results, orientation, unit_system)
+        if pdf_key in PDF_CACHE or st.button("Gerar PDF"):
+            st.download_button(
+                label="Baixar PDF",
+                data=get_pdf_bytes(exam_type, date_str, results, orientation, unit_system),
+                file_name=filename,
+                mime="application/pdf"
+            )
     
     # Formatter for copying
-    formatter = ExamResultFormatter(exam_type, date_str, results)
+    formatter = ExamResultFormatter(exam_type, date_str, results, unit_system)
     
     # Text representation
     with st.expander("Visualizar em Formato de Texto"):
@@ -110,14 +120,22 @@ def display_results(results, exam_type, date_str):
     with st.expander("Visualizar em Formato Tabular"):
         st.code(formatter.format_tabular())
 
-def create_exam_form(profile_name):
-    """Creates the form for entering exam results."""
+def create_exam_form(profile_name, unit_system=UNIT_CONVENTIONAL):
+    """Creates the form for entering exam results, typed in the chosen unit system."""
     profile = st.session_state.profile_manager.get_profile(profile_name)
     
     if not profile:
         st.error(f"Perfil não encontrado: {profile_name}")
         return
     
+    # Outside the form, so the reference ranges shown follow the patient right away
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        sex_label = st.selectbox("Sexo", list(SEX_OPTIONS), key="exam_patient_sex")
+    with col2:
+        age = st.number_input("Idade (anos)", min_value=0, max_value=130, value=None, step=1, key="exam_patient_age")
+    sex = SEX_OPTIONS[sex_label]
+    
     # Create a form
     with st.form(key="exam_form"):
         st.subheader(f"Exame: {profile.name}")
@@ -127,9 +145,14 @@ def create_exam_form(profile_name):
         col1, col2 = st.columns([1, 3])
         with col1:
             date = st.date_input("Data do Exame", datetime.now())
+        with col2:
+            patient_id = st.text_input("Paciente (identificador)", key="exam_patient_id")
         
-        # Variable to collect results
-        all_results = {}
+        # Values as typed and the slot below each field for its error
+        raw_values = {}
+        error_slots = {}
+        derived_slots = {}
+        ref_ids = {}
         
         # Create sections for each category
         for category, exams in profile.categories.items():
@@ -137,7 +160,7 @@ def create_exam_form(profile_name):
                 st.subheader(category)
                 
                 # Create a new dict for this category
-                all_results[category] = {}
+                raw_values[category] = {}
                 
                 # Create columns for the exam entries
                 cols = st.columns(3)
@@ -145,32 +168,75 @@ def create_exam_form(profile_name):
                 # Create input fields for each exam
                 for i, exam_name in enumerate(exams):
                     if exam_name in REFERENCE_RANGES[category]:
-                        # Get reference range
-                        ref_range = REFERENCE_RANGES[category][exam_name]
+                        # Get the reference range for the patient's sex and age
+                        ref_id = REFERENCE_INDEX.resolve(REFERENCE_INDEX.get_id(category, exam_name), sex, age)
+                        ref_ids[(category, exam_name)] = ref_id
                         
                         # Create input field in the appropriate column
                         with cols[i % 3]:
-                            ref_text = f"{ref_range['min']}-{ref_range['max']} {ref_range['unit']}"
+                            ref_text = get_reference_text(
+                                {'ref_id': ref_id, 'unit': REFERENCE_INDEX.unit(ref_id)},
+                                unit_system=unit_system
+                            )
                             st.text(f"Ref: {ref_text}")
                             
-                            value = st.text_input(
+                            # Derived analytes are computed from the other fields, not typed
+                            if (category, exam_name) in DERIVED_ENGINE:
+                                st.markdown(f"**{exam_name}**")
+                                derived_slots[(category, exam_name)] = st.empty()
+                                continue
+                            
+                            raw_values[category][exam_name] = st.text_input(
                                 exam_name,
                                 key=f"{category}_{exam_name}"
                             )
-                            
-                            # Store the value if not empty
-                            if value.strip():
-                                try:
-                                    valid_v = validator.validate_numeric_value(value, exam_name)
-                                    
-                                    if valid_v is not None:
-                                        all_results[category][exam_name] = {
-                                            'value': str(valid_v),
-                                            'unit': ref_range['unit'],
-                                            'reference': f"{ref_range['min']}-{ref_range['max']}"
-                                        }
-                                except ValidationError as e:
-                                    st.error(str(e))
+                            error_slots[(category, exam_name)] = st.empty()
+        
+        # Validate every field in one pass and show all errors at once
+        validation = validator.validate_batch(raw_values)
+        for error in validation.errors:
+            error_slots[(error.category, error.exam)].error(error.message)
+        
+        # Values typed in SI units are stored in conventional units
+        inputs = {
+            (category, exam_name): value
+            for category, values in validation.values.items()
+            for exam_name, value in values.items()
+        }
+        if unit_system != UNIT_CONVENTIONAL and inputs:
+            converted = UNIT_REGISTRY.to_conventional(
+                list(inputs.values()), [ref_ids[key] for key in inputs], unit_system
+            )
+            inputs = dict(zip(inputs, np.round(converted, CANONICAL_DECIMALS).tolist()))
+        
+        all_results = {category: {} for category in validation.values}
+        for (category, exam_name), value in inputs.items():
+            all_results[category][exam_name] = {
+                'value': str(value),
+                'unit': REFERENCE_INDEX.unit(ref_ids[(category, exam_name)]),
+                'ref_id': ref_ids[(category, exam_name)]
+            }
+        
+        # Recompute only the derived analytes whose inputs (or patient data) changed since the last run
+        derived_state, _ = DERIVED_ENGINE.update(st.session_state.get('derived_state'), inputs, sex, age)
+        st.session_state.derived_state = derived_state
+        # Only the derived analytes of the profile are saved; the others are intermediate results
+        for (category, exam_name), value in derived_state.outputs.items():
+            if (category, exam_name) not in derived_slots:
+                continue
+            ref_id = ref_ids[(category, exam_name)]
+            all_results.setdefault(category, {})[exam_name] = {
+                'value': str(value),
+                'unit': REFERENCE_INDEX.unit(ref_id),
+                'ref_id': ref_id
+            }
+        for (category, exam_name), slot in derived_slots.items():
+            value = derived_state.outputs.get((category, exam_name))
+            if value is None:
+                sources = ", ".join(exam for _, exam in DERIVED_ENGINE.inputs((category, exam_name)))
+                slot.caption(f"Calculado automaticamente a partir de: {sources}")
+            else:
+                slot.caption(f"Calculado: {get_value_text(all_results[category][exam_name], unit_system)}")
         
         # Submit button
         submitted = st.form_submit_button("Salvar Resultados")
@@ -178,7 +244,13 @@ def create_exam_form(profile_name):
         if submitted:
             try:
                 # Validate date
-                validator.validate_date(date)
+                exam_datetime = datetime.combine(date, time())
+                validator.validate_date(exam_datetime)
+                
+                # Invalid values are shown below their fields; none is saved silently
+                if validation.errors:
+                    st.error("Corrija os valores inválidos antes de salvar.")
+                    return
                 
                 # Check if at least one result was entered
                 has_results = any(category for category in all_results.values() if category)
@@ -192,11 +264,21 @@ def create_exam_form(profile_name):
                 st.session_state.last_exam_date = date.strftime("%d/%m/%Y")
                 st.session_state.last_exam_type = profile.name
                 
+                # Append the results to the persistent history
+                try:
+                    record = build_complete_result(
+                        profile.name, exam_datetime, all_results, patient_id.strip() or None
+                    )
+                    get_history_store().append(record)
+                except Exception as e:
+                    logging.error(f"Could not save exam history: {e}")
+                    st.warning("Não foi possível salvar os resultados no histórico.")
+                
                 st.success("Resultados salvos com sucesso!")
                 
                 # Rerun to display results
                 st.experimental_rerun()
-                
+            
             except ValidationError as e:
                 st.error(str(e))
 
@@ -204,20 +286,30 @@ def main():
     """Main function for the New Exam page."""
     st.title("Novo Exame")
     
+    # Applies to the values typed and to the results shown; results are stored in conventional units
+    unit_system = st.radio(
+        "Sistema de unidades:",
+        list(UNIT_SYSTEM_LABELS),
+        format_func=UNIT_SYSTEM_LABELS.get,
+        horizontal=True,
+        key="unit_system"
+    )
+    
     # Check if we have results to display
     if 'current_exam_results' in st.session_state and st.session_state.current_exam_results:
         # Display the results
         display_results(
             st.session_state.current_exam_results,
             st.session_state.last_exam_type,
-            st.session_state.last_exam_date
+            st.session_state.last_exam_date,
+            unit_system
         )
         
         # Add button to start a new exam
         if st.button("Iniciar Novo Exame"):
             st.session_state.current_exam_results = {}
             st.experimental_rerun()
-            
+    
     else:
         # Get all profiles
         profiles = st.session_state.profile_manager.get_all_profiles()
@@ -237,7 +329,7 @@ def main():
         )
         
         if selected_profile:
-            create_exam_form(selected_profile)
+            create_exam_form(selected_profile, unit_system)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -16,15 +16,13 @@ st.set_page_config(
 
 def display_profile_list():
     """Displays the list of all profiles."""
-    profiles = st.session_state.profile_manager.get_all_profiles()
+    # Profiles ordered with favorites first, then by name
+    profiles = st.session_state.profile_manager.ordered_listing()
     
     if not profiles:
         st.info("Nenhum perfil de exame criado.")
         return
     
-    # Sort profiles: favorites first, then by name
-    profiles.sort(key=lambda p: (not p['is_favorite'], p['name']))
-    
     # Create tabs for Default and Custom profiles
     default_profiles = [p for p in profiles if p['is_default']]
     custom_profiles = [p for p in profiles if not p['is_default']]
@@ -1,12 +1,19 @@
 """
 Settings Page - For application settings
 """
+import logging
 import streamlit as st
 import os
 import json
 import tempfile
 from datetime import datetime
 
+from utils.backup import (
+    BackupFormatError, order_backup_chain, read_backup_meta, write_compact_backup, write_delta_backup
+)
+from utils.derived import backfill_history
+from utils.resources import get_history_store
+
 # Page config
 st.set_page_config(
     page_title="Configurações | Gerenciador de Exames Laboratoriais",
@@ -14,51 +21,215 @@ st.set_page_config(
     layout="wide"
 )
 
-def export_data():
-    """Exports all application data to a JSON file."""
-    # Get data from session state
-    data = {
-        'profiles': st.session_state.profiles,
-        'favorite_profiles': list(st.session_state.favorite_profiles),
-        'exported_at': datetime.now().isoformat()
+# Backup formats offered for export
+EXPORT_FORMATS = {
+    "Compacto (.jsonl.gz)": "compact",
+    "JSON": "json"
+}
+
+# Backups larger than this are spooled to a temporary file instead of memory
+BACKUP_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+def write_compact_export(manager, previous_meta):
+    """
+    Writes a full or delta compact backup into a spooled file.
+    
+    Returns:
+        (payload bytes, summary text, file name), or None if the previous
+        backup is newer than the current data.
+    """
+    try:
+        history = get_history_store()
+    except Exception as e:
+        logging.error(f"Exam history not included in backup: {e}")
+        st.warning("O histórico de exames não pôde ser incluído no backup.")
+        history = None
+    
+    # Checkpoints are taken before reading, so nothing written meanwhile is missed
+    checkpoint = {
+        'profiles': manager.backup_checkpoint(),
+        'exams': history.revision() if history is not None else 0
     }
     
-    # Convert data to JSON
-    json_str = json.dumps(data, default=str, indent=2)
+    # A previous backup ahead of the current data was not taken from it (e.g.
+    # another session, or a backup never restored here): a delta from it would
+    # silently miss changes
+    if previous_meta is not None:
+        since = previous_meta['checkpoint']
+        if since.get('profiles', 0) > checkpoint['profiles'] or (
+            history is not None and since.get('exams', 0) > checkpoint['exams']
+        ):
+            st.error(
+                "O backup anterior é mais recente que os dados atuais. Restaure-o primeiro "
+                "ou gere um backup completo."
+            )
+            return None
     
-    # Create a download button
-    st.download_button(
-        label="Baixar Dados",
-        data=json_str,
-        file_name="lab_exam_data.json",
-        mime="application/json"
+    # Written line by line into a spooled file, compressed as it goes
+    with tempfile.SpooledTemporaryFile(max_size=BACKUP_SPOOL_MAX_SIZE) as spool:
+        if previous_meta is None:
+            records = history.iter_backup() if history is not None else ()
+            n_profiles, n_records = write_compact_backup(
+                spool, manager.iter_export(), manager.favorite_names(), records, checkpoint=checkpoint
+            )
+            summary = f"{n_profiles} perfis e {n_records} exames."
+            file_name = "lab_exam_data.jsonl.gz"
+        else:
+            since = previous_meta['checkpoint']
+            records = history.iter_backup(since=since['exams']) if history is not None else ()
+            n_changed, n_deleted, n_records = write_delta_backup(
+                spool,
+                manager.iter_changes(since['profiles']),
+                manager.deleted_since(since['profiles']),
+                records,
+                since=since,
+                checkpoint=checkpoint
+            )
+            summary = f"{n_changed} perfis alterados, {n_deleted} removidos e {n_records} exames novos ou completados."
+            file_name = f"lab_exam_data_delta_{since['profiles']}_{checkpoint['profiles']}.jsonl.gz"
+        
+        # Only the compressed payload is ever held in memory, for the download
+        spool.seek(0)
+        payload = spool.read()
+    
+    return payload, summary, file_name
+
+def export_data():
+    """Exports all application data to a backup file, generated on request."""
+    backup_format = st.radio(
+        "Formato do backup:",
+        list(EXPORT_FORMATS),
+        horizontal=True,
+        index=0
     )
+    
+    previous_meta = None
+    if EXPORT_FORMATS[backup_format] == "compact":
+        backup_kind = st.radio(
+            "Tipo de backup:",
+            ["Completo", "Incremental"],
+            horizontal=True,
+            index=0
+        )
+        
+        if backup_kind == "Incremental":
+            previous_file = st.file_uploader(
+                "Backup anterior (completo ou incremental) a partir do qual gerar o incremento",
+                type=["gz"],
+                key="previous_backup"
+            )
+            if previous_file is None:
+                st.info("Envie o último backup gerado para exportar apenas as alterações desde ele.")
+                return
+            try:
+                previous_meta = read_backup_meta(previous_file)
+            except BackupFormatError as e:
+                st.error(f"Backup anterior inválido: {str(e)}")
+                return
+            if 'checkpoint' not in previous_meta:
+                st.error("O backup anterior não possui ponto de controle; gere um backup completo.")
+                return
+    
+    if not st.button("Gerar Backup"):
+        return
+    
+    manager = st.session_state.profile_manager
+    
+    if EXPORT_FORMATS[backup_format] == "compact":
+        export = write_compact_export(manager, previous_meta)
+        if export is None:
+            return
+        payload, summary, file_name = export
+        st.caption(summary)
+        st.download_button(
+            label="Baixar Dados",
+            data=payload,
+            file_name=file_name,
+            mime="application/gzip"
+        )
+    else:
+        # Get data from the profile manager
+        data = manager.export_data()
+        data['exported_at'] = datetime.now().isoformat()
+        
+        # Convert data to JSON
+        json_str = json.dumps(data, default=str, indent=2)
+        
+        # Create a download button
+        st.download_button(
+            label="Baixar Dados",
+            data=json_str,
+            file_name="lab_exam_data.json",
+            mime="application/json"
+        )
 
 def import_data():
-    """Imports application data from a JSON file."""
-    uploaded_file = st.file_uploader("Escolha um arquivo de backup", type="json")
+    """Imports application data from a backup file, or a full backup plus its deltas."""
+    uploaded_files = st.file_uploader(
+        "Escolha um arquivo de backup (ou um backup completo e seus incrementos)",
+        type=["json", "gz"],
+        accept_multiple_files=True
+    )
     
-    if uploaded_file is not None:
+    if uploaded_files:
         try:
-            # Read the JSON file
-            data = json.loads(uploaded_file.read().decode('utf-8'))
+            # Restore order: the full backup first, then each delta after the one it follows
+            order = order_backup_chain([read_backup_meta(f) for f in uploaded_files])
+        except BackupFormatError as e:
+            st.error(f"Arquivos de backup inválidos: {str(e)}")
+            return
+        
+        # Import confirmation
+        if not st.button("Confirmar Importação"):
+            return
+        for i in order:
+            uploaded_file = uploaded_files[i]
+            st.write(f"**{uploaded_file.name}**")
+            total_bytes = max(uploaded_file.size, 1)
+            progress_bar = st.progress(0.0, text="Importando perfis...")
+            
+            def on_progress(bytes_read, imported):
+                progress_bar.progress(
+                    min(bytes_read / total_bytes, 1.0),
+                    text=f"Importando perfis... {imported} importados"
+                )
             
-            # Validate the data
-            if 'profiles' not in data or 'favorite_profiles' not in data:
-                st.error("Arquivo de backup inválido. Formato não reconhecido.")
+            try:
+                # Profiles are read, validated and saved in batches
+                report = st.session_state.profile_manager.import_backup(
+                    uploaded_file,
+                    progress=on_progress,
+                    history_store=get_history_store()
+                )
+            except Exception as e:
+                st.error(f"Erro ao importar dados: {str(e)}")
                 return
             
-            # Import confirmation
-            if st.button("Confirmar Importação"):
-                # Update session state
-                st.session_state.profiles = data['profiles']
-                st.session_state.favorite_profiles = set(data['favorite_profiles'])
-                
-                st.success("Dados importados com sucesso!")
-                st.info("Recarregue a página para ver as alterações.")
+            progress_bar.progress(1.0, text="Importação concluída.")
+            
+            if report.complete:
+                st.success(
+                    f"Dados importados com sucesso! {report.imported} perfis importados, "
+                    f"{report.removed} removidos, {report.exams} exames restaurados."
+                )
+            else:
+                st.error(
+                    f"Arquivo de backup inválido: {report.error} "
+                    f"{report.imported} perfis lidos antes do erro foram importados; "
+                    f"nenhum perfil foi removido."
+                )
+            
+            if report.failed:
+                st.warning(f"{len(report.failed)} registros inválidos foram ignorados.")
+                with st.expander("Ver registros ignorados"):
+                    for name, reason in report.failed:
+                        st.write(f"**{name}:** {reason}")
+            
+            if not report.complete:
+                st.error("Restauração interrompida; os arquivos seguintes não foram aplicados.")
+                break
         
-        except Exception as e:
-            st.error(f"Erro ao importar dados: {str(e)}")
+        st.info("Recarregue a página para ver as alterações.")
 
 def theme_settings():
     """Theme settings section."""
@@ -78,6 +249,30 @@ def theme_settings():
         st.success(f"Tema alterado para: {theme}")
         st.info("Algumas alterações de tema podem exigir recarregar a página.")
 
+def history_settings():
+    """Exam history maintenance section."""
+    st.subheader("Analitos Derivados")
+    
+    st.write("""
+    Calcula os analitos derivados (como LDL por Friedewald, colesterol não-HDL
+    e HOMA-IR) dos exames do histórico salvos antes de existirem ou sem eles.
+    Apenas os valores ausentes são calculados.
+    """)
+    
+    if st.button("Calcular Analitos Derivados"):
+        try:
+            with st.spinner("Calculando analitos derivados..."):
+                added = backfill_history(get_history_store())
+        except Exception as e:
+            logging.error(f"Derived analyte backfill failed: {e}")
+            st.error(f"Erro ao calcular analitos derivados: {str(e)}")
+            return
+        
+        if added:
+            st.success(f"{added} valores derivados adicionados ao histórico.")
+        else:
+            st.info("O histórico já está completo.")
+
 def clear_data():
     """Reset application data section."""
     st.subheader("Reiniciar Dados da Aplicação")
@@ -90,6 +285,10 @@ def clear_data():
     # Confirm reset
     if st.button("Reiniciar Todos os Dados"):
         if st.session_state.get('confirm_reset'):
+            # Clear the profile store (shared stores persist beyond the session)
+            if 'profile_manager' in st.session_state:
+                st.session_state.profile_manager.clear()
+            
             # Clear session state
             for key in list(st.session_state.keys()):
                 if key not in ['_is_running', '_component_instances']:
@@ -107,8 +306,8 @@ def main():
     st.title("Configurações")
     
     # Create tabs for different settings
-    tab1, tab2, tab3, tab4 = st.tabs([
-        "Tema", "Exportar Dados", "Importar Dados", "Reiniciar Dados"
+    tab1, tab2, tab3, tab4, tab5 = st.tabs([
+        "Tema", "Exportar Dados", "Importar Dados", "Histórico", "Reiniciar Dados"
     ])
     
     with tab1:
@@ -118,7 +317,8 @@ def main():
         st.subheader("Exportar Dados")
         st.write("""
         Exporte todos os dados da aplicação para backup ou transferência.
-        Isso inclui todos os perfis de exame e configurações.
+        Isso inclui todos os perfis de exame e configurações; o formato
+        compacto inclui também o histórico de exames.
         """)
         export_data()
     
@@ -126,11 +326,15 @@ def main():
         st.subheader("Importar Dados")
         st.write("""
         Importe dados de um arquivo de backup.
-        Isso irá substituir todos os dados atuais da aplicação.
+        Um backup completo substitui todos os dados atuais da aplicação;
+        backups incrementais são aplicados sobre eles, na ordem correta.
         """)
         import_data()
     
     with tab4:
+        history_settings()
+    
+    with tab5:
         clear_data()
     
     # About section
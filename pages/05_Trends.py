@@ -0,0 +1,136 @@
+"""
+Trends Page - Longitudinal view of a patient's exam results
+"""
+import logging
+import math
+import streamlit as st
+import plotly.graph_objects as go
+from datetime import datetime, timedelta
+
+from utils.analytics import TREND_MAX_POINTS, trend_series
+from utils.formatter import parse_reference
+from utils.reference_index import REFERENCE_INDEX
+from utils.resources import get_history_store
+from utils.units import UNIT_CONVENTIONAL, UNIT_REGISTRY, UNIT_SYSTEM_LABELS, format_value
+
+# Page config
+st.set_page_config(
+    page_title="Tendências | Gerenciador de Exames Laboratoriais",
+    page_icon="📈",
+    layout="wide"
+)
+
+# Time windows offered, in days (None = whole history)
+WINDOWS = {
+    "Últimos 90 dias": 90,
+    "Último ano": 365,
+    "Últimos 5 anos": 5 * 365,
+    "Todo o histórico": None
+}
+
+# Marker colors by result status
+STATUS_COLORS = {
+    "NORMAL": "#2e7d32",
+    "ALTO": "#c62828",
+    "BAIXO": "#1565c0",
+    "N/A": "#757575"
+}
+
+def build_trend_chart(series, category, exam, unit_system=UNIT_CONVENTIONAL):
+    """Builds the Plotly figure of a trend series with its reference band, in the chosen unit system."""
+    points = series.points
+    fig = go.Figure()
+    
+    ref_id = REFERENCE_INDEX.get_id(category, exam)
+    unit = UNIT_REGISTRY.unit(ref_id, unit_system) if ref_id is not None else ""
+    values = points['value']
+    
+    # The band follows the range the latest result was classified with,
+    # which already accounts for the patient's sex and age
+    reference = points['reference'].iloc[-1] if len(points) else ""
+    ref_min, ref_max = parse_reference(reference)
+    if ref_id is not None and unit_system != UNIT_CONVENTIONAL:
+        values = UNIT_REGISTRY.convert(values.to_numpy(), ref_id, unit_system)
+        ref_min, ref_max = UNIT_REGISTRY.convert([ref_min, ref_max], ref_id, unit_system).tolist()
+        reference = f"{format_value(ref_min)}-{format_value(ref_max)}"
+    if not (math.isnan(ref_min) or math.isnan(ref_max)):
+        fig.add_hrect(
+            y0=ref_min,
+            y1=ref_max,
+            fillcolor="#4caf50",
+            opacity=0.15,
+            line_width=0,
+            annotation_text=f"Referência: {reference}",
+            annotation_position="top left"
+        )
+    
+    fig.add_trace(go.Scattergl(
+        x=points['date'],
+        y=values,
+        mode="lines+markers",
+        line=dict(color="#607d8b", width=1.5),
+        marker=dict(color=[STATUS_COLORS.get(status, "#757575") for status in points['status']], size=7),
+        customdata=points['status'],
+        hovertemplate="%{x|%d/%m/%Y}<br>%{y} " + unit + "<br>%{customdata}<extra></extra>",
+        name=exam
+    ))
+    fig.update_layout(
+        height=420,
+        margin=dict(l=10, r=10, t=30, b=10),
+        yaxis_title=unit,
+        showlegend=False
+    )
+    return fig
+
+def main():
+    """Main function for the trends page."""
+    st.title("Tendências de Resultados")
+    
+    try:
+        store = get_history_store()
+        patients = store.patients()
+        exams = [(category, exam) for category, exam, *_ in store.exam_counts()]
+    except Exception as e:
+        logging.error(f"Could not load exam history: {e}")
+        st.error("Não foi possível carregar o histórico de exames.")
+        return
+    
+    if not patients or not exams:
+        st.info("Nenhum exame com paciente identificado no histórico.")
+        return
+    
+    col1, col2, col3, col4 = st.columns([1, 2, 1, 1])
+    with col1:
+        patient_id = st.selectbox("Paciente", patients)
+    with col2:
+        category, exam = st.selectbox(
+            "Exame",
+            exams,
+            format_func=lambda item: f"{item[1]} ({item[0]})"
+        )
+    with col3:
+        window = st.selectbox("Período", list(WINDOWS))
+    with col4:
+        unit_system = st.selectbox("Unidades", list(UNIT_SYSTEM_LABELS), format_func=UNIT_SYSTEM_LABELS.get)
+    
+    days = WINDOWS[window]
+    # Day-aligned window so reruns within a day hit the trend cache
+    start = datetime.combine(datetime.now().date() - timedelta(days=days), datetime.min.time()) if days else None
+    
+    series = trend_series(store, patient_id, category, exam, start=start)
+    if series.total_points == 0:
+        st.info("Nenhum resultado deste exame para o paciente no período selecionado.")
+        return
+    
+    st.plotly_chart(build_trend_chart(series, category, exam, unit_system), use_container_width=True)
+    
+    if series.total_points > TREND_MAX_POINTS:
+        st.caption(
+            f"Exibindo {len(series.points)} de {series.total_points} resultados "
+            f"(amostragem que preserva picos e vales)."
+        )
+    else:
+        st.caption(f"{series.total_points} resultados.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Import Results Page - Bulk ingestion of analyzer/LIS result files
+"""
+import logging
+import streamlit as st
+import pandas as pd
+
+from data.defaults import ANALYZER_CODES
+from utils.ingest import DEFAULT_COLUMNS, INGEST_EXAM_TYPE, ingest_results
+from utils.resources import get_history_store
+
+# Page config
+st.set_page_config(
+    page_title="Importar Resultados | Gerenciador de Exames Laboratoriais",
+    page_icon="📥",
+    layout="wide"
+)
+
+# Labels of the fields read from the file
+FIELD_LABELS = {
+    'sample': "Coluna da amostra",
+    'patient': "Coluna do paciente",
+    'date': "Coluna da data",
+    'code': "Coluna do código do exame",
+    'value': "Coluna do valor"
+}
+
+# Labels of the optional fields, left blank when the file lacks them
+OPTIONAL_FIELD_LABELS = {
+    'sex': "Coluna do sexo (opcional)",
+    'age': "Coluna da idade (opcional)",
+    'unit': "Coluna da unidade (opcional, convencional ou SI)"
+}
+
+def display_report(report):
+    """Displays the outcome of an ingestion."""
+    st.success(
+        f"{report.records} exames importados ({report.values} resultados de {report.rows} linhas) "
+        f"em {report.elapsed_seconds:.1f}s."
+    )
+    
+    if report.duplicates:
+        st.info(f"{report.duplicates} amostras já estavam no histórico e não foram importadas novamente.")
+    
+    if report.error_count:
+        st.warning(f"{report.error_count} linhas inválidas foram ignoradas.")
+        with st.expander("Ver linhas ignoradas"):
+            if report.error_count > len(report.errors):
+                st.caption(f"Exibindo as primeiras {len(report.errors)} linhas.")
+            st.dataframe(
+                pd.DataFrame(report.errors, columns=['Linha', 'Motivo']),
+                use_container_width=True,
+                hide_index=True
+            )
+
+def main():
+    """Main function for the import results page."""
+    st.title("Importar Resultados")
+    st.write(
+        "Importe arquivos CSV ou TSV exportados pelos analisadores ou pelo LIS, "
+        "com uma linha por resultado. As linhas de uma mesma amostra formam um exame."
+    )
+    
+    with st.expander("Códigos de exame reconhecidos"):
+        st.dataframe(
+            pd.DataFrame(
+                [(code, category, exam) for code, (category, exam) in ANALYZER_CODES.items()],
+                columns=['Código', 'Categoria', 'Exame']
+            ),
+            use_container_width=True,
+            hide_index=True
+        )
+    
+    uploaded_file = st.file_uploader("Arquivo de resultados", type=["csv", "tsv", "txt"])
+    
+    with st.expander("Colunas do arquivo"):
+        columns = {
+            field: st.text_input(label, value=DEFAULT_COLUMNS[field])
+            for field, label in FIELD_LABELS.items()
+        }
+        for field, label in OPTIONAL_FIELD_LABELS.items():
+            column = st.text_input(label, value="")
+            if column.strip():
+                columns[field] = column.strip()
+    exam_type = st.text_input("Tipo de exame registrado", value=INGEST_EXAM_TYPE)
+    
+    if uploaded_file is None or not st.button("Importar"):
+        return
+    
+    total_bytes = max(uploaded_file.size, 1)
+    progress_bar = st.progress(0.0, text="Importando resultados...")
+    
+    def on_progress(rows, records):
+        progress_bar.progress(
+            min(uploaded_file.tell() / total_bytes, 1.0),
+            text=f"Importando resultados... {rows} linhas lidas, {records} exames"
+        )
+    
+    try:
+        report = ingest_results(
+            uploaded_file,
+            get_history_store(),
+            exam_type=exam_type,
+            columns=columns,
+            progress=on_progress
+        )
+    except Exception as e:
+        logging.error(f"Result file ingestion failed: {e}")
+        st.error(f"Erro ao importar resultados: {str(e)}")
+        return
+    
+    progress_bar.progress(1.0, text="Importação concluída.")
+    display_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Shared fixtures for the test suite.
+"""
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.exam import CompleteExamResult, ExamResult
+from utils.history_store import ExamHistoryStore
+
+def build_record(patient_id, date, values, exam_type="Rotina"):
+    """Builds a record from {(category, exam): value}."""
+    results = {}
+    for (category, exam_name), value in values.items():
+        results.setdefault(category, {})[exam_name] = ExamResult(value=value, unit="mg/dL", reference="70-99")
+    return CompleteExamResult(exam_type=exam_type, date=date, results=results, patient_id=patient_id)
+
+@pytest.fixture
+def make_record():
+    return build_record
+
+@pytest.fixture
+def history_store(tmp_path):
+    store = ExamHistoryStore(str(tmp_path / "history.db"))
+    yield store
+    store.close()
+
+@pytest.fixture
+def sample_record():
+    return build_record("P1", datetime(2025, 3, 10, 8, 0), {("Bioquímica", "Glicose"): 90.0})
@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from utils.analytics import HISTORY_COLUMNS, frame_to_records, history_frame, read_parquet, records_to_frame, write_parquet
+
+@pytest.fixture
+def records(make_record):
+    return [
+        (1, make_record("P1", datetime(2025, 1, 15, 8, 0), {("Bioquímica", "Glicose"): 90.0, ("Lipídios", "HDL"): 45.5})),
+        (2, make_record(None, datetime(2025, 2, 3, 9, 30), {("Bioquímica", "Glicose"): 120.0}, exam_type="Urgência")),
+        (3, make_record("P2", datetime(2025, 2, 20, 7, 45), {("Lipídios", "HDL"): 38.0, ("Lipídios", "LDL"): 160.0}))
+    ]
+
+def dumped(records):
+    return [(record_id, record.model_dump()) for record_id, record in records]
+
+def test_frame_has_one_row_per_exam(records):
+    df = records_to_frame(records)
+    
+    assert list(df.columns) == HISTORY_COLUMNS
+    assert len(df) == 5
+    assert df['record_id'].tolist() == [1, 1, 2, 3, 3]
+    assert isinstance(df['category'].dtype, pd.CategoricalDtype)
+    assert df['value'].dtype == float
+
+def test_frame_round_trip(records):
+    assert dumped(frame_to_records(records_to_frame(records))) == dumped(records)
+
+def test_frame_round_trip_ignores_row_order(records):
+    shuffled = records_to_frame(records).sample(frac=1.0, random_state=0)
+    
+    assert dumped(frame_to_records(shuffled)) == dumped(records)
+
+def test_history_frame_matches_stored_records(history_store, records):
+    for _, record in records:
+        history_store.append(record)
+    
+    stored = list(history_store.iter_records())
+    df = history_frame(history_store).sort_values(['record_id', 'category', 'exam'], ignore_index=True)
+    expected = records_to_frame(stored).sort_values(['record_id', 'category', 'exam'], ignore_index=True)
+    
+    assert dumped(frame_to_records(df)) == dumped(stored)
+    pd.testing.assert_series_equal(df['value'], expected['value'])
+
+def test_parquet_round_trip(tmp_path, records):
+    pytest.importorskip("pyarrow")
+    root = str(tmp_path / "history")
+    
+    write_parquet(records_to_frame(records), root)
+    
+    assert dumped(frame_to_records(read_parquet(root))) == dumped(records)
+
+def test_parquet_filters_skip_partitions(tmp_path, records):
+    pytest.importorskip("pyarrow")
+    root = str(tmp_path / "history")
+    write_parquet(records_to_frame(records), root)
+    
+    lipids = read_parquet(root, categories=["Lipídios"])
+    assert sorted(lipids['record_id'].tolist()) == [1, 3, 3]
+    
+    february = read_parquet(root, columns=['record_id', 'value'], start_month="2025-02", end_month="2025-02")
+    assert list(february.columns) == ['record_id', 'value']
+    assert sorted(february['record_id'].tolist()) == [2, 3, 3]
@@ -0,0 +1,162 @@
+import io
+import json
+from datetime import datetime
+
+import pytest
+import streamlit as st
+
+from utils.backup import BackupFormatError, BackupReader, CompactBackupReader, read_backup_meta, write_compact_backup, write_delta_backup
+from utils.derived import backfill_history
+from utils.history_store import ExamHistoryStore
+from utils.profile_manager import ExamProfileManager
+from utils.profile_store import SessionStateProfileStore, SQLiteProfileStore
+
+@pytest.fixture
+def manager(tmp_path):
+    store = SQLiteProfileStore(str(tmp_path / "profiles.db"))
+    yield ExamProfileManager(store)
+    store.close()
+
+def new_session():
+    for key in list(st.session_state.keys()):
+        del st.session_state[key]
+    return ExamProfileManager(SessionStateProfileStore())
+
+def full_backup(manager, history):
+    buffer = io.BytesIO()
+    checkpoint = {'profiles': manager.backup_checkpoint(), 'exams': history.revision()}
+    write_compact_backup(buffer, manager.iter_export(), manager.favorite_names(), history.iter_backup(), checkpoint=checkpoint)
+    buffer.seek(0)
+    return buffer
+
+def delta_backup(manager, history, previous):
+    since = read_backup_meta(previous)['checkpoint']
+    previous.seek(0)
+    buffer = io.BytesIO()
+    checkpoint = {'profiles': manager.backup_checkpoint(), 'exams': history.revision()}
+    write_delta_backup(
+        buffer, manager.iter_changes(since['profiles']), manager.deleted_since(since['profiles']),
+        history.iter_backup(since=since['exams']), since=since, checkpoint=checkpoint
+    )
+    buffer.seek(0)
+    return buffer
+
+def exams_of(history):
+    return {
+        record.patient_id: {exam: res.value for exams in record.results.values() for exam, res in exams.items()}
+        for _, record in history.iter_records()
+    }
+
+def test_full_backup_restores_exams_into_non_empty_history(manager, tmp_path, make_record, sample_record):
+    source = ExamHistoryStore(str(tmp_path / "source.db"))
+    source.append(make_record("P2", datetime(2025, 4, 1), {("Bioquímica", "Ureia"): 30.0}))
+    source.append(make_record("P3", datetime(2025, 4, 2), {("Bioquímica", "Glicose"): 110.0}))
+    backup = full_backup(manager, source)
+    source.close()
+    
+    target = ExamHistoryStore(str(tmp_path / "target.db"))
+    target.append(sample_record)
+    report = manager.import_backup(backup, history_store=target)
+    
+    assert report.complete and report.exams == 2
+    assert sorted(record.patient_id for _, record in target.iter_records()) == ["P1", "P2", "P3"]
+    
+    backup.seek(0)
+    assert manager.import_backup(backup, history_store=target).exams == 0
+    assert len(target) == 3
+    target.close()
+
+def test_delta_carries_new_records_and_back_filled_values(manager, tmp_path, make_record):
+    lipids = {
+        ("PERFIL LIPÍDICO", "Colesterol Total"): 200.0,
+        ("PERFIL LIPÍDICO", "HDL"): 50.0,
+        ("PERFIL LIPÍDICO", "Triglicerídeos"): 100.0
+    }
+    source = ExamHistoryStore(str(tmp_path / "source.db"))
+    source.append(make_record("P1", datetime(2025, 4, 1), lipids))
+    full = full_backup(manager, source)
+    
+    target = ExamHistoryStore(str(tmp_path / "target.db"))
+    manager.import_backup(full, history_store=target)
+    full.seek(0)
+    
+    # Derived values added to the old record, then a new record
+    assert backfill_history(source) == 2
+    source.append(make_record("P2", datetime(2025, 4, 2), {("Bioquímica", "Ureia"): 30.0}))
+    delta = delta_backup(manager, source, full)
+    
+    report = manager.import_backup(delta, history_store=target)
+    
+    assert report.complete and report.exams == 1
+    assert exams_of(target) == exams_of(source)
+    assert exams_of(target)["P1"]["LDL (Friedewald)"] == 130.0
+    assert dict(row[:2] for row in target.exam_type_counts()) == {"Rotina": 2}
+    assert {row[1]: row[2] for row in target.exam_counts()} == {row[1]: row[2] for row in source.exam_counts()}
+    
+    # Nothing changed since the delta: the next one is empty
+    delta.seek(0)
+    assert list(source.iter_backup(since=read_backup_meta(delta)['checkpoint']['exams'])) == []
+    source.close()
+    target.close()
+
+def test_unterminated_json_value_is_rejected():
+    data = b'{"profiles": {"Aberto": {"name": "' + b'x' * 10_000
+    reader = BackupReader(io.BytesIO(data), chunk_size=256, max_value_size=1024)
+    with pytest.raises(BackupFormatError):
+        list(reader)
+
+def test_compact_line_over_limit_is_rejected(manager, history_store):
+    manager.create_profile("Grande", {'Bioquímica': ['Glicose']}, desc="x" * 5000)
+    reader = CompactBackupReader(full_backup(manager, history_store), max_value_size=1024)
+    with pytest.raises(BackupFormatError):
+        list(reader)
+
+def test_delta_after_restore_in_new_session_carries_new_changes(tmp_path, make_record):
+    manager = new_session()
+    source = ExamHistoryStore(str(tmp_path / "source.db"))
+    for i in range(10):
+        manager.create_profile(f"Perfil {i}", {'Bioquímica': ['Glicose']})
+        source.append(make_record(f"P{i}", datetime(2025, 4, 1 + i), {("Bioquímica", "Glicose"): 90.0}))
+    full = full_backup(manager, source)
+    source.close()
+    
+    # A new session starts over from revision 0 and restores the backup
+    manager = new_session()
+    target = ExamHistoryStore(str(tmp_path / "target.db"))
+    assert manager.import_backup(full, history_store=target).complete
+    full.seek(0)
+    manager.create_profile("Novo", {'Bioquímica': ['Ureia']})
+    target.append(make_record("P99", datetime(2025, 5, 1), {("Bioquímica", "Ureia"): 30.0}))
+    
+    since = read_backup_meta(full)['checkpoint']
+    full.seek(0)
+    assert [name for name, _, _ in manager.iter_changes(since['profiles'])] == ["Novo"]
+    assert [record.patient_id for _, _, record in target.iter_backup(since=since['exams'])] == ["P99"]
+    
+    delta = delta_backup(manager, target, full)
+    manager = new_session()
+    restored = ExamHistoryStore(str(tmp_path / "restored.db"))
+    full.seek(0)
+    manager.import_backup(full, history_store=restored)
+    assert manager.import_backup(delta, history_store=restored).imported == 1
+    assert manager.get_profile("Novo") is not None
+    assert len(restored) == 11
+    target.close()
+    restored.close()
+
+def test_full_import_keeps_profiles_whose_backup_record_is_invalid(manager):
+    manager.create_profile("Meu", {'Bioquímica': ['Glicose']})
+    manager.create_profile("Outro", {'Bioquímica': ['Ureia']})
+    manager.toggle_favorite("Meu")
+    data = json.loads(json.dumps(manager.export_data(), default=str))
+    data['profiles']["Meu"]['categories'] = "inválido"
+    del data['profiles']["Outro"]
+    
+    report = manager.import_backup(io.BytesIO(json.dumps(data).encode()))
+    
+    assert report.complete
+    assert [name for name, _ in report.failed] == ["Meu"]
+    assert report.removed == 1
+    assert manager.get_profile("Meu") is not None
+    assert manager.get_profile("Outro") is None
+    assert "Meu" in manager.favorite_names()
@@ -0,0 +1,22 @@
+import io
+import threading
+import zipfile
+
+from utils.batch_export import BatchPDFExporter, PDFJob
+
+RESULTS = {'GLICEMIA': {'Glicose': {'value': '90', 'unit': 'mg/dL', 'reference': '70.0 - 99.0'}}}
+
+def test_chunk_that_cannot_be_sent_to_a_worker_is_reported_as_failed():
+    jobs = [
+        PDFJob("ok_1", "Rotina", "10/03/2025", RESULTS),
+        # Locks cannot be pickled, so this chunk never reaches a worker
+        PDFJob("unpicklable", "Rotina", "10/03/2025", {'GLICEMIA': {'Glicose': threading.Lock()}}),
+        PDFJob("ok_2", "Rotina", "10/03/2025", RESULTS)
+    ]
+    buffer = io.BytesIO()
+    
+    report = BatchPDFExporter(max_workers=1, chunk_size=1).export_zip(jobs, buffer)
+    
+    assert (report.total, report.succeeded) == (3, 2)
+    assert [name for name, _ in report.failed] == ["unpicklable"]
+    assert sorted(zipfile.ZipFile(buffer).namelist()) == ["ok_1.pdf", "ok_2.pdf"]
@@ -0,0 +1,20 @@
+import os
+import stat
+
+from utils.cache import BytesCache, stable_hash
+
+def test_disk_tier_directory_is_private(tmp_path):
+    disk_dir = tmp_path / "pdf_cache"
+    
+    cache = BytesCache(max_bytes=1024, disk_dir=str(disk_dir), disk_max_bytes=4096)
+    cache.put("key", b"payload")
+    
+    assert stat.S_IMODE(os.stat(disk_dir).st_mode) & 0o077 == 0
+    assert BytesCache(max_bytes=1024, disk_dir=str(disk_dir), disk_max_bytes=4096).get("key") == b"payload"
+
+def test_stable_hash_depends_on_dict_order():
+    first = {'GLICEMIA': {'Glicose': 90, 'Insulina': 10}}
+    swapped = {'GLICEMIA': {'Insulina': 10, 'Glicose': 90}}
+    
+    assert stable_hash(first) == stable_hash({'GLICEMIA': {'Glicose': 90, 'Insulina': 10}})
+    assert stable_hash(first) != stable_hash(swapped)
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from utils.derived import DERIVED_ENGINE
+
+LIPIDS = 'PERFIL LIPÍDICO'
+
+def lipid_frame(values):
+    return pd.DataFrame(
+        [(sample, LIPIDS, exam, value) for sample, exams in values.items() for exam, value in exams.items()],
+        columns=['sample', 'category', 'exam', 'value']
+    )
+
+def derived_values(derived):
+    return {(row.sample, row.exam): row.value for row in derived.itertuples()}
+
+def test_stored_derived_values_take_precedence_and_feed_downstream():
+    frame = lipid_frame({
+        'A': {'Colesterol Total': 200.0, 'HDL': 50.0, 'Colesterol Não-HDL': 140.0, 'Triglicerídeos': 100.0},
+        'B': {'Colesterol Total': 200.0, 'HDL': 50.0, 'Triglicerídeos': 100.0}
+    })
+    
+    derived = derived_values(DERIVED_ENGINE.derive_frame(frame, 'sample'))
+    
+    # A: the stored non-HDL (140) is kept and used by Friedewald: 140 - 100 / 5
+    assert ('A', 'Colesterol Não-HDL') not in derived
+    assert derived[('A', 'LDL (Friedewald)')] == 120.0
+    # B: non-HDL is computed (200 - 50) and feeds LDL: 150 - 100 / 5
+    assert derived[('B', 'Colesterol Não-HDL')] == 150.0
+    assert derived[('B', 'LDL (Friedewald)')] == 130.0
+
+def test_stored_result_without_inputs_feeds_downstream():
+    frame = lipid_frame({'A': {'Colesterol Não-HDL': 140.0, 'Triglicerídeos': 100.0}})
+    
+    derived = derived_values(DERIVED_ENGINE.derive_frame(frame, 'sample'))
+    
+    assert derived == {('A', 'LDL (Friedewald)'): 120.0}
+
+def test_compute_columns_fills_only_missing_cells():
+    columns = {
+        (LIPIDS, 'Colesterol Total'): np.array([200.0, 200.0]),
+        (LIPIDS, 'HDL'): np.array([50.0, 50.0]),
+        (LIPIDS, 'Colesterol Não-HDL'): np.array([140.0, np.nan]),
+        (LIPIDS, 'Triglicerídeos'): np.array([100.0, 100.0])
+    }
+    
+    computed = DERIVED_ENGINE.compute_columns(columns, only=[(LIPIDS, 'Colesterol Não-HDL'), (LIPIDS, 'LDL (Friedewald)')])
+    
+    np.testing.assert_array_equal(computed[(LIPIDS, 'Colesterol Não-HDL')], [140.0, 150.0])
+    np.testing.assert_array_equal(computed[(LIPIDS, 'LDL (Friedewald)')], [120.0, 130.0])
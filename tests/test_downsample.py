@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from utils.downsample import lttb
+
+@pytest.mark.parametrize("n, threshold", [(10, 3), (11, 10), (1000, 50), (1001, 500), (5000, 7)])
+def test_keeps_endpoints_and_point_count(n, threshold):
+    rng = np.random.default_rng(n)
+    x = np.cumsum(rng.uniform(0.5, 2.0, n))
+    y = rng.normal(100.0, 15.0, n)
+    
+    selected = lttb(x, y, threshold)
+    
+    assert len(selected) == threshold
+    assert selected[0] == 0 and selected[-1] == n - 1
+    assert np.all(np.diff(selected) > 0)
+
+def test_short_series_is_returned_whole():
+    x = np.arange(5.0)
+    
+    assert lttb(x, x * 2, 5).tolist() == [0, 1, 2, 3, 4]
+    assert lttb(x, x * 2, 100).tolist() == [0, 1, 2, 3, 4]
+    assert lttb([], [], 3).tolist() == []
+
+def test_isolated_peaks_are_kept():
+    y = np.full(1000, 90.0)
+    y[[137, 512, 880]] = [250.0, 20.0, 300.0]
+    
+    selected = lttb(np.arange(1000.0), y, 20)
+    
+    assert {137, 512, 880} <= set(selected.tolist())
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        lttb(np.arange(10.0), np.arange(9.0), 5)
+    with pytest.raises(ValueError):
+        lttb(np.arange(10.0), np.arange(10.0), 2)
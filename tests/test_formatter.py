@@ -0,0 +1,48 @@
+import math
+
+import pandas as pd
+import pytest
+
+from utils.formatter import classify_batch, get_status_from_values, parse_reference
+
+CASES = [
+    ("50", "70-99"),
+    ("69,9", "70-99"),
+    ("70", "70-99"),
+    ("85.5", "70-99"),
+    ("99", "70-99"),
+    ("99.01", "70-99"),
+    ("300", "70-99"),
+    ("0", "0-5"),
+    ("nan", "70-99"),
+    ("abc", "70-99"),
+    ("", "70-99"),
+    ("90", "inválido"),
+    ("90", "70"),
+    ("90", "70-99-120")
+]
+
+def parse_value(text):
+    try:
+        return float(text.replace(',', '.'))
+    except ValueError:
+        return math.nan
+
+@pytest.mark.parametrize('value, reference', CASES)
+def test_classify_batch_matches_get_status_from_values(value, reference):
+    low, high = parse_reference(reference)
+    
+    status = classify_batch([parse_value(value)], [low], [high])
+    
+    assert status.tolist() == [get_status_from_values(value, reference)]
+
+def test_classify_batch_accepts_a_frame():
+    bounds = [parse_reference(reference) for _, reference in CASES]
+    frame = pd.DataFrame({
+        'value': [parse_value(value) for value, _ in CASES],
+        'min': [low for low, _ in bounds],
+        'max': [high for _, high in bounds]
+    })
+    
+    expected = [get_status_from_values(value, reference) for value, reference in CASES]
+    assert classify_batch(frame).tolist() == expected
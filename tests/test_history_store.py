@@ -0,0 +1,90 @@
+from datetime import datetime
+
+from models.exam import CompleteExamResult, ExamResult
+from utils.history_store import ExamHistoryStore, record_uid
+
+def test_restore_skips_records_already_stored(history_store, sample_record):
+    record_id = history_store.append(sample_record)
+    
+    restored = history_store.restore_many([(record_id, None, sample_record)])
+    
+    assert restored == 0
+    assert len(history_store) == 1
+
+def test_restore_into_non_empty_database_renumbers_colliding_ids(history_store, tmp_path, sample_record, make_record):
+    # Backup taken on another install, whose record 1 is a different exam
+    source = ExamHistoryStore(str(tmp_path / "source.db"))
+    other = make_record("P2", datetime(2025, 4, 1, 9, 30), {("Bioquímica", "Ureia"): 30.0})
+    source.append(other)
+    backup = list(source.iter_backup())
+    source.close()
+    
+    local_id = history_store.append(sample_record)
+    restored = history_store.restore_many(backup)
+    
+    assert restored == 1
+    assert len(history_store) == 2
+    assert history_store.get(local_id).patient_id == "P1"
+    [(new_id, uid, record)] = [item for item in history_store.iter_backup() if item[0] != local_id]
+    assert new_id != local_id
+    assert uid == backup[0][1]
+    assert record.patient_id == "P2"
+    assert history_store.exam_type_counts() == [("Rotina", 2)]
+    
+    # Restoring the same backup again adds nothing
+    assert history_store.restore_many(backup) == 0
+
+def test_record_identity_survives_added_values(history_store, sample_record):
+    record_id = history_store.append(sample_record)
+    history_store.add_values([(record_id, "Bioquímica", "Ureia", 30.0, "mg/dL", "15-40", "NORMAL")])
+    
+    [(_, uid, record)] = list(history_store.iter_backup())
+    
+    assert uid == record_uid(sample_record)
+    assert uid != record_uid(record)
+    assert history_store.restore_many([(record_id, uid, record)]) == 0
+
+def test_added_values_move_records_to_a_new_revision(history_store, sample_record, make_record):
+    first = history_store.append(sample_record)
+    history_store.append(make_record("P2", datetime(2025, 4, 1), {("Bioquímica", "Ureia"): 30.0}))
+    checkpoint = history_store.revision()
+    
+    history_store.add_values([(first, "Bioquímica", "Ureia", 30.0, "mg/dL", "15-40", "NORMAL")])
+    
+    assert history_store.revision() > checkpoint
+    assert [record_id for record_id, _, _ in history_store.iter_backup(since=checkpoint)] == [first]
+    assert history_store.last_id() == first + 1
+
+def test_aggregates_agree_with_a_recount_of_the_values(history_store, tmp_path):
+    def record(patient_id, day, exam_type, statuses):
+        results = {}
+        for (category, exam_name), status in statuses.items():
+            results.setdefault(category, {})[exam_name] = ExamResult(
+                value=1.0, unit="mg/dL", reference="0-2", status=status
+            )
+        return CompleteExamResult(exam_type=exam_type, date=datetime(2025, 3, day, 8), results=results, patient_id=patient_id)
+    
+    glucose, urea = ("GLICEMIA", "Glicose"), ("FUNÇÃO RENAL", "Ureia")
+    first = history_store.append(record("P1", 10, "Rotina", {glucose: "ALTO", urea: "NORMAL"}))
+    history_store.append_many([
+        record("P2", 10, "Rotina", {glucose: "BAIXO"}),
+        record("P3", 11, "Check-up", {urea: "ALTO"})
+    ])
+    history_store.add_values([(first, "GLICEMIA", "Insulina", 30.0, "µU/mL", "2-25", "ALTO")])
+    source = ExamHistoryStore(str(tmp_path / "source.db"))
+    source.append(record("P4", 12, "Check-up", {glucose: "NORMAL"}))
+    history_store.restore_many(source.iter_backup())
+    source.close()
+    
+    values = history_store.value_frame(['category', 'exam', 'status'])
+    recount = values.groupby(['category', 'exam'])['status'].agg(
+        total='size', alto=lambda s: (s == "ALTO").sum(), baixo=lambda s: (s == "BAIXO").sum()
+    )
+    assert history_store.exam_counts() == [(category, exam, *map(int, row)) for (category, exam), row in recount.iterrows()]
+    
+    records = [record for _, record in history_store.iter_records()]
+    days = sorted({record.date.date().isoformat() for record in records})
+    assert history_store.daily_counts() == [
+        (day, sum(record.date.date().isoformat() == day for record in records)) for day in days
+    ]
+    assert dict(history_store.exam_type_counts()) == {"Rotina": 2, "Check-up": 2}
@@ -0,0 +1,113 @@
+import io
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from utils.ingest import DEFAULT_COLUMNS, ingest_results, read_result_chunks
+
+HEADER = "sample_id,patient_id,date,code,value\n"
+
+def test_header_only_file_ingests_nothing(history_store):
+    report = ingest_results(io.StringIO(HEADER), history_store)
+    
+    assert (report.rows, report.records, report.error_count) == (0, 0, 0)
+    assert len(history_store) == 0
+
+def test_chunks_never_split_a_sample():
+    lines = "".join(f"A{n // 3},P1,2025-03-10,GLU,{90 + n}\n" for n in range(10))
+    
+    chunks = list(read_result_chunks(io.StringIO(HEADER + lines), chunk_size=3))
+    
+    assert sum(len(chunk) for chunk in chunks) == 10
+    assert all(len(chunk) for chunk in chunks)
+    firsts = [chunk['sample'].iloc[0] for chunk in chunks]
+    assert len(set(firsts)) == len(firsts)
+
+def test_dates_with_utc_offset_are_read_as_local_time(history_store):
+    lines = (
+        "A1,P1,2025-03-10T10:00:00Z,GLU,90\n"
+        "A2,P1,2025-03-10T10:00:00-03:00,GLU,91\n"
+        "A3,P1,2025-03-10 10:00,GLU,92\n"
+        "A4,P1,10/03/2025,GLU,93\n"
+        "A5,P1,2099-01-01T00:00:00+00:00,GLU,94\n"
+    )
+    
+    report = ingest_results(io.StringIO(HEADER + lines), history_store)
+    
+    assert report.records == 4
+    assert report.errors == [(6, "Exam date cannot be in the future.")]
+    utc = datetime(2025, 3, 10, 10, 0, tzinfo=timezone.utc)
+    expected = [
+        utc.astimezone().replace(tzinfo=None),
+        (utc + timedelta(hours=3)).astimezone().replace(tzinfo=None),
+        datetime(2025, 3, 10, 10, 0),
+        datetime(2025, 3, 10)
+    ]
+    assert [record.date for _, record in history_store.iter_records()] == expected
+
+def test_importing_the_same_file_twice_skips_stored_samples(history_store):
+    content = HEADER + "A1,P1,2025-03-10,GLU,90\nA2,P2,2025-03-10,GLU,91\n"
+    ingest_results(io.StringIO(content), history_store)
+    
+    report = ingest_results(io.StringIO(content + "A3,P3,2025-03-10,GLU,92\n"), history_store)
+    
+    assert (report.records, report.duplicates) == (1, 2)
+    assert len(history_store) == 3
+
+def test_values_in_si_units_are_stored_in_conventional_units(history_store):
+    content = (
+        "sample_id,patient_id,date,code,value,unit\n"
+        "A1,P1,2025-03-10,GLU,\"5,55\",mmol/L\n"
+        "A1,P1,2025-03-10,CREA,88.4,umol/L\n"
+        "A1,P1,2025-03-10,HBA1C,42,mmol/mol\n"
+        "A2,P2,2025-03-10,GLU,99,mg/dL\n"
+        "A3,P3,2025-03-10,GLU,95,\n"
+        "A4,P4,2025-03-10,GLU,1.0,g/L\n"
+    )
+    
+    report = ingest_results(io.StringIO(content), history_store, columns={**DEFAULT_COLUMNS, 'unit': 'unit'})
+    
+    assert report.errors == [(7, "Unknown unit for GLU: g/L")]
+    records = {record.patient_id: record.results for _, record in history_store.iter_records()}
+    assert set(records) == {'P1', 'P2', 'P3'}
+    assert records['P1']['GLICEMIA']['Glicose'].value == 100.0
+    assert records['P1']['FUNÇÃO RENAL']['Creatinina'].value == 1.0
+    assert records['P1']['GLICEMIA']['Hemoglobina Glicada'].value == round((42 + 23.5) / 10.929, 4)
+    assert records['P2']['GLICEMIA']['Glicose'].value == 99.0
+    assert records['P3']['GLICEMIA']['Glicose'].value == 95.0
+
+@pytest.fixture
+def berlin_time(monkeypatch):
+    monkeypatch.setenv('TZ', "Europe/Berlin")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def test_utc_dates_get_the_offset_in_force_on_their_own_day(history_store, berlin_time):
+    lines = (
+        "A1,P1,2025-01-10T10:00:00Z,GLU,90\n"
+        "A2,P1,2025-07-10T10:00:00Z,GLU,91\n"
+        "A3,P1,2025-03-30T00:30:00Z,GLU,92\n"
+        "A4,P1,2025-03-30T01:30:00+00:00,GLU,93\n"
+    )
+    
+    ingest_results(io.StringIO(HEADER + lines), history_store)
+    
+    assert [record.date for _, record in history_store.iter_records()] == [
+        datetime(2025, 1, 10, 11, 0),
+        datetime(2025, 7, 10, 12, 0),
+        datetime(2025, 3, 30, 1, 30),
+        datetime(2025, 3, 30, 3, 30)
+    ]
+
+def test_distinct_samples_with_equal_results_are_all_kept(history_store):
+    content = HEADER + "A1,P1,2025-03-10,GLU,90\nA2,P1,2025-03-10,GLU,90\n"
+    
+    first = ingest_results(io.StringIO(content), history_store)
+    again = ingest_results(io.StringIO(content), history_store)
+    
+    assert (first.records, first.duplicates) == (2, 0)
+    assert (again.records, again.duplicates) == (0, 2)
+    assert len(history_store) == 2
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from models.exam import (
+    CompleteExamResult, CompleteExamResultView, ExamProfile, ExamProfileView, ExamResult
+)
+
+def test_profile_trusted_round_trip_equals_validated_model():
+    profile = ExamProfile(
+        name="Rotina",
+        categories={'GLICEMIA': ['Glicose', 'Insulina'], 'FUNÇÃO RENAL': ['Creatinina']},
+        description="Exames de rotina",
+        created_at=datetime(2025, 3, 1, 8, 0),
+        last_used=datetime(2025, 3, 10, 9, 30)
+    )
+    
+    data = profile.to_trusted_dict()
+    
+    assert data == profile.model_dump()
+    assert ExamProfile.from_trusted(data) == profile
+    assert ExamProfileView.from_trusted(data).get_exam_count() == profile.get_exam_count() == 3
+
+def test_complete_result_trusted_round_trip_equals_validated_model():
+    record = CompleteExamResult(
+        exam_type="Rotina",
+        date=datetime(2025, 3, 10, 8, 0),
+        results={'GLICEMIA': {'Glicose': ExamResult(value=110.0, unit="mg/dL", reference="70-99", status="ALTO")}},
+        patient_id="P1"
+    )
+    
+    data = record.to_trusted_dict()
+    
+    assert data == record.model_dump()
+    assert CompleteExamResult.from_trusted(data) == record
+    view = CompleteExamResultView.from_trusted(data)
+    assert view.results['GLICEMIA']['Glicose'].status == "ALTO"
+
+def test_from_trusted_accepts_iso_dates():
+    data = {
+        'exam_type': "Rotina",
+        'date': "2025-03-10T08:00:00",
+        'results': {'GLICEMIA': {'Glicose': {'value': 90.0, 'unit': "mg/dL", 'reference': "70-99"}}}
+    }
+    
+    assert CompleteExamResult.from_trusted(data) == CompleteExamResult(**data)
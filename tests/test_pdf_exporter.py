@@ -0,0 +1,32 @@
+import io
+
+import pytest
+from reportlab import rl_config
+
+from utils.pdf_exporter import PDFExporter
+
+@pytest.fixture
+def exporter(monkeypatch):
+    # Fixed creation date and document ID, so renders can be compared byte for byte
+    monkeypatch.setattr(rl_config, 'invariant', 1)
+    results = {
+        'GLICEMIA': {
+            f"Exame {i}": {'value': str(60 + i), 'unit': "mg/dL", 'reference': "70-99"}
+            for i in range(120)
+        }
+    }
+    return PDFExporter("Rotina", "10/03/2025", results)
+
+def test_export_modes_produce_the_same_bytes(exporter):
+    pdf = exporter.export()
+    
+    buffer = io.BytesIO()
+    exporter.export_to(buffer)
+    with exporter.export_spooled(max_size=1024) as spool:
+        # Rolled over to a temporary file, which has a name
+        assert spool.name is not None
+        spooled = spool.read()
+    
+    assert pdf.startswith(b"%PDF")
+    assert buffer.getvalue() == pdf
+    assert spooled == pdf
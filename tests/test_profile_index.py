@@ -0,0 +1,49 @@
+from datetime import datetime
+
+import pytest
+
+from utils.profile_index import ProfileSummaryIndex
+
+def profile(day):
+    return {'categories': {'GLICEMIA': ['Glicose']}, 'last_used': datetime(2025, 3, day)}
+
+@pytest.fixture
+def index():
+    items = [("A", profile(1)), ("B", profile(2)), ("C", profile(3)), ("D", profile(4))]
+    return ProfileSummaryIndex.build(items, favorites={"C"})
+
+def names(summaries):
+    return [summary['name'] for summary in summaries]
+
+def test_recency_follows_touches(index):
+    assert names(index.recent(3)) == ["D", "C", "B"]
+    
+    index.touch("A", datetime(2025, 3, 5))
+    
+    assert names(index.recent(2)) == ["A", "D"]
+    assert names(index.recent(10)) == ["A", "D", "C", "B"]
+    assert index.recent(0) == []
+
+def test_rename_moves_the_profile_in_both_orderings(index):
+    data = profile(2)
+    index.remove("B")
+    index.upsert("E", data, False)
+    
+    assert names(index.recent(4)) == ["D", "C", "E", "A"]
+    assert names(index.ordered_listing()) == ["C", "A", "D", "E"]
+
+def test_favorites_come_first_by_name(index):
+    index.set_favorite("D", True)
+    index.set_favorite("C", False)
+    index.set_favorite("A", True)
+    
+    assert names(index.ordered_listing()) == ["A", "D", "B", "C"]
+    assert [summary['is_favorite'] for summary in index.ordered_listing()] == [True, True, False, False]
+
+def test_deleted_profiles_leave_every_ordering(index):
+    index.remove("C")
+    index.remove("missing")
+    
+    assert "C" not in index and len(index) == 3
+    assert names(index.recent(4)) == ["D", "B", "A"]
+    assert names(index.ordered_listing()) == ["A", "B", "D"]
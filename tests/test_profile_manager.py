@@ -0,0 +1,128 @@
+import time
+
+import pytest
+import streamlit as st
+
+from data.defaults import DERIVED_ANALYTES
+from utils import profile_manager
+from utils.profile_manager import ExamProfileManager, get_default_profiles
+from utils.profile_store import SessionStateProfileStore, SQLiteProfileStore
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteProfileStore(str(tmp_path / "profiles.db"))
+    yield store
+    store.close()
+
+def stored_last_used(store, name):
+    return store.get(name)['last_used']
+
+def new_session_store():
+    for key in list(st.session_state.keys()):
+        del st.session_state[key]
+    return SessionStateProfileStore()
+
+def test_touches_are_flushed_in_batches_by_size(store):
+    manager = ExamProfileManager(store)
+    manager.TOUCH_FLUSH_INTERVAL = 3600.0
+    manager.TOUCH_FLUSH_SIZE = 2
+    first, second = [p['name'] for p in manager.get_all_profiles()[:2]]
+    before = {name: stored_last_used(store, name) for name in (first, second)}
+    revision = store.revision()
+    
+    manager.get_profile(first)
+    assert store.revision() == revision
+    assert stored_last_used(store, first) == before[first]
+    assert manager.recent(1)[0]['name'] == first
+    
+    manager.get_profile(second)
+    assert store.revision() == revision + 1
+    assert all(stored_last_used(store, name) != before[name] for name in (first, second))
+
+def test_touches_are_flushed_by_timer_without_further_calls(store):
+    manager = ExamProfileManager(store)
+    manager.TOUCH_FLUSH_INTERVAL = 0.2
+    name = manager.get_all_profiles()[0]['name']
+    before = stored_last_used(store, name)
+    
+    manager.get_profile(name)
+    assert stored_last_used(store, name) == before
+    
+    time.sleep(0.6)
+    assert stored_last_used(store, name) != before
+
+def test_touches_are_flushed_at_exit(store):
+    manager = ExamProfileManager(store)
+    name = manager.get_all_profiles()[0]['name']
+    before = stored_last_used(store, name)
+    manager.get_profile(name)
+    
+    profile_manager._flush_shared_managers()
+    
+    assert stored_last_used(store, name) != before
+
+def test_default_profiles_leave_derived_analytes_out():
+    derived = {(category, exam) for category, exams in DERIVED_ANALYTES.items() for exam in exams}
+    for profile in get_default_profiles().values():
+        exams = {(category, exam) for category, names in profile['categories'].items() for exam in names}
+        assert exams and not exams & derived
+
+def test_listings_follow_writes_from_another_manager(store):
+    first = ExamProfileManager(store)
+    second = ExamProfileManager(store)
+    names = [p['name'] for p in first.get_all_profiles()]
+    
+    second.create_profile("Perfil Novo", {'BIOQUÍMICA': ['Glicose']})
+    second.toggle_favorite(names[0])
+    
+    listing = {p['name']: p for p in first.get_all_profiles()}
+    assert set(listing) == set(names) | {"Perfil Novo"}
+    assert listing[names[0]]['is_favorite']
+    assert first.ordered_listing()[0]['name'] == names[0]
+    
+    second.delete_profile("Perfil Novo")
+    assert sorted(p['name'] for p in first.get_all_profiles()) == sorted(names)
+
+def test_own_writes_keep_the_index_in_step_with_the_store(store):
+    manager = ExamProfileManager(store)
+    manager.create_profile("Perfil Novo", {'BIOQUÍMICA': ['Glicose']})
+    manager.toggle_favorite("Perfil Novo")
+    manager.get_profile("Perfil Novo")
+    manager.flush()
+    
+    def by_name(profiles):
+        return sorted(profiles, key=lambda p: p['name'])
+    
+    assert by_name(manager.get_all_profiles()) == by_name(ExamProfileManager(store).get_all_profiles())
+    assert manager.recent(3) == ExamProfileManager(store).recent(3)
+
+def test_shared_default_profiles_are_read_only():
+    name, default = next(iter(get_default_profiles().items()))
+    
+    with pytest.raises(TypeError):
+        default['description'] = "Alterado"
+    with pytest.raises(TypeError):
+        default['categories']['BIOQUÍMICA'] = ('Glicose',)
+    with pytest.raises(AttributeError):
+        next(iter(default['categories'].values())).append('Glicose')
+
+def test_session_changes_to_default_profiles_do_not_leak():
+    name, default = next(iter(get_default_profiles().items()))
+    last_used = default['last_used']
+    
+    first_store = new_session_store()
+    first = ExamProfileManager(first_store)
+    assert first_store.get(name) is default
+    first.get_profile(name)
+    first.toggle_favorite(name)
+    first.flush()
+    touched = first_store.get(name)
+    
+    assert touched is not default
+    assert touched['last_used'] != last_used
+    assert default['last_used'] == last_used
+    
+    second_store = new_session_store()
+    second = ExamProfileManager(second_store)
+    assert second_store.get(name) is default
+    assert not next(p for p in second.get_all_profiles() if p['name'] == name)['is_favorite']
@@ -0,0 +1,137 @@
+from datetime import datetime
+
+import pytest
+
+from utils.profile_store import SQLiteProfileStore
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteProfileStore(str(tmp_path / "profiles.db"))
+    yield store
+    store.close()
+
+def make_profile(name, categories=None):
+    return {
+        'name': name,
+        'categories': categories or {'BIOQUÍMICA': ['Glicose']},
+        'description': f"Perfil {name}",
+        'is_default': False,
+        'created_at': datetime(2025, 1, 1, 8, 0),
+        'last_used': datetime(2025, 1, 2, 8, 0)
+    }
+
+def test_put_get_and_delete(store):
+    store.put('A', make_profile('A'))
+    store.put_many({'B': make_profile('B'), 'C': make_profile('C', {'LIPÍDIOS': ['HDL', 'LDL']})})
+    
+    assert store.get('A') == make_profile('A')
+    assert store.get('C')['categories'] == {'LIPÍDIOS': ['HDL', 'LDL']}
+    assert store.get('Z') is None
+    assert 'B' in store and 'Z' not in store
+    assert len(store) == 3
+    assert [name for name, _ in store.items()] == ['A', 'B', 'C']
+    
+    store.put('A', make_profile('A', {'HEMOGRAMA': ['Hemoglobina']}))
+    assert store.get('A')['categories'] == {'HEMOGRAMA': ['Hemoglobina']}
+    assert len(store) == 3
+    
+    store.delete('A')
+    store.delete_many(['B', 'Z'])
+    assert [name for name, _ in store.items()] == ['C']
+
+def test_touch_many_updates_last_used(store):
+    store.put_many({'A': make_profile('A'), 'B': make_profile('B')})
+    touched = datetime(2025, 6, 1, 12, 30)
+    
+    store.touch_many({'A': touched, 'Z': touched})
+    
+    assert store.get('A')['last_used'] == touched
+    assert store.get('B')['last_used'] == make_profile('B')['last_used']
+    assert 'Z' not in store
+
+def test_favorites(store):
+    store.put_many({name: make_profile(name) for name in 'ABC'})
+    
+    store.set_favorite('A', True)
+    store.set_favorite('Z', True)
+    assert store.favorites() == {'A'}
+    
+    store.set_favorites(['B', 'C'])
+    assert store.favorites() == {'B', 'C'}
+    
+    store.set_favorite('B', False)
+    store.delete('C')
+    assert store.favorites() == set()
+    
+    store.put('C', make_profile('C'))
+    assert store.favorites() == set()
+
+def test_changes_and_tombstones_since(store):
+    store.put_many({name: make_profile(name) for name in 'ABC'})
+    checkpoint = store.revision()
+    
+    store.set_favorite('A', True)
+    store.delete('B')
+    store.put('D', make_profile('D'))
+    
+    assert [(name, favorite) for name, _, favorite in store.changes_since(checkpoint)] == [('A', True), ('D', False)]
+    assert store.tombstones_since(checkpoint) == ['B']
+    assert store.tombstones_since(store.revision()) == []
+    
+    store.put('B', make_profile('B'))
+    assert store.tombstones_since(checkpoint) == []
+
+def test_clear_and_replace_all_leave_tombstones(store):
+    store.put_many({name: make_profile(name) for name in 'AB'})
+    store.set_favorite('A', True)
+    checkpoint = store.revision()
+    
+    store.replace_all({'B': make_profile('B'), 'C': make_profile('C')}, ['C'])
+    assert [name for name, _ in store.items()] == ['B', 'C']
+    assert store.favorites() == {'C'}
+    assert store.tombstones_since(checkpoint) == ['A']
+    
+    store.clear()
+    assert len(store) == 0
+    assert store.favorites() == set()
+    assert store.tombstones_since(checkpoint) == ['A', 'B', 'C']
+
+def test_every_write_advances_the_revision(store):
+    revisions = [store.revision()]
+    for write in (
+        lambda: store.put('A', make_profile('A')),
+        lambda: store.touch_many({'A': datetime(2025, 6, 1)}),
+        lambda: store.set_favorite('A', True),
+        lambda: store.set_favorites([]),
+        lambda: store.delete('A'),
+        lambda: store.clear()
+    ):
+        write()
+        revisions.append(store.revision())
+    
+    assert revisions == sorted(set(revisions))
+
+def test_advance_revision_never_lowers_it(store):
+    store.put('A', make_profile('A'))
+    
+    store.advance_revision(10)
+    assert store.revision() == 10
+    store.advance_revision(3)
+    assert store.revision() == 10
+    
+    store.put('B', make_profile('B'))
+    assert store.revision() == 11
+
+def test_profiles_persist_across_connections(tmp_path):
+    path = str(tmp_path / "profiles.db")
+    first = SQLiteProfileStore(path)
+    first.put('A', make_profile('A'))
+    first.set_favorite('A', True)
+    first.close()
+    
+    second = SQLiteProfileStore(path)
+    try:
+        assert second.get('A') == make_profile('A')
+        assert second.favorites() == {'A'}
+    finally:
+        second.close()
@@ -0,0 +1,62 @@
+import numpy as np
+
+from utils.reference_index import REFERENCE_INDEX
+
+SEXES = [None, 'M', 'F', 'x']
+AGES = [None, -1.0, 0.0, 1.5, 2.0, 11.99, 12.0, 17.0, 18.0, 49.0, 50.0, 69.5, 70.0, 130.0]
+
+def test_resolve_many_matches_resolve():
+    cases = [(ref_id, sex, age) for ref_id in range(len(REFERENCE_INDEX)) for sex in SEXES for age in AGES]
+    ref_ids, sexes, ages = zip(*cases)
+    
+    resolved = REFERENCE_INDEX.resolve_many(
+        np.array(ref_ids), np.array(sexes, dtype=object), np.array([np.nan if age is None else age for age in ages])
+    )
+    
+    expected = [REFERENCE_INDEX.resolve(ref_id, sex, age) for ref_id, sex, age in cases]
+    assert resolved.tolist() == expected
+
+def test_most_specific_range_wins():
+    base = REFERENCE_INDEX.get_id('HEMOGRAMA', 'Hemoglobina')
+    
+    assert REFERENCE_INDEX.resolve(base) == base
+    assert REFERENCE_INDEX.bounds(REFERENCE_INDEX.resolve(base, 'F')) == (12.0, 15.5)
+    assert REFERENCE_INDEX.bounds(REFERENCE_INDEX.resolve(base, 'F', 15)) == (12.0, 16.0)
+    assert REFERENCE_INDEX.bounds(REFERENCE_INDEX.resolve(base, 'M', 15)) == (13.0, 16.0)
+    assert REFERENCE_INDEX.bounds(REFERENCE_INDEX.resolve(base, None, 5)) == (11.5, 15.5)
+    assert REFERENCE_INDEX.resolve(base, None, 15) == base
+
+def test_classify_matches_formatter_at_range_edges():
+    from utils.formatter import get_status_from_values
+    
+    for ref_id in range(len(REFERENCE_INDEX)):
+        ref_min, ref_max = REFERENCE_INDEX.bounds(ref_id)
+        reference = f"{ref_min}-{ref_max}"
+        for value in (ref_min - 0.01, ref_min, (ref_min + ref_max) / 2, ref_max, ref_max + 0.01):
+            assert REFERENCE_INDEX.classify(value, ref_id) == get_status_from_values(str(value), reference)
+
+def test_age_bands_are_half_open():
+    base = REFERENCE_INDEX.get_id('HEMOGRAMA', 'Hemoglobina')
+    
+    def bounds(sex, age):
+        return REFERENCE_INDEX.bounds(REFERENCE_INDEX.resolve(base, sex, age))
+    
+    assert bounds(None, 0.0) == (10.5, 13.5)
+    assert bounds(None, 1.999) == (10.5, 13.5)
+    assert bounds(None, 2.0) == (11.5, 15.5)
+    assert bounds('M', 11.999) == (11.5, 15.5)
+    assert bounds('M', 12.0) == (13.0, 16.0)
+    assert bounds('F', 12.0) == (12.0, 16.0)
+    assert bounds('F', 17.999) == (12.0, 16.0)
+    assert bounds('F', 18.0) == (12.0, 15.5)
+    assert bounds('M', 18.0) == (13.5, 17.5)
+    assert bounds(None, 12.0) == (13.5, 17.5)
+
+def test_sex_spellings_resolve_alike():
+    base = REFERENCE_INDEX.get_id('HEMOGRAMA', 'Hemoglobina')
+    female = REFERENCE_INDEX.resolve(base, 'F')
+    
+    for sex in ('f', 'Feminino', ' FEMININO ', 'female'):
+        assert REFERENCE_INDEX.resolve(base, sex) == female
+    for sex in ('', 'X', 0, 3):
+        assert REFERENCE_INDEX.resolve(base, sex) == base
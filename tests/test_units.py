@@ -0,0 +1,23 @@
+import numpy as np
+
+from utils.reference_index import REFERENCE_INDEX
+from utils.units import UNIT_CONVENTIONAL, UNIT_REGISTRY, UNIT_SI
+
+def test_si_conversion_round_trips_for_every_range():
+    ids = np.arange(len(REFERENCE_INDEX))
+    values = np.linspace(0.5, 500, len(ids))
+    
+    si = UNIT_REGISTRY.convert(values, ids, UNIT_SI)
+    
+    np.testing.assert_allclose(UNIT_REGISTRY.to_conventional(si, ids, UNIT_SI), values)
+    np.testing.assert_array_equal(UNIT_REGISTRY.convert(values, ids, UNIT_CONVENTIONAL), values)
+
+def test_to_canonical_reads_units_of_either_system():
+    ref_id = REFERENCE_INDEX.get_id('GLICEMIA', 'Glicose')
+    units = ["mmol/L", " MG/DL ", None, "g/L"]
+    
+    values, recognized = UNIT_REGISTRY.to_canonical([5.55, 90.0, 95.0, 1.0], [ref_id] * 4, units)
+    
+    np.testing.assert_allclose(values[:3], [100.0, 90.0, 95.0])
+    assert np.isnan(values[3])
+    assert recognized.tolist() == [True, True, True, False]
@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+from models.validation import ExamDataValidator, ValidationError
+
+@pytest.mark.parametrize('value', ["nan", "inf", "-inf", "Infinity"])
+def test_numeric_value_rejects_non_finite(value):
+    with pytest.raises(ValidationError):
+        ExamDataValidator.validate_numeric_value(value, "Glicose")
+
+def test_numeric_value_and_series_agree():
+    raw = ["90", " 4,5 ", "", "nan", "inf", "-1", "abc"]
+    numbers, errors = ExamDataValidator.validate_numeric_series(pd.Series(raw, dtype=object))
+    for i, value in enumerate(raw):
+        try:
+            expected = ExamDataValidator.validate_numeric_value(value, "Glicose")
+        except ValidationError:
+            assert i in errors.index
+            continue
+        assert i not in errors.index
+        if expected is None:
+            assert pd.isna(numbers[i])
+        else:
+            assert numbers[i] == expected
+
+@pytest.mark.parametrize('text', ["", "  ", "90", "4,5", " 4.5 ", "-1", "-0,5", "abc", "1.2.3", "nan", "inf", "1e400", "2e3"])
+def test_batch_matches_single_value_validation(text):
+    batch = ExamDataValidator.validate_batch({'Bioquímica': {'Glicose': text}})
+    try:
+        expected = ExamDataValidator.validate_numeric_value(text, "Glicose")
+    except ValidationError as e:
+        assert batch.values['Bioquímica'] == {}
+        assert [error.message for error in batch.errors] == [str(e)]
+        return
+    assert batch.errors == []
+    assert batch.values['Bioquímica'] == ({} if expected is None else {'Glicose': expected})
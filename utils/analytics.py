@@ -0,0 +1,296 @@
+"""
+Columnar representation of exam history for analytics.
+
+Exam results are flattened into a long DataFrame with one row per
+(record, category, exam). Aggregations are vectorized group-bys over the
+few columns they need, and the frame can be persisted as a Parquet dataset
+partitioned by month and category.
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401 - Parquet engine
+except ImportError:  # Parquet persistence is optional
+    pyarrow = None
+
+from models.exam import CompleteExamResult
+from utils.cache import LRUCache
+from utils.downsample import lttb
+from utils.history_store import ExamHistoryStore
+
+# Column order of the long-format history frame
+HISTORY_COLUMNS: List[str] = [
+    'record_id', 'patient_id', 'exam_type', 'date',
+    'category', 'exam', 'value', 'unit', 'reference', 'status'
+]
+
+# Low-cardinality columns stored as pandas categoricals (Arrow dictionaries)
+CATEGORICAL_COLUMNS: List[str] = ['exam_type', 'category', 'exam', 'unit', 'reference', 'status']
+
+# Partition columns of the Parquet dataset
+PARTITION_COLUMNS: List[str] = ['month', 'category']
+
+# Columns read by each aggregation
+ABNORMAL_RATE_COLUMNS: List[str] = ['category', 'exam', 'status']
+DISTRIBUTION_COLUMNS: List[str] = ['category', 'exam', 'value']
+
+# Maximum number of points of a trend series sent to the browser
+TREND_MAX_POINTS = 500
+
+# Downsampled trend series keyed by (patient, category, exam, window, points, history revision)
+TREND_CACHE = LRUCache(maxsize=128)
+
+class TrendSeries(NamedTuple):
+    """A (possibly downsampled) series of one exam of one patient."""
+    points: pd.DataFrame
+    total_points: int
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    """Applies the history dtypes to whichever history columns are present."""
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    if 'value' in df.columns:
+        df['value'] = df['value'].astype(float)
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'])
+    return df
+
+def records_to_frame(records: Iterable[Tuple[int, CompleteExamResult]]) -> pd.DataFrame:
+    """
+    Flattens exam results into the long-format history frame.
+    
+    Args:
+        records: (record ID, CompleteExamResult) pairs, e.g. from
+            ExamHistoryStore.iter_records().
+    
+    Returns:
+        DataFrame with HISTORY_COLUMNS.
+    """
+    columns: Dict[str, List[Any]] = {col: [] for col in HISTORY_COLUMNS}
+    for record_id, record in records:
+        for category, exams in record.results.items():
+            for exam_name, res in exams.items():
+                columns['record_id'].append(record_id)
+                columns['patient_id'].append(record.patient_id)
+                columns['exam_type'].append(record.exam_type)
+                columns['date'].append(record.date)
+                columns['category'].append(category)
+                columns['exam'].append(exam_name)
+                columns['value'].append(res.value)
+                columns['unit'].append(res.unit)
+                columns['reference'].append(res.reference)
+                columns['status'].append(res.status)
+    return _typed(pd.DataFrame(columns, columns=HISTORY_COLUMNS))
+
+def frame_to_records(df: pd.DataFrame) -> List[Tuple[int, CompleteExamResult]]:
+    """
+    Rebuilds exam results from a history frame.
+    
+    Args:
+        df: DataFrame with HISTORY_COLUMNS (extra columns are ignored).
+    
+    Returns:
+        (record ID, CompleteExamResult) pairs, ordered by record ID.
+    """
+    records: Dict[int, Dict[str, Any]] = {}
+    rows = df[HISTORY_COLUMNS].sort_values('record_id', kind='stable')
+    for row in rows.itertuples(index=False):
+        record_id = int(row.record_id)
+        record = records.get(record_id)
+        if record is None:
+            record = records[record_id] = {
+                'exam_type': row.exam_type,
+                'date': row.date.to_pydatetime(),
+                'results': {},
+                'patient_id': None if pd.isna(row.patient_id) else row.patient_id
+            }
+        record['results'].setdefault(row.category, {})[row.exam] = {
+            'value': float(row.value),
+            'unit': row.unit,
+            'reference': row.reference,
+            'status': row.status
+        }
+    return [(record_id, CompleteExamResult.from_trusted(data)) for record_id, data in records.items()]
+
+def history_frame(store: ExamHistoryStore, columns: Optional[Sequence[str]] = None, **filters: Any) -> pd.DataFrame:
+    """
+    Loads a history frame straight from the history store.
+    
+    Args:
+        store: Exam history store.
+        columns: Columns to read; all history columns if None.
+        **filters: patient_id, exam_type, start and end filters of
+            ExamHistoryStore.value_frame.
+    
+    Returns:
+        DataFrame with the requested columns and history dtypes.
+    """
+    return _typed(store.value_frame(columns, **filters))
+
+def _require_pyarrow() -> None:
+    if pyarrow is None:
+        raise ImportError("pyarrow is required for Parquet persistence (pip install pyarrow).")
+
+def write_parquet(df: pd.DataFrame, root: str) -> None:
+    """
+    Appends a history frame to a Parquet dataset partitioned by month and category.
+    
+    Args:
+        df: History frame.
+        root: Dataset directory (created if needed).
+    
+    Raises:
+        ImportError: If pyarrow is not installed.
+    """
+    _require_pyarrow()
+    if df.empty:
+        return
+    out = df.assign(month=df['date'].dt.strftime('%Y-%m'))
+    # Partition values are encoded in the directory names, not in the files
+    out['category'] = out['category'].astype(str)
+    out.to_parquet(root, engine='pyarrow', partition_cols=PARTITION_COLUMNS, index=False)
+    logging.info(f"History written to Parquet: {len(df)} rows at {root}")
+
+def read_parquet(
+    root: str,
+    columns: Optional[Sequence[str]] = None,
+    categories: Optional[Sequence[str]] = None,
+    start_month: Optional[str] = None,
+    end_month: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    Reads a history frame back from a partitioned Parquet dataset.
+    
+    Only the requested columns are decoded, and partitions outside the
+    category and month filters are skipped without being opened.
+    
+    Args:
+        root: Dataset directory.
+        columns: Columns to read; all history columns if None.
+        categories: Only these categories.
+        start_month: First month to read, as "YYYY-MM".
+        end_month: Last month to read, as "YYYY-MM".
+    
+    Returns:
+        DataFrame with the requested columns.
+    
+    Raises:
+        ImportError: If pyarrow is not installed.
+    """
+    _require_pyarrow()
+    filters = []
+    if categories is not None:
+        filters.append(('category', 'in', list(categories)))
+    if start_month is not None:
+        filters.append(('month', '>=', start_month))
+    if end_month is not None:
+        filters.append(('month', '<=', end_month))
+    
+    columns = list(columns) if columns is not None else HISTORY_COLUMNS
+    df = pd.read_parquet(root, engine='pyarrow', columns=columns, filters=filters or None)
+    return _typed(df)
+
+def abnormal_rates(df: pd.DataFrame, by: Sequence[str] = ('category', 'exam')) -> pd.DataFrame:
+    """
+    Computes ALTO/BAIXO counts and rates per group.
+    
+    Args:
+        df: History frame with the grouping columns and 'status'.
+        by: Grouping columns.
+    
+    Returns:
+        DataFrame indexed by the groups with total, alto, baixo, alto_rate,
+        baixo_rate and abnormal_rate columns.
+    """
+    by = list(by)
+    flags = pd.DataFrame({
+        **{col: df[col] for col in by},
+        'total': 1,
+        'alto': (df['status'] == 'ALTO').astype(int),
+        'baixo': (df['status'] == 'BAIXO').astype(int)
+    })
+    grouped = flags.groupby(by, observed=True, sort=True).sum()
+    grouped['alto_rate'] = grouped['alto'] / grouped['total']
+    grouped['baixo_rate'] = grouped['baixo'] / grouped['total']
+    grouped['abnormal_rate'] = grouped['alto_rate'] + grouped['baixo_rate']
+    return grouped
+
+def exam_distribution(df: pd.DataFrame, by: Sequence[str] = ('category', 'exam')) -> pd.DataFrame:
+    """
+    Summarizes the value distribution of each exam.
+    
+    Args:
+        df: History frame with the grouping columns and 'value'.
+        by: Grouping columns.
+    
+    Returns:
+        DataFrame indexed by the groups with count, mean, std, min, p05,
+        p25, median, p75, p95 and max columns.
+    """
+    grouped = df.groupby(list(by), observed=True, sort=True)['value']
+    stats = grouped.agg(['count', 'mean', 'std', 'min', 'max'])
+    quantiles = grouped.quantile([0.05, 0.25, 0.5, 0.75, 0.95]).unstack()
+    quantiles.columns = ['p05', 'p25', 'median', 'p75', 'p95']
+    return stats.join(quantiles)[['count', 'mean', 'std', 'min', 'p05', 'p25', 'median', 'p75', 'p95', 'max']]
+
+def _build_trend(
+    store: ExamHistoryStore,
+    patient_id: str,
+    category: str,
+    exam: str,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    max_points: int
+) -> TrendSeries:
+    """Reads one exam series from the history and downsamples it with LTTB."""
+    rows = store.query_values(category, exam, patient_id=patient_id, start=start, end=end)
+    points = pd.DataFrame(
+        {
+            'date': [row.date for row in rows],
+            'value': np.fromiter((row.value for row in rows), dtype=float, count=len(rows)),
+            'status': [row.status for row in rows],
+            'reference': [row.reference for row in rows]
+        }
+    )
+    if len(points) > max_points:
+        x = points['date'].to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+        points = points.iloc[lttb(x, points['value'].to_numpy(), max_points)].reset_index(drop=True)
+    return TrendSeries(points, len(rows))
+
+def trend_series(
+    store: ExamHistoryStore,
+    patient_id: str,
+    category: str,
+    exam: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    max_points: int = TREND_MAX_POINTS
+) -> TrendSeries:
+    """
+    Returns the trend of one exam of one patient, downsampled to at most max_points.
+    
+    Results are cached per (patient, exam, window); the history revision is
+    part of the key, so a newly saved exam invalidates the cached series.
+    
+    Args:
+        store: Exam history store.
+        patient_id: Patient identifier.
+        category: Exam category.
+        exam: Exam name.
+        start: First moment of the window.
+        end: Last moment of the window.
+        max_points: Maximum number of points returned.
+    
+    Returns:
+        TrendSeries with date, value, status and reference columns, and the
+        number of points before downsampling.
+    """
+    key = (patient_id, category, exam, start, end, max_points, store.revision())
+    return TREND_CACHE.get_or_set(
+        key, lambda: _build_trend(store, patient_id, category, exam, start, end, max_points)
+    )
@@ -0,0 +1,541 @@
+"""
+Streaming readers and writers for backups of the application data.
+
+Two formats are supported:
+- JSON: a single object of the form
+    {"profiles": {name: profile, ...}, "favorite_profiles": [name, ...], ...}
+- Compact: gzip-compressed JSON Lines, one profile or exam record per line,
+  preceded by a metadata line. Compact backups are either full or delta
+  backups; a delta holds only what changed after the checkpoint of the
+  backup it follows, and a restore applies a base plus a chain of deltas.
+
+Both are read one item at a time, so memory use depends on the largest
+single item, not on the file size.
+"""
+import codecs
+import gzip
+import json
+from datetime import datetime
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from models.exam import CompleteExamResult
+
+# Bytes read from the backup file at a time
+BACKUP_CHUNK_SIZE = 64 * 1024
+
+# Largest single JSON value (one profile, one backup line) buffered while reading
+BACKUP_MAX_VALUE_SIZE = 64 * 1024 * 1024
+
+# Progress callback: (bytes read, profiles imported)
+ProgressCallback = Callable[[int, int], None]
+
+# Format identifier and version written in the first line of compact backups
+COMPACT_FORMAT = "lab-exams-jsonl"
+COMPACT_VERSION = 1
+
+# First bytes of every gzip stream
+GZIP_MAGIC = b"\x1f\x8b"
+
+class BackupFormatError(ValueError):
+    """Raised when a backup file is not valid JSON or not in the backup format."""
+
+# Checkpoint of a backup: {'profiles': store revision, 'exams': history revision}
+Checkpoint = Dict[str, int]
+
+class BackupEvent(NamedTuple):
+    """
+    An item decoded from a backup.
+    
+    Kinds: 'profile' (name, profile dict), 'favorites' (None, list of names),
+    'favorite' (name, bool; deltas only), 'tombstone' (name, None; deltas
+    only) and 'exam' (record ID, record dict; uid holds the record identity
+    when the backup carries it).
+    """
+    kind: str
+    name: Optional[str]
+    value: Any
+    uid: Optional[str] = None
+
+class ImportReport(NamedTuple):
+    """Outcome of a backup import."""
+    imported: int
+    failed: List[Tuple[str, str]]
+    removed: int
+    favorites: int
+    complete: bool
+    error: Optional[str]
+    elapsed_seconds: float
+    exams: int = 0
+
+class _JSONStream:
+    """Incremental JSON tokenizer over a binary file, for the backup structure only."""
+    
+    _WHITESPACE = " \t\n\r"
+    
+    def __init__(self, fileobj: BinaryIO, chunk_size: int, max_value_size: int = BACKUP_MAX_VALUE_SIZE) -> None:
+        self._file = fileobj
+        self._chunk_size = chunk_size
+        self._max_value_size = max_value_size
+        self._decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self._json = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self.eof = False
+        self.bytes_read = 0
+    
+    def _fill(self, size: int) -> bool:
+        """Reads more data into the buffer; returns False at end of file."""
+        if self.eof:
+            return False
+        data = self._file.read(size)
+        self.bytes_read += len(data)
+        if not data:
+            self.eof = True
+            self._buf = self._buf[self._pos:] + self._decoder.decode(b"", final=True)
+        else:
+            self._buf = self._buf[self._pos:] + self._decoder.decode(data)
+        self._pos = 0
+        return True
+    
+    def peek(self) -> str:
+        """Returns the next non-whitespace character without consuming it ('' at end)."""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in self._WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill(self._chunk_size):
+                return ""
+    
+    def next_char(self) -> str:
+        """Consumes and returns the next non-whitespace character ('' at end)."""
+        char = self.peek()
+        if char:
+            self._pos += 1
+        return char
+    
+    def expect(self, char: str) -> None:
+        """Consumes the next non-whitespace character, which must be char."""
+        found = self.next_char()
+        if found != char:
+            raise BackupFormatError(f"Expected '{char}' but found '{found or 'end of file'}'.")
+    
+    def value(self) -> Any:
+        """Decodes the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                obj, end = self._json.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError as e:
+                # Incomplete value: read more, doubling the read size for large values
+                if len(self._buf) - self._pos > self._max_value_size:
+                    raise BackupFormatError(
+                        f"JSON value larger than {self._max_value_size} characters: {e}"
+                    ) from e
+                if not self._fill(max(self._chunk_size, len(self._buf) - self._pos)):
+                    raise BackupFormatError(f"Invalid JSON: {e}") from e
+                continue
+            if end == len(self._buf) and not self.eof:
+                # A number may continue in the next chunk; decode again with more data
+                self._fill(self._chunk_size)
+                continue
+            self._pos = end
+            return obj
+
+class BackupReader:
+    """Decodes a backup file incrementally, tracking how much of it was read."""
+    
+    def __init__(self, fileobj: BinaryIO, chunk_size: int = BACKUP_CHUNK_SIZE,
+                 max_value_size: int = BACKUP_MAX_VALUE_SIZE) -> None:
+        """
+        Initialize the reader.
+        
+        Args:
+            fileobj: Binary file object positioned at the start of the backup.
+            chunk_size: Bytes read at a time.
+            max_value_size: Largest JSON value buffered, in characters; a larger
+                (or unterminated) value raises BackupFormatError when read.
+        """
+        self._stream = _JSONStream(fileobj, chunk_size, max_value_size)
+        # JSON backups are always full backups, without a checkpoint
+        self.meta: Dict[str, Any] = {'kind': 'full'}
+    
+    @property
+    def kind(self) -> str:
+        """Always 'full'."""
+        return 'full'
+    
+    @property
+    def bytes_read(self) -> int:
+        """Bytes of the file consumed so far."""
+        return self._stream.bytes_read
+    
+    def __iter__(self) -> Iterator[BackupEvent]:
+        """
+        Yields the backup content in file order.
+        
+        Yields:
+            BackupEvent('profile', name, profile dict) for each profile, and
+            BackupEvent('favorites', None, list of names) for the favorites.
+        
+        Raises:
+            BackupFormatError: If the file is not valid JSON, not a backup
+                object, or has no 'profiles' entry.
+        """
+        stream = self._stream
+        seen_profiles = False
+        
+        stream.expect('{')
+        if stream.peek() == '}':
+            stream.next_char()
+        else:
+            while True:
+                key = stream.value()
+                if not isinstance(key, str):
+                    raise BackupFormatError("Backup keys must be strings.")
+                stream.expect(':')
+                
+                if key == 'profiles':
+                    seen_profiles = True
+                    yield from self._profiles()
+                elif key == 'favorite_profiles':
+                    favorites = stream.value()
+                    if not isinstance(favorites, list) or not all(isinstance(name, str) for name in favorites):
+                        raise BackupFormatError("'favorite_profiles' must be a list of names.")
+                    yield BackupEvent('favorites', None, favorites)
+                else:
+                    # Metadata such as exported_at is not imported
+                    stream.value()
+                
+                separator = stream.next_char()
+                if separator == '}':
+                    break
+                if separator != ',':
+                    raise BackupFormatError("Expected ',' or '}' after a backup entry.")
+        
+        if stream.peek():
+            raise BackupFormatError("Unexpected data after the end of the backup.")
+        if not seen_profiles:
+            raise BackupFormatError("Backup has no 'profiles' entry.")
+    
+    def _profiles(self) -> Iterator[BackupEvent]:
+        """Yields the entries of the 'profiles' object one at a time."""
+        stream = self._stream
+        stream.expect('{')
+        if stream.peek() == '}':
+            stream.next_char()
+            return
+        while True:
+            name = stream.value()
+            if not isinstance(name, str):
+                raise BackupFormatError("Profile names must be strings.")
+            stream.expect(':')
+            yield BackupEvent('profile', name, stream.value())
+            separator = stream.next_char()
+            if separator == '}':
+                return
+            if separator != ',':
+                raise BackupFormatError("Expected ',' or '}' after a profile.")
+
+class CompactBackupReader:
+    """Decodes a compact (gzip JSON Lines) backup one line at a time."""
+    
+    def __init__(self, fileobj: BinaryIO, max_value_size: int = BACKUP_MAX_VALUE_SIZE) -> None:
+        """
+        Initialize the reader and read the metadata line.
+        
+        Args:
+            fileobj: Binary file object positioned at the start of the backup.
+            max_value_size: Longest line read, in bytes.
+        
+        Raises:
+            BackupFormatError: If the file is not a compact backup.
+        """
+        self._file = fileobj
+        self._max_value_size = max_value_size
+        self._gz = gzip.GzipFile(fileobj=fileobj, mode='rb')
+        self._line_no = 0
+        meta = self._next_item()
+        if meta is None or meta.get('type') != 'meta' or meta.get('format') != COMPACT_FORMAT:
+            raise BackupFormatError("Not a compact backup file.")
+        if meta.get('version', 0) > COMPACT_VERSION:
+            raise BackupFormatError(f"Unsupported backup version: {meta.get('version')}")
+        self.meta: Dict[str, Any] = meta
+    
+    @property
+    def kind(self) -> str:
+        """'full' or 'delta'."""
+        return self.meta.get('kind', 'full')
+    
+    @property
+    def bytes_read(self) -> int:
+        """Compressed bytes of the file consumed so far."""
+        try:
+            return self._file.tell()
+        except (AttributeError, OSError):
+            return 0
+    
+    def _next_item(self) -> Optional[Dict[str, Any]]:
+        """Returns the next non-empty line as a JSON object, or None at the end."""
+        try:
+            while True:
+                line = self._gz.readline(self._max_value_size + 1)
+                if not line:
+                    return None
+                self._line_no += 1
+                if len(line) > self._max_value_size:
+                    raise BackupFormatError(f"Line {self._line_no} is longer than {self._max_value_size} bytes.")
+                if line.strip():
+                    break
+        except (OSError, EOFError) as e:
+            # gzip.BadGzipFile is an OSError; EOFError means a truncated file
+            raise BackupFormatError(f"Corrupt compressed file: {e}") from e
+        
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            raise BackupFormatError(f"Invalid JSON on line {self._line_no}: {e}") from e
+        if not isinstance(item, dict):
+            raise BackupFormatError(f"Line {self._line_no} is not a JSON object.")
+        return item
+    
+    def __iter__(self) -> Iterator[BackupEvent]:
+        """
+        Yields the backup content in file order.
+        
+        Yields:
+            BackupEvent items (see BackupEvent for the kinds).
+        
+        Raises:
+            BackupFormatError: If a line is invalid.
+        """
+        while True:
+            item = self._next_item()
+            if item is None:
+                return
+            
+            kind = item.get('type')
+            if kind == 'profile' and isinstance(item.get('name'), str):
+                yield BackupEvent('profile', item['name'], item.get('data'))
+                if 'favorite' in item:
+                    yield BackupEvent('favorite', item['name'], bool(item['favorite']))
+            elif kind == 'favorites' and isinstance(item.get('names'), list):
+                yield BackupEvent('favorites', None, [name for name in item['names'] if isinstance(name, str)])
+            elif kind == 'tombstone' and isinstance(item.get('name'), str):
+                yield BackupEvent('tombstone', item['name'], None)
+            elif kind == 'exam' and isinstance(item.get('id'), int):
+                yield BackupEvent('exam', item['id'], item.get('data'), item.get('uid'))
+            else:
+                raise BackupFormatError(f"Unrecognized entry on line {self._line_no}.")
+
+def open_backup(fileobj: BinaryIO, chunk_size: int = BACKUP_CHUNK_SIZE) -> Union[BackupReader, CompactBackupReader]:
+    """
+    Returns the reader matching the format of a backup file.
+    
+    Args:
+        fileobj: Seekable binary file object positioned at the start of the backup.
+        chunk_size: Bytes read at a time by the JSON reader.
+    
+    Returns:
+        CompactBackupReader for gzip files, otherwise BackupReader.
+    
+    Raises:
+        BackupFormatError: If a gzip file is not a compact backup.
+    """
+    magic = fileobj.read(len(GZIP_MAGIC))
+    fileobj.seek(0)
+    if magic == GZIP_MAGIC:
+        return CompactBackupReader(fileobj)
+    return BackupReader(fileobj, chunk_size)
+
+def read_backup_meta(fileobj: BinaryIO) -> Dict[str, Any]:
+    """
+    Reads the metadata of a backup without reading its content.
+    
+    Args:
+        fileobj: Seekable binary file object; it is rewound afterwards.
+    
+    Returns:
+        Metadata dictionary with at least 'kind'; compact backups also have
+        'checkpoint' and, for deltas, 'since'.
+    
+    Raises:
+        BackupFormatError: If a gzip file is not a compact backup.
+    """
+    try:
+        return open_backup(fileobj).meta
+    finally:
+        fileobj.seek(0)
+
+def order_backup_chain(metas: List[Dict[str, Any]]) -> List[int]:
+    """
+    Orders backups into a restorable chain: an optional full base, then deltas.
+    
+    Each delta must start at the checkpoint the previous backup ends at.
+    Without a full base, the first delta is applied to the current data.
+    
+    Args:
+        metas: Metadata of each backup, as returned by read_backup_meta.
+    
+    Returns:
+        Indexes into metas in restore order.
+    
+    Raises:
+        BackupFormatError: If there is more than one full backup or the deltas
+            do not form a contiguous chain.
+    """
+    fulls = [i for i, meta in enumerate(metas) if meta.get('kind', 'full') == 'full']
+    if len(fulls) > 1:
+        raise BackupFormatError("Only one full backup can be restored at a time.")
+    
+    deltas = {
+        _checkpoint_key(metas[i].get('since')): i
+        for i, meta in enumerate(metas) if meta.get('kind') == 'delta'
+    }
+    if len(deltas) != len(metas) - len(fulls):
+        raise BackupFormatError("Two delta backups start at the same checkpoint.")
+    
+    order: List[int] = []
+    if fulls:
+        order.append(fulls[0])
+        current = metas[fulls[0]].get('checkpoint')
+        if deltas and current is None:
+            raise BackupFormatError("The full backup has no checkpoint; deltas cannot follow it.")
+    else:
+        # The first delta is the one whose start is not the end of another delta
+        ends = {_checkpoint_key(metas[i].get('checkpoint')) for i in deltas.values()}
+        starts = [key for key in deltas if key not in ends]
+        if len(starts) != 1 and deltas:
+            raise BackupFormatError("The delta backups do not form a single chain.")
+        current = metas[deltas[starts[0]]].get('since') if deltas else None
+    
+    while deltas:
+        i = deltas.pop(_checkpoint_key(current), None)
+        if i is None:
+            raise BackupFormatError("A delta backup is missing from the chain.")
+        order.append(i)
+        current = metas[i].get('checkpoint')
+    return order
+
+def _checkpoint_key(checkpoint: Optional[Checkpoint]) -> Tuple[int, int]:
+    """Hashable form of a checkpoint."""
+    if not isinstance(checkpoint, dict):
+        raise BackupFormatError("Backup checkpoint is missing or invalid.")
+    return checkpoint.get('profiles', 0), checkpoint.get('exams', 0)
+
+def _json_default(value: Any) -> Any:
+    """Serializes the non-JSON values found in profiles and exam records."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (tuple, set, frozenset)):
+        return list(value)
+    return str(value)
+
+class _CompactWriter:
+    """Writes compact backup lines into a gzip stream."""
+    
+    def __init__(self, fileobj: BinaryIO, compresslevel: int) -> None:
+        self._gz = gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=compresslevel)
+        self._dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=_json_default).encode
+    
+    def write(self, item: Dict[str, Any]) -> None:
+        self._gz.write(self._dumps(item).encode('utf-8'))
+        self._gz.write(b"\n")
+    
+    def write_meta(self, kind: str, checkpoint: Optional[Checkpoint], since: Optional[Checkpoint] = None) -> None:
+        meta = {
+            'type': 'meta',
+            'format': COMPACT_FORMAT,
+            'version': COMPACT_VERSION,
+            'kind': kind,
+            'exported_at': datetime.now().isoformat()
+        }
+        if checkpoint is not None:
+            meta['checkpoint'] = checkpoint
+        if since is not None:
+            meta['since'] = since
+        self.write(meta)
+    
+    def write_records(self, records: Iterable[Tuple[int, str, CompleteExamResult]]) -> int:
+        count = 0
+        for record_id, uid, record in records:
+            self.write({'type': 'exam', 'id': record_id, 'uid': uid, 'data': record.to_trusted_dict()})
+            count += 1
+        return count
+    
+    def close(self) -> None:
+        self._gz.close()
+
+def write_compact_backup(
+    fileobj: BinaryIO,
+    profiles: Iterable[Tuple[str, Dict[str, Any]]],
+    favorites: Iterable[str],
+    records: Iterable[Tuple[int, str, CompleteExamResult]] = (),
+    compresslevel: int = 6,
+    checkpoint: Optional[Checkpoint] = None
+) -> Tuple[int, int]:
+    """
+    Writes a full compact backup, one line per item, compressing as it goes.
+    
+    Args:
+        fileobj: Writable binary file object.
+        profiles: (name, profile dict) pairs; consumed lazily.
+        favorites: Names of the favorite profiles.
+        records: (record ID, record identity, CompleteExamResult) triples; consumed lazily.
+        compresslevel: gzip compression level (1-9).
+        checkpoint: State the backup corresponds to; deltas can follow it.
+    
+    Returns:
+        (number of profiles, number of exam records) written.
+    """
+    writer = _CompactWriter(fileobj, compresslevel)
+    try:
+        writer.write_meta('full', checkpoint)
+        n_profiles = 0
+        for name, p_dict in profiles:
+            writer.write({'type': 'profile', 'name': name, 'data': p_dict})
+            n_profiles += 1
+        writer.write({'type': 'favorites', 'names': sorted(favorites)})
+        n_records = writer.write_records(records)
+    finally:
+        writer.close()
+    return n_profiles, n_records
+
+def write_delta_backup(
+    fileobj: BinaryIO,
+    changes: Iterable[Tuple[str, Dict[str, Any], bool]],
+    tombstones: Iterable[str],
+    records: Iterable[Tuple[int, str, CompleteExamResult]],
+    since: Checkpoint,
+    checkpoint: Checkpoint,
+    compresslevel: int = 6
+) -> Tuple[int, int, int]:
+    """
+    Writes a delta backup holding only what changed between two checkpoints.
+    
+    Args:
+        fileobj: Writable binary file object.
+        changes: (name, profile dict, is favorite) of created or changed profiles.
+        tombstones: Names of deleted profiles.
+        records: (record ID, record identity, CompleteExamResult) of records added or completed after since['exams'].
+        since: Checkpoint of the backup this delta follows.
+        checkpoint: Checkpoint this delta brings the data to.
+        compresslevel: gzip compression level (1-9).
+    
+    Returns:
+        (changed profiles, deleted profiles, exam records) written.
+    """
+    writer = _CompactWriter(fileobj, compresslevel)
+    try:
+        writer.write_meta('delta', checkpoint, since)
+        n_changed = n_deleted = 0
+        for name, p_dict, favorite in changes:
+            writer.write({'type': 'profile', 'name': name, 'data': p_dict, 'favorite': favorite})
+            n_changed += 1
+        for name in tombstones:
+            writer.write({'type': 'tombstone', 'name': name})
+            n_deleted += 1
+        n_records = writer.write_records(records)
+    finally:
+        writer.close()
+    return n_changed, n_deleted, n_records
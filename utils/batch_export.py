@@ -0,0 +1,193 @@
+"""
+Batch export of many exam result sets into a ZIP of PDFs.
+"""
+import logging
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from utils.pdf_exporter import PDFExporter
+from utils.units import UNIT_CONVENTIONAL
+
+class PDFJob(NamedTuple):
+    """A single result set to be rendered as a PDF."""
+    name: str
+    exam_type: str
+    date: str
+    results: Dict
+    orientation: str = "portrait"
+    unit_system: str = UNIT_CONVENTIONAL
+
+class BatchReport(NamedTuple):
+    """Outcome and throughput of a batch export."""
+    total: int
+    succeeded: int
+    failed: List[Tuple[str, str]]
+    elapsed_seconds: float
+    pdfs_per_second: float
+    peak_rss_kb: Optional[int]
+
+def _render_chunk(jobs: List[PDFJob]) -> List[Tuple[str, Optional[bytes], Optional[str]]]:
+    """
+    Renders a chunk of jobs in a worker process.
+    
+    Errors are captured per job so that one bad result set does not fail
+    the rest of the chunk.
+    
+    Returns:
+        List of (name, pdf_bytes, error) tuples; exactly one of pdf_bytes
+        and error is set.
+    """
+    output = []
+    for job in jobs:
+        try:
+            exporter = PDFExporter(job.exam_type, job.date, job.results, job.unit_system)
+            exporter.set_orientation(job.orientation)
+            output.append((job.name, exporter.export(), None))
+        except Exception as e:
+            output.append((job.name, None, f"{type(e).__name__}: {e}"))
+    return output
+
+def _chunks(jobs: Iterable[PDFJob], size: int) -> Iterator[List[PDFJob]]:
+    """Groups jobs into lists of at most size items, lazily."""
+    chunk: List[PDFJob] = []
+    for job in jobs:
+        chunk.append(job)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _peak_rss_kb() -> Optional[int]:
+    """Returns the peak resident set size of this process and its workers, in KiB."""
+    if resource is None:
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    )
+    # ru_maxrss is reported in bytes on macOS and in KiB elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+class BatchPDFExporter:
+    """Renders many result sets over a process pool and streams them into a ZIP."""
+    
+    def __init__(self, max_workers: Optional[int] = None, chunk_size: int = 8) -> None:
+        """
+        Initialize the batch exporter.
+        
+        Args:
+            max_workers: Number of worker processes (defaults to the CPU count).
+            chunk_size: Number of jobs sent to a worker at a time.
+        
+        Raises:
+            ValueError: If max_workers or chunk_size is not positive.
+        """
+        if max_workers is not None and max_workers <= 0:
+            raise ValueError("max_workers must be positive.")
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive.")
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+    
+    def export_zip(self, jobs: Iterable[PDFJob], dest: Union[str, BinaryIO]) -> BatchReport:
+        """
+        Renders all jobs and writes each PDF into a ZIP as soon as it completes.
+        
+        Only a bounded number of chunks is in flight at a time, so neither the
+        job list nor the rendered PDFs are held in memory all at once. A chunk
+        that cannot be rendered at all (e.g. a worker died or its jobs could
+        not be pickled) has its jobs reported as failed; the rest go on.
+        
+        Args:
+            jobs: Iterable of PDFJob; consumed lazily.
+            dest: Path or writable binary file object for the ZIP.
+        
+        Returns:
+            BatchReport with per-job errors and throughput.
+        """
+        start = time.perf_counter()
+        succeeded = 0
+        failed: List[Tuple[str, str]] = []
+        used_names: Set[str] = set()
+        max_in_flight = self.max_workers * 2
+        
+        def fail_chunk(names: List[str], e: BaseException) -> None:
+            error = f"{type(e).__name__}: {e}"
+            logging.error(f"PDF export failed for a chunk of {len(names)} jobs: {error}")
+            failed.extend((name, error) for name in names)
+        
+        with zipfile.ZipFile(dest, 'w', compression=zipfile.ZIP_DEFLATED) as zf, \
+                ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            # Job names of each chunk in flight, to report them if the chunk fails as a whole
+            pending: Dict[Future, List[str]] = {}
+            chunks = _chunks(jobs, self.chunk_size)
+            exhausted = False
+            
+            while pending or not exhausted:
+                while not exhausted and len(pending) < max_in_flight:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                        continue
+                    names = [job.name for job in chunk]
+                    try:
+                        pending[pool.submit(_render_chunk, chunk)] = names
+                    except BrokenProcessPool as e:
+                        fail_chunk(names, e)
+                
+                if not pending:
+                    break
+                
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    names = pending.pop(future)
+                    try:
+                        rendered = future.result()
+                    except Exception as e:
+                        fail_chunk(names, e)
+                        continue
+                    for name, pdf_bytes, error in rendered:
+                        if error is not None:
+                            logging.error(f"PDF export failed for {name}: {error}")
+                            failed.append((name, error))
+                            continue
+                        zf.writestr(self._unique_name(name, used_names), pdf_bytes)
+                        succeeded += 1
+        
+        elapsed = time.perf_counter() - start
+        report = BatchReport(
+            total=succeeded + len(failed),
+            succeeded=succeeded,
+            failed=failed,
+            elapsed_seconds=elapsed,
+            pdfs_per_second=succeeded / elapsed if elapsed > 0 else 0.0,
+            peak_rss_kb=_peak_rss_kb()
+        )
+        logging.info(
+            f"Batch PDF export: {report.succeeded}/{report.total} PDFs in {elapsed:.2f}s "
+            f"({report.pdfs_per_second:.1f} PDFs/s, peak RSS {report.peak_rss_kb} KiB)"
+        )
+        return report
+    
+    @staticmethod
+    def _unique_name(name: str, used_names: Set[str]) -> str:
+        """Returns a ZIP entry name ending in .pdf that was not used before."""
+        base = name[:-4] if name.lower().endswith('.pdf') else name
+        candidate = f"{base}.pdf"
+        n = 2
+        while candidate in used_names:
+            candidate = f"{base}_{n}.pdf"
+            n += 1
+        used_names.add(candidate)
+        return candidate
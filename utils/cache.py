@@ -0,0 +1,316 @@
+"""
+Process-wide caches shared across Streamlit reruns and sessions.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+def stable_hash(*parts: Any) -> str:
+    """
+    Returns a content hash that is stable across processes.
+    
+    Dict order is part of the content: results are rendered in insertion
+    order, so dicts that differ only in order must not share a key.
+    
+    Args:
+        parts: JSON-serializable values (dates and other objects are hashed
+            through their string representation).
+        
+    Returns:
+        Hex digest identifying the content.
+    """
+    payload = json.dumps(parts, default=str, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class LRUCache:
+    """Thread-safe, size-bounded least-recently-used cache with hit/miss counters."""
+    
+    def __init__(self, maxsize: int = 128) -> None:
+        """
+        Initialize the cache.
+        
+        Args:
+            maxsize: Maximum number of entries kept.
+            
+        Raises:
+            ValueError: If maxsize is not positive.
+        """
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive.")
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+    
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """
+        Returns a cached value and marks it as most recently used.
+        
+        Args:
+            key: Cache key.
+            default: Value returned on a miss.
+            
+        Returns:
+            Cached value, or default if absent.
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+    
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Stores a value, evicting the least recently used entries if needed.
+        
+        Args:
+            key: Cache key.
+            value: Value to store.
+        """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+    
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        Returns a cached value, computing and storing it on a miss.
+        
+        Args:
+            key: Cache key.
+            factory: Callable producing the value.
+            
+        Returns:
+            Cached or freshly computed value.
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = factory()
+            self.put(key, value)
+        return value
+    
+    def clear(self) -> None:
+        """Removes all entries and resets the counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+    
+    def stats(self) -> Dict[str, int]:
+        """Returns the cache counters."""
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+class BytesCache:
+    """
+    Two-tier (memory + disk) cache for byte payloads, bounded by total size.
+    
+    Entries are kept in an in-memory LRU evicted by total bytes. When a disk
+    directory is given, every entry is also written there so that a restarted
+    process starts warm; the disk tier has its own byte budget and evicts the
+    least recently used files.
+    """
+    
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None, disk_max_bytes: int = 0) -> None:
+        """
+        Initialize the cache.
+        
+        Args:
+            max_bytes: Memory budget in bytes.
+            disk_dir: Directory of the disk tier, or None for memory only.
+            disk_max_bytes: Disk budget in bytes (ignored without disk_dir).
+        """
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.builds = 0
+        self.build_seconds = 0.0
+        
+        if self.disk_dir:
+            self._load_disk_index()
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.bin")
+    
+    def _load_disk_index(self) -> None:
+        """Indexes the files already present in the disk tier, oldest first."""
+        # Private to the user running the app: cached payloads may hold patient data
+        os.makedirs(self.disk_dir, mode=0o700, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.is_file() and entry.name.endswith('.bin'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self._memory or key in self._disk
+    
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Returns a cached payload, promoting disk hits to memory.
+        
+        Args:
+            key: Cache key (must be usable as a file name, e.g., a hex digest).
+            
+        Returns:
+            Cached bytes, or None if absent.
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+            
+            if key in self._disk:
+                try:
+                    with open(self._path(key), 'rb') as f:
+                        data = f.read()
+                    os.utime(self._path(key))
+                except OSError as e:
+                    logging.warning(f"Disk cache read failed for {key}: {e}")
+                    self._forget_disk(key)
+                else:
+                    self._disk.move_to_end(key)
+                    self.disk_hits += 1
+                    self._put_memory(key, data)
+                    return data
+            
+            self.misses += 1
+            return None
+    
+    def put(self, key: str, data: bytes) -> None:
+        """
+        Stores a payload in memory and, if configured, on disk.
+        
+        Args:
+            key: Cache key (must be usable as a file name).
+            data: Payload.
+        """
+        with self._lock:
+            self._put_memory(key, data)
+            if self.disk_dir:
+                self._put_disk(key, data)
+    
+    def get_or_set(self, key: str, factory: Callable[[], bytes]) -> bytes:
+        """
+        Returns a cached payload, building and storing it on a miss.
+        
+        Args:
+            key: Cache key.
+            factory: Callable producing the payload; its run time is recorded.
+            
+        Returns:
+            Cached or freshly built bytes.
+        """
+        data = self.get(key)
+        if data is None:
+            start = time.perf_counter()
+            data = factory()
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.builds += 1
+                self.build_seconds += elapsed
+            self.put(key, data)
+        return data
+    
+    def _put_memory(self, key: str, data: bytes) -> None:
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        if len(data) > self.max_bytes:
+            return
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_bytes:
+            _, old = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old)
+            self.evictions += 1
+    
+    def _put_disk(self, key: str, data: bytes) -> None:
+        if len(data) > self.disk_max_bytes:
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logging.warning(f"Disk cache write failed for {key}: {e}")
+            return
+        
+        self._forget_disk(key, remove_file=False)
+        self._disk[key] = len(data)
+        self._disk_bytes += len(data)
+        while self._disk_bytes > self.disk_max_bytes:
+            old_key = next(iter(self._disk))
+            self._forget_disk(old_key)
+    
+    def _forget_disk(self, key: str, remove_file: bool = True) -> None:
+        size = self._disk.pop(key, None)
+        if size is None:
+            return
+        self._disk_bytes -= size
+        if remove_file:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+    
+    def clear(self) -> None:
+        """Removes all entries from both tiers and resets the counters."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            for key in list(self._disk):
+                self._forget_disk(key)
+            self.memory_hits = self.disk_hits = self.misses = self.evictions = self.builds = 0
+            self.build_seconds = 0.0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Returns the cache counters and tier sizes."""
+        return {
+            'memory_entries': len(self._memory),
+            'memory_bytes': self._memory_bytes,
+            'disk_entries': len(self._disk),
+            'disk_bytes': self._disk_bytes,
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'builds': self.builds,
+            'build_seconds': self.build_seconds
+        }
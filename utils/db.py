@@ -0,0 +1,91 @@
+"""
+SQLite connection handling shared by the persistent stores.
+"""
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List
+
+class SQLiteConnectionPool:
+    """
+    Thread-safe pool of SQLite connections to a single database file.
+
+    Each thread gets its own connection, opened in WAL mode so readers never
+    block on the writer. Writes are serialized through transaction().
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0) -> None:
+        """
+        Initialize the pool.
+
+        Args:
+            path: Database file path (parent directories are created).
+            timeout: Seconds to wait for a locked database.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        Returns the calling thread's connection, opening it on first use.
+
+        Returns:
+            sqlite3.Connection in autocommit mode.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path,
+                timeout=self.timeout,
+                isolation_level=None,
+                check_same_thread=False
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+            logging.debug(f"SQLite connection opened: {self.path}")
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Runs a block as a single write transaction.
+
+        Commits on success and rolls back if the block raises. Nested calls
+        in the same thread join the outer transaction.
+
+        Yields:
+            The calling thread's connection.
+        """
+        conn = self.connection()
+        with self._write_lock:
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self) -> None:
+        """Closes every connection opened by the pool."""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
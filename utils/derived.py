@@ -0,0 +1,360 @@
+"""
+Derived analytes: results computed from other results, such as LDL by
+Friedewald, HOMA-IR and the CKD-EPI glomerular filtration rate.
+
+Formulas are declared in data.defaults.DERIVED_ANALYTES and implemented
+here as NumPy functions, so the same code computes one form submission or
+a whole column of history. The engine orders them by their dependencies
+and, given what changed, recomputes only the analytes downstream of it.
+"""
+import logging
+from graphlib import CycleError, TopologicalSorter
+from typing import Any, Callable, Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data.defaults import DERIVED_ANALYTES
+from utils.formatter import classify_batch
+from utils.history_store import ExamHistoryStore
+from utils.reference_index import REFERENCE_INDEX, SEX_FEMALE, SEX_MALE, sex_code, sex_codes
+
+# (category, exam) pair identifying an analyte
+AnalyteKey = Tuple[str, str]
+
+# Decimals kept in derived values
+DERIVED_DECIMALS = 2
+
+# Records read per batch when back-filling the history
+BACKFILL_BATCH_RECORDS = 5000
+
+def difference(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """a - b (e.g. non-HDL cholesterol = total - HDL)."""
+    return a - b
+
+def friedewald_ldl(non_hdl: np.ndarray, triglycerides: np.ndarray) -> np.ndarray:
+    """LDL = non-HDL - triglycerides / 5 (mg/dL); not valid from 400 mg/dL of triglycerides."""
+    return np.where(triglycerides < 400, non_hdl - triglycerides / 5, np.nan)
+
+def homa_ir(glucose: np.ndarray, insulin: np.ndarray) -> np.ndarray:
+    """HOMA-IR = fasting glucose (mg/dL) x fasting insulin (µU/mL) / 405."""
+    return glucose * insulin / 405
+
+def ckd_epi_2021(creatinine: np.ndarray, sex: np.ndarray, age: np.ndarray) -> np.ndarray:
+    """eGFR by the 2021 CKD-EPI creatinine equation (mL/min/1.73m²); adults of known sex only."""
+    female = sex == SEX_FEMALE
+    kappa = np.where(female, 0.7, 0.9)
+    alpha = np.where(female, -0.241, -0.302)
+    ratio = creatinine / kappa
+    egfr = (
+        142 * np.minimum(ratio, 1) ** alpha * np.maximum(ratio, 1) ** -1.200
+        * 0.9938 ** age * np.where(female, 1.012, 1.0)
+    )
+    valid = (female | (sex == SEX_MALE)) & (age >= 18) & np.isfinite(egfr)
+    return np.where(valid, egfr, np.nan)
+
+# Formulas available to DERIVED_ANALYTES, by name
+FORMULAS: Dict[str, Callable[..., np.ndarray]] = {
+    'difference': difference,
+    'friedewald_ldl': friedewald_ldl,
+    'homa_ir': homa_ir,
+    'ckd_epi_2021': ckd_epi_2021
+}
+
+class DerivedAnalyte(NamedTuple):
+    """A compiled derived analyte definition."""
+    key: AnalyteKey
+    formula: Callable[..., np.ndarray]
+    inputs: Tuple[AnalyteKey, ...]
+    patient: bool
+
+class DerivedState(NamedTuple):
+    """Inputs and outputs of the last computation, for incremental updates."""
+    inputs: Dict[AnalyteKey, float]
+    sex: int
+    age: float
+    outputs: Dict[AnalyteKey, float]
+
+class DerivedEngine:
+    """Dependency graph of the derived analytes, in topological order."""
+    
+    def __init__(self, definitions: Mapping[str, Mapping[str, Mapping[str, Any]]]) -> None:
+        """
+        Compile the derived analyte definitions.
+        
+        Args:
+            definitions: Mapping of category -> exam -> {'formula', 'inputs', 'patient'}.
+        
+        Raises:
+            ValueError: If a formula is unknown or the definitions form a cycle.
+        """
+        self._analytes: Dict[AnalyteKey, DerivedAnalyte] = {}
+        for category, exams in definitions.items():
+            for exam, spec in exams.items():
+                formula = FORMULAS.get(spec['formula'])
+                if formula is None:
+                    raise ValueError(f"Unknown formula for {category} / {exam}: {spec['formula']}")
+                self._analytes[(category, exam)] = DerivedAnalyte(
+                    (category, exam), formula, tuple(tuple(key) for key in spec['inputs']), spec.get('patient', False)
+                )
+        
+        graph = {key: set(analyte.inputs) for key, analyte in self._analytes.items()}
+        try:
+            self.order: Tuple[AnalyteKey, ...] = tuple(
+                key for key in TopologicalSorter(graph).static_order() if key in self._analytes
+            )
+        except CycleError as e:
+            raise ValueError(f"Derived analytes form a cycle: {e.args[1]}") from e
+        
+        # Analytes reading each key directly
+        self._dependents: Dict[AnalyteKey, List[AnalyteKey]] = {}
+        for key in self.order:
+            for input_key in self._analytes[key].inputs:
+                self._dependents.setdefault(input_key, []).append(key)
+    
+    def __contains__(self, key: AnalyteKey) -> bool:
+        return key in self._analytes
+    
+    def inputs(self, key: AnalyteKey) -> Tuple[AnalyteKey, ...]:
+        """Returns the input keys of a derived analyte."""
+        return self._analytes[key].inputs
+    
+    def affected(self, changed: Iterable[AnalyteKey], patient_changed: bool = False) -> List[AnalyteKey]:
+        """
+        Returns the derived analytes downstream of the changed keys.
+        
+        Args:
+            changed: Keys whose values changed.
+            patient_changed: Whether the patient's sex or age changed.
+        
+        Returns:
+            Derived analyte keys, directly or transitively affected, in topological order.
+        """
+        pending = list(changed)
+        if patient_changed:
+            pending.extend(key for key, analyte in self._analytes.items() if analyte.patient)
+        seen = set()
+        while pending:
+            key = pending.pop()
+            if key in self._analytes:
+                seen.add(key)
+            pending.extend(dependent for dependent in self._dependents.get(key, ()) if dependent not in seen)
+        return [key for key in self.order if key in seen]
+    
+    def compute_columns(
+        self,
+        columns: Mapping[AnalyteKey, np.ndarray],
+        sex: Any = None,
+        age: Any = None,
+        only: Optional[Iterable[AnalyteKey]] = None
+    ) -> Dict[AnalyteKey, np.ndarray]:
+        """
+        Computes derived analytes over aligned columns of values.
+        
+        Analytes are computed in topological order, so derived inputs are
+        available to the analytes reading them. Analytes missing an input
+        column are skipped; rows missing an input value get NaN. A column
+        given for an analyte to compute takes precedence: only its NaN cells
+        are computed, and the analytes downstream read the merged values.
+        
+        Args:
+            columns: Mapping of analyte key to a float array, all of the same length.
+            sex: Array-like of sexes (strings or sex codes), or None if unknown.
+            age: Array-like of ages in years (NaN if unknown), or None if unknown.
+            only: Analytes to compute (with the rest read from columns); all if None.
+        
+        Returns:
+            Mapping of each computed analyte key to its values, rounded to DERIVED_DECIMALS.
+        """
+        values = {key: np.asarray(column, dtype=float) for key, column in columns.items()}
+        n = len(next(iter(values.values()))) if values else 0
+        sex_array = np.zeros(n, dtype=np.int64) if sex is None else sex_codes(sex)
+        age_array = np.full(n, np.nan) if age is None else np.asarray(age, dtype=float)
+        
+        targets = set(self.order if only is None else only)
+        computed: Dict[AnalyteKey, np.ndarray] = {}
+        for key in self.order:
+            analyte = self._analytes[key]
+            if key not in targets or any(input_key not in values for input_key in analyte.inputs):
+                continue
+            args = [values[input_key] for input_key in analyte.inputs]
+            if analyte.patient:
+                args += [sex_array, age_array]
+            with np.errstate(all='ignore'):
+                result = np.round(np.asarray(analyte.formula(*args), dtype=float), DERIVED_DECIMALS)
+            if key in values:
+                result = np.where(np.isnan(values[key]), result, values[key])
+            values[key] = computed[key] = result
+        return computed
+    
+    def update(
+        self,
+        state: Optional[DerivedState],
+        inputs: Mapping[AnalyteKey, float],
+        sex: Any = None,
+        age: Optional[float] = None
+    ) -> Tuple[DerivedState, List[AnalyteKey]]:
+        """
+        Computes the derived analytes of one result set incrementally.
+        
+        Only analytes downstream of the inputs (or patient data) that changed
+        since the previous state are recomputed; the others keep their values.
+        
+        Args:
+            state: State returned by the previous call, or None.
+            inputs: Entered values by analyte key.
+            sex: Patient's sex (see sex_code).
+            age: Patient's age in years, or None.
+        
+        Returns:
+            (new state, keys recomputed); the state's outputs hold every derived value.
+        """
+        inputs = {key: value for key, value in inputs.items() if key not in self._analytes}
+        sex = sex_code(sex)
+        age = np.nan if age is None else float(age)
+        
+        if state is None:
+            changed, patient_changed, outputs = set(inputs), True, {}
+        else:
+            changed = {key for key in inputs.keys() | state.inputs.keys() if inputs.get(key) != state.inputs.get(key)}
+            same_age = age == state.age or (age != age and state.age != state.age)
+            patient_changed = sex != state.sex or not same_age
+            outputs = dict(state.outputs)
+        
+        recompute = self.affected(changed, patient_changed)
+        if recompute:
+            columns = {key: np.array([value]) for key, value in inputs.items()}
+            columns.update((key, np.array([value])) for key, value in outputs.items() if key not in recompute)
+            results = self.compute_columns(columns, np.array([sex]), np.array([age]), only=recompute)
+            for key in recompute:
+                value = results[key][0] if key in results else np.nan
+                if np.isfinite(value):
+                    outputs[key] = float(value)
+                else:
+                    outputs.pop(key, None)
+        
+        return DerivedState(dict(inputs), sex, age, outputs), recompute
+    
+    def derive_frame(
+        self,
+        frame: pd.DataFrame,
+        by: str,
+        patients: Optional[pd.DataFrame] = None
+    ) -> pd.DataFrame:
+        """
+        Computes derived analytes over a long-format frame, one group at a time.
+        
+        Only the analytes downstream of the exams present in the frame are
+        computed, over a wide pivot of just their inputs. A value already in
+        the frame (measured, or derived earlier) takes precedence: it feeds
+        the analytes downstream and is not returned again.
+        
+        Args:
+            frame: Rows with by, 'category', 'exam' and 'value' columns.
+            by: Column identifying a result set (e.g. sample or record ID).
+            patients: Optional frame indexed by the by values, with 'sex' and/or 'age' columns.
+        
+        Returns:
+            New derived rows with by, 'category', 'exam' and 'value' columns; NaN results are dropped.
+        """
+        empty = pd.DataFrame({by: [], 'category': [], 'exam': [], 'value': []})
+        present = set(frame[['category', 'exam']].drop_duplicates().itertuples(index=False, name=None))
+        targets = self.affected(present)
+        if not targets:
+            return empty
+        
+        # Derived inputs are pivoted too, so values present for them are used rather than recomputed
+        needed = {input_key for key in targets for input_key in self._analytes[key].inputs}
+        pairs = pd.MultiIndex.from_frame(frame[['category', 'exam']])
+        sub = frame[pairs.isin(list(needed))]
+        if sub.empty:
+            return empty
+        wide = sub.drop_duplicates([by, 'category', 'exam'], keep='last').pivot(
+            index=by, columns=['category', 'exam'], values='value'
+        )
+        
+        sex = age = None
+        if patients is not None:
+            aligned = patients.reindex(wide.index)
+            sex = aligned['sex'].to_numpy() if 'sex' in aligned else None
+            age = pd.to_numeric(aligned['age'], errors='coerce').to_numpy() if 'age' in aligned else None
+        
+        computed = self.compute_columns(
+            {key: wide[key].to_numpy() for key in wide.columns}, sex, age, only=targets
+        )
+        parts = [
+            pd.DataFrame({by: wide.index, 'category': key[0], 'exam': key[1], 'value': values})
+            for key, values in computed.items()
+        ]
+        if not parts:
+            return empty
+        derived = pd.concat(parts, ignore_index=True)
+        existing = pd.MultiIndex.from_frame(frame[[by, 'category', 'exam']])
+        new = derived['value'].notna() & ~pd.MultiIndex.from_frame(derived[[by, 'category', 'exam']]).isin(existing)
+        return derived[new].reset_index(drop=True)
+
+def classify_derived(derived: pd.DataFrame, sex: Any = None, age: Any = None) -> pd.DataFrame:
+    """
+    Adds 'ref_id', 'unit', 'reference' and 'status' columns to derived rows.
+    
+    Args:
+        derived: Rows with 'category', 'exam' and 'value' columns.
+        sex: Array-like of sexes aligned with the rows, or None.
+        age: Array-like of ages aligned with the rows, or None.
+    
+    Returns:
+        The rows with the reference columns added.
+    """
+    keys = list(zip(derived['category'], derived['exam']))
+    lookup = {key: REFERENCE_INDEX.get_id(*key) for key in set(keys)}
+    base_ids = np.array([lookup[key] for key in keys], dtype=np.int64)
+    ids = REFERENCE_INDEX.resolve_many(base_ids, sex, age) if sex is not None or age is not None else base_ids
+    return derived.assign(
+        ref_id=ids,
+        unit=REFERENCE_INDEX.unit_array[ids],
+        reference=REFERENCE_INDEX.label_array[ids],
+        status=classify_batch(derived['value'].to_numpy(), REFERENCE_INDEX.min_array[ids], REFERENCE_INDEX.max_array[ids])
+    )
+
+def backfill_history(store: ExamHistoryStore, batch_size: int = BACKFILL_BATCH_RECORDS) -> int:
+    """
+    Adds the derived values missing from the stored records.
+    
+    The history is read in batches of record IDs; for each batch only the
+    derived analytes whose inputs are present and that are not stored yet
+    are computed, column-wise. The history does not keep the patient's sex
+    and age, so analytes needing them (eGFR) are only computed as entered.
+    
+    Args:
+        store: Exam history store.
+        batch_size: Records read per batch.
+    
+    Returns:
+        Number of derived values added.
+    """
+    added = 0
+    last_id = store.last_id()
+    for after_id in range(0, last_id, batch_size):
+        frame = store.value_frame(
+            ['record_id', 'category', 'exam', 'value'], after_id=after_id, until_id=after_id + batch_size
+        )
+        if frame.empty:
+            continue
+        # Values already stored are skipped: records are never edited, so their inputs are unchanged
+        derived = DERIVED_ENGINE.derive_frame(frame, 'record_id')
+        if derived.empty:
+            continue
+        
+        derived = classify_derived(derived)
+        added += store.add_values(
+            derived[['record_id', 'category', 'exam', 'value', 'unit', 'reference', 'status']].itertuples(
+                index=False, name=None
+            )
+        )
+    
+    # Completed records get a new history revision, so cached trends and delta backups pick them up
+    logging.info(f"Derived analytes back-filled: {added} values")
+    return added
+
+# Process-wide engine compiled from the default definitions
+DERIVED_ENGINE = DerivedEngine(DERIVED_ANALYTES)
@@ -0,0 +1,63 @@
+"""
+Downsampling of time series before they are sent to the browser.
+"""
+import numpy as np
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Selects the points of a series with Largest-Triangle-Three-Buckets.
+    
+    The first and last points are always kept. The points in between are
+    split into threshold - 2 buckets, and from each bucket the point that
+    forms the largest triangle with the previously selected point and the
+    average of the next bucket is kept. This preserves peaks and troughs,
+    which matters for lab values where the outliers are the point.
+    
+    Args:
+        x: Monotonically increasing x values (e.g. timestamps as floats).
+        y: Y values, same length as x, without NaN.
+        threshold: Maximum number of points to keep.
+    
+    Returns:
+        Sorted integer indices of the selected points.
+    
+    Raises:
+        ValueError: If x and y have different lengths or threshold is below 3.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if len(y) != n:
+        raise ValueError("x and y must have the same length.")
+    if threshold < 3:
+        raise ValueError("threshold must be at least 3.")
+    if threshold >= n:
+        return np.arange(n)
+    
+    # Bucket boundaries over the interior points 1..n-2
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        
+        # Average of the next bucket (the last point for the final bucket)
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        
+        # Twice the triangle areas for every candidate of the bucket
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    
+    return selected
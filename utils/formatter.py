@@ -1,9 +1,23 @@
 """
 Formats exam results for display and export.
 """
-from typing import Dict, List, Tuple, Any, Optional
+import math
+from typing import Dict, List, Tuple, Any, Optional, Union
 from datetime import datetime
 
+import numpy as np
+import pandas as pd
+
+from utils.cache import LRUCache, stable_hash
+from utils.reference_index import REFERENCE_INDEX
+from utils.units import UNIT_CONVENTIONAL, UNIT_REGISTRY, format_value
+
+# Status labels indexed by the codes produced by classify_batch
+STATUS_LABELS = np.array(["N/A", "BAIXO", "NORMAL", "ALTO"], dtype=object)
+
+# Formatted output shared by every formatter instance in the process
+FORMAT_CACHE = LRUCache(maxsize=256)
+
 def get_status_from_values(value_str: str, reference_str: str) -> str:
     """
     Determines the status (BAIXO, NORMAL, ALTO) based on the exam value and reference.
@@ -20,6 +34,9 @@ def get_status_from_values(value_str: str, reference_str: str) -> str:
     except ValueError:
         return "N/A"
         
+    if math.isnan(value):
+        return "N/A"
+        
     parts = reference_str.split('-')
     if len(parts) == 2:
         try:
@@ -35,10 +52,173 @@ def get_status_from_values(value_str: str, reference_str: str) -> str:
         return "ALTO"
     return "NORMAL"
 
+def get_result_status(vals: Dict[str, Any]) -> str:
+    """
+    Determines the status of a single result entry.
+    
+    Entries carrying a 'ref_id' are classified against the compiled reference
+    index; entries with only a 'reference' string fall back to parsing it.
+    
+    Args:
+        vals: Result entry with 'value' and either 'ref_id' or 'reference'.
+        
+    Returns:
+        String representing the status.
+    """
+    ref_id = vals.get('ref_id')
+    if ref_id is None:
+        return get_status_from_values(vals['value'], vals['reference'])
+        
+    try:
+        value = float(vals['value'].replace(',', '.'))
+    except ValueError:
+        return "N/A"
+        
+    if math.isnan(value):
+        return "N/A"
+        
+    return REFERENCE_INDEX.classify(value, ref_id)
+
+def classify_batch(values: Union[pd.DataFrame, Any], mins: Any = None, maxs: Any = None) -> np.ndarray:
+    """
+    Determines the status (BAIXO, NORMAL, ALTO, N/A) of many values at once.
+    
+    Gives the same answers as get_status_from_values, with NaN standing for a
+    value or bound that could not be parsed.
+    
+    Args:
+        values: DataFrame with 'value', 'min' and 'max' columns, or an
+            array-like of values.
+        mins: Array-like of lower bounds (ignored for DataFrames).
+        maxs: Array-like of upper bounds (ignored for DataFrames).
+        
+    Returns:
+        Object array with one status string per value.
+    """
+    if isinstance(values, pd.DataFrame):
+        values, mins, maxs = values['value'], values['min'], values['max']
+        
+    v = np.asarray(values, dtype=float)
+    lo = np.asarray(mins, dtype=float)
+    hi = np.asarray(maxs, dtype=float)
+    
+    invalid = np.isnan(v) | np.isnan(lo) | np.isnan(hi)
+    codes = np.select([invalid, v < lo, v > hi], [0, 1, 3], default=2)
+    return STATUS_LABELS[codes]
+
+def _parse_float(text: str) -> float:
+    """Parses a decimal string (comma or dot), returning NaN if invalid."""
+    try:
+        return float(text.replace(',', '.'))
+    except ValueError:
+        return math.nan
+
+def _reference_bounds(vals: Dict[str, Any]) -> Tuple[float, float]:
+    """Returns the (min, max) bounds of a result entry, NaN if unparseable."""
+    ref_id = vals.get('ref_id')
+    if ref_id is not None:
+        return REFERENCE_INDEX.bounds(ref_id)
+    return parse_reference(vals['reference'])
+        
+def parse_reference(reference_str: str) -> Tuple[float, float]:
+    """
+    Parses a reference range label into its bounds.
+    
+    Args:
+        reference_str: Reference range as string (e.g., "70.0-99.0").
+    
+    Returns:
+        (min, max) bounds, NaN if unparseable.
+    """
+    parts = reference_str.split('-')
+    if len(parts) != 2:
+        return math.nan, math.nan
+    try:
+        return float(parts[0]), float(parts[1])
+    except ValueError:
+        return math.nan, math.nan
+
+def classify_results(data_exams: Dict[str, Dict[str, Any]]) -> List[str]:
+    """
+    Determines the status of every result entry of a category in one call.
+    
+    Args:
+        data_exams: Dictionary mapping exam names to result entries.
+        
+    Returns:
+        List of status strings, in the order of data_exams.
+    """
+    if not data_exams:
+        return []
+        
+    entries = data_exams.values()
+    values = [_parse_float(vals['value']) for vals in entries]
+    bounds = [_reference_bounds(vals) for vals in entries]
+    mins, maxs = zip(*bounds)
+    return classify_batch(values, mins, maxs).tolist()
+
+def get_reference_label(vals: Dict[str, Any]) -> str:
+    """
+    Returns the reference range label of a single result entry.
+    
+    Args:
+        vals: Result entry with either 'ref_id' or 'reference'.
+        
+    Returns:
+        Reference range as string (e.g., "70.0-99.0").
+    """
+    ref_id = vals.get('ref_id')
+    if ref_id is None:
+        return vals['reference']
+    return REFERENCE_INDEX.label(ref_id)
+
+def get_reference_text(vals: Dict[str, Any], separator: str = " ", unit_system: str = UNIT_CONVENTIONAL) -> str:
+    """
+    Returns the reference range of a result entry for display, with its unit
+    and, for sex- or age-specific ranges, the population it applies to.
+    
+    Args:
+        vals: Result entry with 'unit' and either 'ref_id' or 'reference'.
+        separator: Placed between the range and the population.
+        unit_system: Unit system to show the range in; entries without
+            'ref_id' are always shown as stored.
+    
+    Returns:
+        Reference text (e.g., "12.0-15.5 g/dL (Feminino)").
+    """
+    ref_id = vals.get('ref_id')
+    if ref_id is not None and unit_system != UNIT_CONVENTIONAL:
+        text = f"{UNIT_REGISTRY.label(ref_id, unit_system)} {UNIT_REGISTRY.unit(ref_id, unit_system)}".rstrip()
+    else:
+        text = f"{get_reference_label(vals)} {vals['unit']}".rstrip()
+    if ref_id is not None and REFERENCE_INDEX.stratum(ref_id):
+        text += f"{separator}({REFERENCE_INDEX.stratum(ref_id)})"
+    return text
+
+def get_value_text(vals: Dict[str, Any], unit_system: str = UNIT_CONVENTIONAL) -> str:
+    """
+    Returns the value of a result entry for display, with its unit.
+    
+    Args:
+        vals: Result entry with 'value', 'unit' and optionally 'ref_id'.
+        unit_system: Unit system to show the value in; entries without
+            'ref_id' or with an unparseable value are shown as stored.
+    
+    Returns:
+        Value text (e.g., "5.55 mmol/L").
+    """
+    ref_id = vals.get('ref_id')
+    if ref_id is not None and unit_system != UNIT_CONVENTIONAL:
+        value = _parse_float(vals['value'])
+        if not math.isnan(value):
+            converted = UNIT_REGISTRY.convert(value, ref_id, unit_system)
+            return f"{format_value(float(converted))} {UNIT_REGISTRY.unit(ref_id, unit_system)}".rstrip()
+    return f"{vals['value']} {vals['unit']}".rstrip()
+
 class ExamResultFormatter:
     """Formats exam results in simple text and tabular representations."""
     
-    def __init__(self, exam_type: str, date: str, results: Dict) -> None:
+    def __init__(self, exam_type: str, date: str, results: Dict, unit_system: str = UNIT_CONVENTIONAL) -> None:
         """
         Initialize the formatter.
         
@@ -46,12 +226,25 @@ class ExamResultFormatter:
             exam_type: Type of exam.
             date: Date string.
             results: Dictionary with exam results.
+            unit_system: Unit system to show values and ranges in.
         """
         self.exam_type = exam_type
         self.date = date
         self.results = results
+        self.unit_system = unit_system
         self._cached_text: Optional[str] = None
         self._cached_table: Optional[str] = None
+        self._content_key: Optional[str] = None
+    
+    @property
+    def content_key(self) -> str:
+        """Stable hash of (exam_type, date, results, unit system), used as the cache key."""
+        if self._content_key is None:
+            key = (self.exam_type, self.date, self.results)
+            if self.unit_system != UNIT_CONVENTIONAL:
+                key += (self.unit_system, UNIT_REGISTRY.fingerprint)
+            self._content_key = stable_hash(*key)
+        return self._content_key
     
     def format_text(self) -> str:
         """
@@ -61,24 +254,35 @@ class ExamResultFormatter:
             Formatted string with results.
         """
         if self._cached_text is None:
-            lines: List[str] = [f"Resultados de Exames - {self.exam_type}", f"Data: {self.date}", ""]
-            
-            for category, data_exams in self.results.items():
-                if data_exams:
-                    lines.append(category)
-                    lines.append("-" * len(category))
-                    
-                    for exam_name, vals in data_exams.items():
-                        status = get_status_from_values(vals['value'], vals['reference'])
-                        l = f"{exam_name}: {vals['value']} {vals['unit']} (Ref: {vals['reference']} {vals['unit']}) - {status}"
-                        lines.append(l)
-                        
-                    lines.append("")
-                    
-            self._cached_text = "\n".join(lines)
+            self._cached_text = FORMAT_CACHE.get_or_set((self.content_key, 'text'), self._build_text)
             
         return self._cached_text
     
+    def _build_text(self) -> str:
+        """
+        Builds the simple text representation of the results.
+        
+        Returns:
+            Formatted string with results.
+        """
+        lines: List[str] = [f"Resultados de Exames - {self.exam_type}", f"Data: {self.date}", ""]
+        
+        for category, data_exams in self.results.items():
+            if data_exams:
+                lines.append(category)
+                lines.append("-" * len(category))
+                
+                statuses = classify_results(data_exams)
+                for (exam_name, vals), status in zip(data_exams.items(), statuses):
+                    value_text = get_value_text(vals, self.unit_system)
+                    ref_text = get_reference_text(vals, unit_system=self.unit_system)
+                    l = f"{exam_name}: {value_text} (Ref: {ref_text}) - {status}"
+                    lines.append(l)
+                    
+                lines.append("")
+                
+        return "\n".join(lines)
+    
     def format_tabular(self) -> str:
         """
         Returns a tabular representation of the results.
@@ -87,7 +291,7 @@ class ExamResultFormatter:
             String containing the result in table format.
         """
         if self._cached_table is None:
-            self._cached_table = self._build_table()
+            self._cached_table = FORMAT_CACHE.get_or_set((self.content_key, 'table'), self._build_table)
         return self._cached_table
     
     def _build_table(self) -> str:
@@ -104,9 +308,14 @@ class ExamResultFormatter:
                 rows.append(("", "", "", ""))
                 rows.append((cat.upper(), "", "", ""))
                 
-                for exam_name, vals in data_exams.items():
-                    status = get_status_from_values(vals['value'], vals['reference'])
-                    rows.append((exam_name, f"{vals['value']} {vals['unit']}", f"{vals['reference']} {vals['unit']}", status))
+                statuses = classify_results(data_exams)
+                for (exam_name, vals), status in zip(data_exams.items(), statuses):
+                    rows.append((
+                        exam_name,
+                        get_value_text(vals, self.unit_system),
+                        get_reference_text(vals, unit_system=self.unit_system),
+                        status
+                    ))
         
         if not rows:
             return "No exams filled."
@@ -0,0 +1,693 @@
+"""
+Append-only, indexed history of complete exam results.
+"""
+import hashlib
+import json
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+import pandas as pd
+
+from models.exam import CompleteExamResult, ExamResult
+from utils.db import SQLiteConnectionPool
+from utils.formatter import classify_results, get_reference_label
+
+# Columns available to value_frame, mapped to their SQL expressions
+VALUE_COLUMNS: Dict[str, str] = {
+    'record_id': "v.record_id",
+    'patient_id': "v.patient_id",
+    'exam_type': "r.exam_type",
+    'date': "v.exam_date",
+    'category': "v.category",
+    'exam': "v.exam",
+    'value': "v.value",
+    'unit': "v.unit",
+    'reference': "v.reference",
+    'status': "v.status"
+}
+
+class ExamValueRow(NamedTuple):
+    """A single stored exam value, as returned by index range scans."""
+    record_id: int
+    patient_id: Optional[str]
+    date: datetime
+    value: float
+    unit: str
+    reference: str
+    status: str
+
+def build_complete_result(exam_type: str, date: datetime, results: Dict, patient_id: Optional[str] = None) -> CompleteExamResult:
+    """
+    Builds a CompleteExamResult from the result entries produced by the exam form.
+    
+    Args:
+        exam_type: Type of exam (profile name).
+        date: Exam date.
+        results: Dictionary mapping category -> exam -> result entry.
+        patient_id: Optional patient identifier.
+    
+    Returns:
+        CompleteExamResult with classified statuses.
+    """
+    complete: Dict[str, Dict[str, ExamResult]] = {}
+    for category, data_exams in results.items():
+        if not data_exams:
+            continue
+        statuses = classify_results(data_exams)
+        complete[category] = {
+            exam_name: ExamResult(
+                value=float(vals['value']),
+                unit=vals['unit'],
+                reference=get_reference_label(vals),
+                status=status
+            )
+            for (exam_name, vals), status in zip(data_exams.items(), statuses)
+        }
+    return CompleteExamResult(exam_type=exam_type, date=date, results=complete, patient_id=patient_id)
+
+def record_uid(record: CompleteExamResult, source_id: Optional[str] = None) -> str:
+    """
+    Returns the content identity of a record: a hash of its patient, date, exam type and values.
+    
+    Records keep the identity computed when they were first stored, so it
+    survives values added later and moves with the record across backups.
+    
+    Args:
+        record: Complete exam result.
+        source_id: Identifier of the record at its source (e.g. the sample ID
+            of an analyzer file), so records with the same content from
+            different sources stay distinct.
+    
+    Returns:
+        Hex digest identifying the record.
+    """
+    values = sorted(
+        (category, exam_name, res.value, res.unit)
+        for category, exams in record.results.items()
+        for exam_name, res in exams.items()
+    )
+    key = [record.patient_id, record.date.isoformat(), record.exam_type, values]
+    if source_id is not None:
+        key.append(source_id)
+    payload = json.dumps(key, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ExamHistoryStore:
+    """
+    Append-only SQLite store of CompleteExamResult records.
+    
+    Each record is split into a header row and one row per exam value.
+    Value rows repeat the patient and date so that queries such as "all
+    Glicose results of patient X in 2025" are a single range scan over the
+    (category, exam, patient_id, exam_date) index.
+    """
+    
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS exam_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id TEXT,
+            exam_type TEXT NOT NULL,
+            exam_date TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            uid TEXT NOT NULL,
+            seq INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_records_patient_date ON exam_records (patient_id, exam_date);
+        CREATE INDEX IF NOT EXISTS idx_records_type_date ON exam_records (exam_type, exam_date);
+        CREATE INDEX IF NOT EXISTS idx_records_date ON exam_records (exam_date);
+        CREATE INDEX IF NOT EXISTS idx_records_uid ON exam_records (uid);
+        CREATE INDEX IF NOT EXISTS idx_records_seq ON exam_records (seq);
+        CREATE TABLE IF NOT EXISTS exam_values (
+            record_id INTEGER NOT NULL REFERENCES exam_records (id),
+            category TEXT NOT NULL,
+            exam TEXT NOT NULL,
+            value REAL NOT NULL,
+            unit TEXT NOT NULL,
+            reference TEXT NOT NULL,
+            status TEXT NOT NULL,
+            patient_id TEXT,
+            exam_date TEXT NOT NULL,
+            PRIMARY KEY (record_id, category, exam)
+        );
+        CREATE INDEX IF NOT EXISTS idx_values_exam_patient_date ON exam_values (category, exam, patient_id, exam_date);
+        CREATE INDEX IF NOT EXISTS idx_values_exam_date ON exam_values (category, exam, exam_date);
+        CREATE TABLE IF NOT EXISTS agg_daily (
+            day TEXT PRIMARY KEY,
+            exams INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS agg_exam (
+            category TEXT NOT NULL,
+            exam TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            alto INTEGER NOT NULL,
+            baixo INTEGER NOT NULL,
+            PRIMARY KEY (category, exam)
+        );
+        CREATE TABLE IF NOT EXISTS agg_exam_type (
+            exam_type TEXT PRIMARY KEY,
+            exams INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS history_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO history_meta (key, value) VALUES ('revision_floor', 0)
+    """
+    
+    # Latest change sequence, never below the floor set by advance_revision
+    _REVISION = (
+        "SELECT MAX(COALESCE((SELECT MAX(seq) FROM exam_records), 0), "
+        "(SELECT value FROM history_meta WHERE key = 'revision_floor'))"
+    )
+    
+    def __init__(self, path: str) -> None:
+        """
+        Open (and create if needed) the history database.
+        
+        Args:
+            path: Database file path.
+        """
+        self._pool = SQLiteConnectionPool(path)
+        with self._pool.transaction() as conn:
+            for statement in self._SCHEMA.split(';'):
+                if statement.strip():
+                    conn.execute(statement)
+        logging.info(f"Exam history store opened: {path}")
+    
+    @staticmethod
+    def _bump(conn: Any) -> int:
+        """Returns the change sequence of a write inside an open transaction (one past the latest)."""
+        return conn.execute(ExamHistoryStore._REVISION).fetchone()[0] + 1
+    
+    def _insert(
+        self,
+        conn: Any,
+        record: CompleteExamResult,
+        seq: int,
+        record_id: Optional[int] = None,
+        uid: Optional[str] = None
+    ) -> int:
+        """Inserts one record inside an open transaction and returns its ID; aggregates are left to the caller."""
+        exam_date = record.date.isoformat()
+        cursor = conn.execute(
+            "INSERT INTO exam_records (id, patient_id, exam_type, exam_date, created_at, uid, seq) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (record_id, record.patient_id, record.exam_type, exam_date, datetime.now().isoformat(),
+             uid or record_uid(record), seq)
+        )
+        record_id = cursor.lastrowid
+        conn.executemany(
+            "INSERT INTO exam_values (record_id, category, exam, value, unit, reference, status, patient_id, exam_date) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (record_id, category, exam_name, res.value, res.unit, res.reference, res.status,
+                 record.patient_id, exam_date)
+                for category, exams in record.results.items()
+                for exam_name, res in exams.items()
+            )
+        )
+        return record_id
+    
+    @staticmethod
+    def _update_aggregates(conn: Any, records: Iterable[CompleteExamResult]) -> None:
+        """
+        Adds records to the materialized aggregates inside an open transaction.
+        
+        Counts are summed in memory first, so a batch costs one upsert per
+        day, exam type and exam rather than one per value.
+        """
+        days: Counter = Counter()
+        exam_types: Counter = Counter()
+        exams: Dict[Tuple[str, str], List[int]] = {}
+        for record in records:
+            days[record.date.date().isoformat()] += 1
+            exam_types[record.exam_type] += 1
+            for category, results in record.results.items():
+                for exam_name, res in results.items():
+                    counts = exams.setdefault((category, exam_name), [0, 0, 0])
+                    counts[0] += 1
+                    counts[1] += res.status == "ALTO"
+                    counts[2] += res.status == "BAIXO"
+        
+        conn.executemany(
+            "INSERT INTO agg_daily (day, exams) VALUES (?, ?) "
+            "ON CONFLICT(day) DO UPDATE SET exams = exams + excluded.exams",
+            days.items()
+        )
+        conn.executemany(
+            "INSERT INTO agg_exam_type (exam_type, exams) VALUES (?, ?) "
+            "ON CONFLICT(exam_type) DO UPDATE SET exams = exams + excluded.exams",
+            exam_types.items()
+        )
+        conn.executemany(
+            "INSERT INTO agg_exam (category, exam, total, alto, baixo) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(category, exam) DO UPDATE SET total = total + excluded.total, "
+            "alto = alto + excluded.alto, baixo = baixo + excluded.baixo",
+            ((category, exam_name, *counts) for (category, exam_name), counts in exams.items())
+        )
+    
+    def append(self, record: CompleteExamResult) -> int:
+        """
+        Appends a record.
+        
+        Args:
+            record: Complete exam result.
+        
+        Returns:
+            ID of the new record.
+        """
+        with self._pool.transaction() as conn:
+            record_id = self._insert(conn, record, self._bump(conn))
+            self._update_aggregates(conn, [record])
+        logging.info(f"Exam record saved: {record_id}")
+        return record_id
+    
+    def append_many(
+        self,
+        records: Iterable[CompleteExamResult],
+        skip_existing: bool = False,
+        source_ids: Optional[Sequence[Optional[str]]] = None
+    ) -> List[int]:
+        """
+        Appends many records in a single transaction.
+        
+        Args:
+            records: Complete exam results.
+            skip_existing: Skip records whose identity (see record_uid) is
+                already stored, e.g. when the same file is imported twice.
+            source_ids: Source identifier of each record, in order, made
+                part of its identity (see record_uid).
+        
+        Returns:
+            IDs of the new records, in input order.
+        """
+        record_ids: List[int] = []
+        stored: List[CompleteExamResult] = []
+        with self._pool.transaction() as conn:
+            seq = self._bump(conn)
+            for i, record in enumerate(records):
+                uid = record_uid(record, source_ids[i] if source_ids is not None else None)
+                if skip_existing and conn.execute("SELECT 1 FROM exam_records WHERE uid = ?", (uid,)).fetchone() is not None:
+                    continue
+                record_ids.append(self._insert(conn, record, seq, uid=uid))
+                stored.append(record)
+            self._update_aggregates(conn, stored)
+        logging.info(f"Exam records saved: {len(record_ids)}")
+        return record_ids
+    
+    def restore_many(self, records: Iterable[Tuple[int, Optional[str], CompleteExamResult]]) -> int:
+        """
+        Inserts records from a backup, in a single transaction.
+        
+        Records are matched by identity (see record_uid), not by ID: records
+        already stored are not inserted again, so restoring the same backup
+        twice does not duplicate history, but values they lack (e.g. derived
+        values back-filled since, carried by a delta backup) are added. New
+        records keep their original ID when it is free and get a new one
+        when another record already uses it.
+        
+        Args:
+            records: (record ID, record identity, CompleteExamResult) triples;
+                the identity is computed from the content when None.
+        
+        Returns:
+            Number of records inserted.
+        """
+        inserted: List[CompleteExamResult] = []
+        completed: List[Tuple[int, str, str, float, str, str, str]] = []
+        renumbered = 0
+        with self._pool.transaction() as conn:
+            seq = self._bump(conn)
+            for record_id, uid, record in records:
+                uid = uid or record_uid(record)
+                stored = conn.execute("SELECT id FROM exam_records WHERE uid = ?", (uid,)).fetchone()
+                if stored is not None:
+                    completed.extend(
+                        (stored['id'], category, exam_name, res.value, res.unit, res.reference, res.status)
+                        for category, exams in record.results.items()
+                        for exam_name, res in exams.items()
+                    )
+                    continue
+                if conn.execute("SELECT 1 FROM exam_records WHERE id = ?", (record_id,)).fetchone() is not None:
+                    record_id = None
+                    renumbered += 1
+                self._insert(conn, record, seq, record_id, uid)
+                inserted.append(record)
+            self._update_aggregates(conn, inserted)
+            added = self._add_values(conn, completed, seq)
+        logging.info(
+            f"Exam records restored: {len(inserted)} ({renumbered} under new IDs), "
+            f"{added} values added to stored records"
+        )
+        return len(inserted)
+    
+    def add_values(self, values: Iterable[Tuple[int, str, str, float, str, str, str]]) -> int:
+        """
+        Adds values to stored records, in a single transaction.
+        
+        Used to complete records with values computed afterwards (e.g. derived
+        analytes); values already present in a record are skipped. Completed
+        records move to the current change sequence, so delta backups carry them.
+        
+        Args:
+            values: (record ID, category, exam, value, unit, reference, status) tuples.
+        
+        Returns:
+            Number of values added.
+        """
+        with self._pool.transaction() as conn:
+            total = self._add_values(conn, values, self._bump(conn))
+        logging.info(f"Exam values added to stored records: {total}")
+        return total
+    
+    @staticmethod
+    def _add_values(conn: Any, values: Iterable[Tuple[int, str, str, float, str, str, str]], seq: int) -> int:
+        """Adds values to stored records inside an open transaction, updating aggregates and change sequence."""
+        added: Dict[Tuple[str, str], List[int]] = {}
+        completed = set()
+        for record_id, category, exam_name, value, unit, reference, status in values:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO exam_values "
+                "(record_id, category, exam, value, unit, reference, status, patient_id, exam_date) "
+                "SELECT id, ?, ?, ?, ?, ?, ?, patient_id, exam_date FROM exam_records WHERE id = ?",
+                (category, exam_name, float(value), unit, reference, status, int(record_id))
+            )
+            if cursor.rowcount > 0:
+                completed.add(int(record_id))
+                counts = added.setdefault((category, exam_name), [0, 0, 0])
+                counts[0] += 1
+                counts[1] += status == "ALTO"
+                counts[2] += status == "BAIXO"
+        conn.executemany(
+            "INSERT INTO agg_exam (category, exam, total, alto, baixo) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(category, exam) DO UPDATE SET total = total + excluded.total, "
+            "alto = alto + excluded.alto, baixo = baixo + excluded.baixo",
+            ((category, exam_name, *counts) for (category, exam_name), counts in added.items())
+        )
+        conn.executemany("UPDATE exam_records SET seq = ? WHERE id = ?", ((seq, record_id) for record_id in completed))
+        return sum(counts[0] for counts in added.values())
+    
+    def __len__(self) -> int:
+        return self._pool.connection().execute("SELECT COUNT(*) FROM exam_records").fetchone()[0]
+    
+    def revision(self) -> int:
+        """Returns the change sequence of the latest write (0 if empty); it grows with every append or added value."""
+        return self._pool.connection().execute(self._REVISION).fetchone()[0]
+    
+    def advance_revision(self, revision: int) -> None:
+        """
+        Raises the revision to at least a value; it is never lowered.
+        
+        Used after restoring a backup, so records written afterwards are newer
+        than its checkpoint and a delta backup taken from it carries them.
+        """
+        with self._pool.transaction() as conn:
+            conn.execute(
+                "UPDATE history_meta SET value = MAX(value, ?) WHERE key = 'revision_floor'", (revision,)
+            )
+    
+    def last_id(self) -> int:
+        """Returns the ID of the latest record (0 if empty)."""
+        return self._pool.connection().execute("SELECT COALESCE(MAX(id), 0) FROM exam_records").fetchone()[0]
+    
+    def _load(self, header_rows: List[Any]) -> List[CompleteExamResult]:
+        """Builds records from header rows, fetching their values in one query."""
+        if not header_rows:
+            return []
+        values: Dict[int, Dict[str, Dict[str, Dict[str, Any]]]] = {row['id']: {} for row in header_rows}
+        placeholders = ",".join("?" * len(values))
+        cursor = self._pool.connection().execute(
+            f"SELECT record_id, category, exam, value, unit, reference, status FROM exam_values "
+            f"WHERE record_id IN ({placeholders})",
+            list(values)
+        )
+        for row in cursor:
+            values[row['record_id']].setdefault(row['category'], {})[row['exam']] = {
+                'value': row['value'],
+                'unit': row['unit'],
+                'reference': row['reference'],
+                'status': row['status']
+            }
+        return [
+            CompleteExamResult.from_trusted({
+                'exam_type': row['exam_type'],
+                'date': row['exam_date'],
+                'results': values[row['id']],
+                'patient_id': row['patient_id']
+            })
+            for row in header_rows
+        ]
+    
+    def get(self, record_id: int) -> Optional[CompleteExamResult]:
+        """Returns a record by ID, or None if absent."""
+        rows = self._pool.connection().execute(
+            "SELECT id, patient_id, exam_type, exam_date FROM exam_records WHERE id = ?", (record_id,)
+        ).fetchall()
+        records = self._load(rows)
+        return records[0] if records else None
+    
+    def iter_records(
+        self,
+        patient_id: Optional[str] = None,
+        exam_type: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        after_id: int = 0,
+        batch_size: int = 500
+    ) -> Iterator[Tuple[int, CompleteExamResult]]:
+        """
+        Iterates over records matching the filters, in insertion order.
+        
+        Records are loaded in batches, so the full history is never held in memory.
+        
+        Args:
+            patient_id: Only records of this patient.
+            exam_type: Only records of this exam type.
+            start: Only records dated at or after this moment.
+            end: Only records dated at or before this moment.
+            after_id: Only records with an ID greater than this one.
+            batch_size: Records fetched per query.
+        
+        Yields:
+            (record ID, CompleteExamResult) pairs.
+        """
+        clauses, params = ["id > ?"], []
+        if patient_id is not None:
+            clauses.append("patient_id = ?")
+            params.append(patient_id)
+        if exam_type is not None:
+            clauses.append("exam_type = ?")
+            params.append(exam_type)
+        if start is not None:
+            clauses.append("exam_date >= ?")
+            params.append(start.isoformat())
+        if end is not None:
+            clauses.append("exam_date <= ?")
+            params.append(end.isoformat())
+        for row, record in self._iter_rows(" AND ".join(clauses), params, after_id, batch_size):
+            yield row['id'], record
+    
+    def iter_backup(self, since: int = 0, batch_size: int = 500) -> Iterator[Tuple[int, str, CompleteExamResult]]:
+        """
+        Iterates over records with their identity, in ID order, for backups.
+        
+        Args:
+            since: Only records appended or completed after this revision (see revision()).
+            batch_size: Records fetched per query.
+        
+        Yields:
+            (record ID, record identity, CompleteExamResult) triples.
+        """
+        for row, record in self._iter_rows("id > ? AND seq > ?", [since], 0, batch_size):
+            yield row['id'], row['uid'], record
+    
+    def _iter_rows(self, where: str, params: List[Any], after_id: int, batch_size: int) -> Iterator[Tuple[Any, CompleteExamResult]]:
+        """Pages through the header rows matching a condition (starting with "id > ?") by ID, loading their records."""
+        last_id = after_id
+        while True:
+            rows = self._pool.connection().execute(
+                f"SELECT id, patient_id, exam_type, exam_date, uid FROM exam_records "
+                f"WHERE {where} ORDER BY id LIMIT ?",
+                [last_id] + params + [batch_size]
+            ).fetchall()
+            if not rows:
+                return
+            yield from zip(rows, self._load(rows))
+            last_id = rows[-1]['id']
+    
+    def query_values(
+        self,
+        category: str,
+        exam: str,
+        patient_id: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> List[ExamValueRow]:
+        """
+        Returns the stored values of one exam, ordered by date.
+        
+        Args:
+            category: Exam category.
+            exam: Exam name.
+            patient_id: Only values of this patient.
+            start: Only values dated at or after this moment.
+            end: Only values dated at or before this moment.
+        
+        Returns:
+            List of ExamValueRow.
+        """
+        clauses, params = ["category = ?", "exam = ?"], [category, exam]
+        if patient_id is not None:
+            clauses.append("patient_id = ?")
+            params.append(patient_id)
+        if start is not None:
+            clauses.append("exam_date >= ?")
+            params.append(start.isoformat())
+        if end is not None:
+            clauses.append("exam_date <= ?")
+            params.append(end.isoformat())
+        
+        cursor = self._pool.connection().execute(
+            f"SELECT record_id, patient_id, exam_date, value, unit, reference, status FROM exam_values "
+            f"WHERE {' AND '.join(clauses)} ORDER BY exam_date, record_id",
+            params
+        )
+        return [
+            ExamValueRow(
+                row['record_id'], row['patient_id'], datetime.fromisoformat(row['exam_date']),
+                row['value'], row['unit'], row['reference'], row['status']
+            )
+            for row in cursor
+        ]
+    
+    def value_frame(
+        self,
+        columns: Optional[Sequence[str]] = None,
+        patient_id: Optional[str] = None,
+        exam_type: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        after_id: int = 0,
+        until_id: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        Reads stored values as a long-format DataFrame, one row per exam value.
+        
+        Only the requested columns are selected, and exam_records is joined
+        only when exam_type is needed.
+        
+        Args:
+            columns: Columns to read (keys of VALUE_COLUMNS); all if None.
+            patient_id: Only values of this patient.
+            exam_type: Only values of this exam type.
+            start: Only values dated at or after this moment.
+            end: Only values dated at or before this moment.
+            after_id: Only values of records with an ID greater than this one.
+            until_id: Only values of records with an ID up to this one.
+        
+        Returns:
+            DataFrame with the requested columns; 'date' is parsed to datetime64.
+        
+        Raises:
+            ValueError: If an unknown column is requested.
+        """
+        columns = list(columns) if columns is not None else list(VALUE_COLUMNS)
+        unknown = [col for col in columns if col not in VALUE_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown history columns: {', '.join(unknown)}")
+        
+        clauses, params = [], []
+        if patient_id is not None:
+            clauses.append("v.patient_id = ?")
+            params.append(patient_id)
+        if exam_type is not None:
+            clauses.append("r.exam_type = ?")
+            params.append(exam_type)
+        if start is not None:
+            clauses.append("v.exam_date >= ?")
+            params.append(start.isoformat())
+        if end is not None:
+            clauses.append("v.exam_date <= ?")
+            params.append(end.isoformat())
+        if after_id:
+            clauses.append("v.record_id > ?")
+            params.append(after_id)
+        if until_id is not None:
+            clauses.append("v.record_id <= ?")
+            params.append(until_id)
+        
+        needs_join = 'exam_type' in columns or exam_type is not None
+        sql = f"SELECT {', '.join(f'{VALUE_COLUMNS[col]} AS {col}' for col in columns)} FROM exam_values v"
+        if needs_join:
+            sql += " JOIN exam_records r ON r.id = v.record_id"
+        if clauses:
+            sql += f" WHERE {' AND '.join(clauses)}"
+        
+        df = pd.read_sql_query(sql, self._pool.connection(), params=params)
+        if 'date' in df.columns:
+            df['date'] = pd.to_datetime(df['date'], format='ISO8601')
+        return df
+    
+    def daily_counts(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Tuple[str, int]]:
+        """
+        Returns the number of exams per day from the materialized aggregates.
+        
+        Args:
+            start: First day to include.
+            end: Last day to include.
+        
+        Returns:
+            List of (ISO day, exam count) pairs ordered by day.
+        """
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("day >= ?")
+            params.append(start.date().isoformat())
+        if end is not None:
+            clauses.append("day <= ?")
+            params.append(end.date().isoformat())
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._pool.connection().execute(
+            f"SELECT day, exams FROM agg_daily{where} ORDER BY day", params
+        ).fetchall()
+        return [(row['day'], row['exams']) for row in rows]
+    
+    def exam_counts(self) -> List[Tuple[str, str, int, int, int]]:
+        """
+        Returns total, ALTO and BAIXO counts per exam from the materialized aggregates.
+        
+        Returns:
+            List of (category, exam, total, alto, baixo) tuples.
+        """
+        rows = self._pool.connection().execute(
+            "SELECT category, exam, total, alto, baixo FROM agg_exam ORDER BY category, exam"
+        ).fetchall()
+        return [tuple(row) for row in rows]
+    
+    def exam_type_counts(self, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        Returns the number of exams per exam type (profile), most used first.
+        
+        Args:
+            limit: Maximum number of exam types.
+        
+        Returns:
+            List of (exam type, exam count) pairs.
+        """
+        rows = self._pool.connection().execute(
+            "SELECT exam_type, exams FROM agg_exam_type ORDER BY exams DESC, exam_type LIMIT ?",
+            (limit if limit is not None else -1,)
+        ).fetchall()
+        return [(row['exam_type'], row['exams']) for row in rows]
+    
+    def patients(self) -> List[str]:
+        """Returns the identifiers of all patients with stored records."""
+        rows = self._pool.connection().execute(
+            "SELECT DISTINCT patient_id FROM exam_records WHERE patient_id IS NOT NULL ORDER BY patient_id"
+        ).fetchall()
+        return [row['patient_id'] for row in rows]
+    
+    def close(self) -> None:
+        """Closes the database connections."""
+        self._pool.close()
@@ -0,0 +1,416 @@
+"""
+Bulk ingestion of result files exported by lab analyzers and LIS systems.
+
+Files are read in chunks with pandas, so memory use depends on the chunk
+size and not on the file size. Each row holds one result:
+    
+    sample_id,patient_id,date,code,value
+    A0001,P0001,2025-03-10,GLU,"92,5"
+
+Rows sharing a sample ID form one exam record; the rows of a sample must be
+contiguous, as analyzers export them. Optional 'sex' and 'age' columns
+select sex- and age-specific reference ranges, and an optional 'unit' column
+lets files in SI units be converted to the conventional units stored. Codes are mapped to (category, exam)
+through ANALYZER_CODES, values are validated and classified column-wise and
+every chunk is written to the history store in one transaction. Derived
+analytes (see utils.derived) are computed per sample from the results read.
+"""
+import logging
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Mapping, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data.defaults import ANALYZER_CODES
+from models.exam import CompleteExamResult
+from models.validation import ExamDataValidator
+from utils.derived import DERIVED_ENGINE, classify_derived
+from utils.formatter import classify_batch
+from utils.history_store import ExamHistoryStore
+from utils.reference_index import REFERENCE_INDEX
+from utils.units import CANONICAL_DECIMALS, UNIT_REGISTRY
+
+# Rows parsed per chunk
+INGEST_CHUNK_SIZE = 50_000
+
+# Row errors kept in the report; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+# Exam type recorded for ingested results
+INGEST_EXAM_TYPE = "IMPORTAÇÃO"
+
+# Default mapping of the fields read to the column names of the file
+DEFAULT_COLUMNS = {
+    'sample': 'sample_id',
+    'patient': 'patient_id',
+    'date': 'date',
+    'code': 'code',
+    'value': 'value'
+}
+
+# Patient fields selecting sex- and age-specific reference ranges
+PATIENT_FIELDS = ('sex', 'age')
+
+# Optional fields, read only when mapped to a column
+OPTIONAL_FIELDS = PATIENT_FIELDS + ('unit',)
+
+# Trailing UTC offset of an ISO date-time ('Z', '+00:00', '-0300', ...)
+_UTC_OFFSET = r'\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?\s*(?:Z|[+-]\d{2}(?::?\d{2})?)$'
+
+# Progress callback: (rows read, records written)
+IngestProgress = Callable[[int, int], None]
+
+class IngestReport(NamedTuple):
+    """Outcome of a result file ingestion."""
+    rows: int
+    records: int
+    values: int
+    skipped: int
+    errors: List[Tuple[int, str]]
+    error_count: int
+    elapsed_seconds: float
+    duplicates: int = 0
+
+def _to_local_time(aware: pd.Series) -> pd.Series:
+    """
+    Converts timezone-aware timestamps to naive local time.
+    
+    Each timestamp gets the UTC offset in force at its own moment, so rows
+    on both sides of a daylight saving change are converted correctly. The
+    offsets are looked up once per distinct second.
+    """
+    utc = aware.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy()
+    known = ~np.isnat(utc)
+    uniques, inverse = np.unique(utc[known].astype('datetime64[s]').astype(np.int64), return_inverse=True)
+    unique_offsets = np.array([time.localtime(second).tm_gmtoff for second in uniques.tolist()], dtype='timedelta64[s]')
+    offsets = np.zeros(len(utc), dtype='timedelta64[s]')
+    offsets[known] = unique_offsets[inverse]
+    return pd.Series(utc + offsets, index=aware.index)
+
+def _guess_separator(source: Any) -> str:
+    """Returns the column separator implied by the file name (tab for .tsv/.tab/.txt)."""
+    name = source if isinstance(source, str) else getattr(source, 'name', '')
+    return '\t' if str(name).lower().endswith(('.tsv', '.tab', '.txt')) else ','
+
+def read_result_chunks(
+    source: Any,
+    columns: Optional[Mapping[str, str]] = None,
+    sep: Optional[str] = None,
+    chunk_size: int = INGEST_CHUNK_SIZE
+) -> Iterator[pd.DataFrame]:
+    """
+    Reads a result file in chunks that never split a sample.
+    
+    The rows of the last sample of a chunk are held back and prepended to the
+    next chunk, so every sample is seen whole.
+    
+    Args:
+        source: File path or file object.
+        columns: Mapping of field ('sample', 'patient', 'date', 'code', 'value',
+            optionally 'sex', 'age' and 'unit') to file column.
+        sep: Column separator; guessed from the file name if None.
+        chunk_size: Rows read per chunk.
+    
+    Yields:
+        DataFrames with the field columns (as strings) plus 'line', the line number in the file.
+    
+    Raises:
+        ValueError: If the file lacks one of the columns.
+    """
+    columns = columns or DEFAULT_COLUMNS
+    rename = {column: field for field, column in columns.items()}
+    reader = pd.read_csv(
+        source,
+        sep=sep or _guess_separator(source),
+        usecols=list(rename),
+        dtype=str,
+        chunksize=chunk_size,
+        encoding='utf-8-sig'
+    )
+    
+    pending: Optional[pd.DataFrame] = None
+    for chunk in reader:
+        chunk = chunk.rename(columns=rename)
+        # Line 1 is the header
+        chunk['line'] = chunk.index + 2
+        if pending is not None:
+            chunk = pd.concat([pending, chunk])
+        if len(chunk) == 0:
+            continue
+        
+        samples = chunk['sample'].to_numpy()
+        others = np.flatnonzero(samples != samples[-1])
+        split = others[-1] + 1 if len(others) else 0
+        pending = chunk.iloc[split:]
+        if split:
+            yield chunk.iloc[:split]
+    
+    if pending is not None and len(pending):
+        yield pending
+
+def prepare_chunk(
+    chunk: pd.DataFrame,
+    code_ids: Mapping[str, int],
+    now: Optional[datetime] = None
+) -> Tuple[pd.DataFrame, pd.Series]:
+    """
+    Maps, validates and classifies the rows of a chunk column-wise.
+    
+    Args:
+        chunk: Chunk from read_result_chunks.
+        code_ids: Mapping of upper-case analyzer code to reference ID.
+        now: Local time after which exam dates are rejected (defaults to now).
+    
+    Returns:
+        (rows, errors): the valid rows with 'ref_id' (resolved for sex and
+        age when present), 'number' (in conventional units) and 'status'
+        columns added, and the error messages indexed like chunk. Rows with
+        an empty value are neither kept nor reported.
+    """
+    now = now or datetime.now()
+    
+    ref_ids = chunk['code'].map(code_ids)
+    # Codes are few and usually exact; only misses are normalized and looked up again
+    retry = ref_ids.isna() & chunk['code'].notna()
+    if retry.any():
+        ref_ids[retry] = chunk['code'][retry].str.strip().str.upper().map(code_ids)
+    
+    # Ranges specific to the patient's sex and age, resolved for all rows at once
+    if any(field in chunk for field in PATIENT_FIELDS):
+        known = ref_ids.notna().to_numpy()
+        resolved = REFERENCE_INDEX.resolve_many(
+            ref_ids[known].astype(int),
+            chunk['sex'][known] if 'sex' in chunk else None,
+            pd.to_numeric(chunk['age'][known], errors='coerce') if 'age' in chunk else None
+        )
+        ref_ids[known] = resolved
+    numbers, value_errors = ExamDataValidator.validate_numeric_series(chunk['value'])
+    
+    # Values sent in SI units are stored in conventional units; rows without a unit are conventional
+    unknown_unit = pd.Series(False, index=chunk.index)
+    if 'unit' in chunk:
+        known = ref_ids.notna().to_numpy()
+        converted, recognized = UNIT_REGISTRY.to_canonical(
+            numbers[known].to_numpy(), ref_ids[known].astype(int).to_numpy(), chunk['unit'][known]
+        )
+        # Empty values are skipped silently whatever their unit
+        unknown_unit[known] = ~recognized & numbers[known].notna().to_numpy()
+        numbers[known] = np.round(converted, CANONICAL_DECIMALS)
+    
+    # ISO dates, with a fallback to dd/mm/yyyy as in Brazilian exports. Dates
+    # with a UTC offset are parsed apart and converted to local time; the
+    # others are local already
+    offset = chunk['date'].str.contains(_UTC_OFFSET, na=False)
+    dates = pd.to_datetime(chunk['date'].where(~offset), errors='coerce', format='ISO8601')
+    if offset.any():
+        aware = pd.to_datetime(chunk['date'][offset], errors='coerce', format='ISO8601', utc=True)
+        dates[offset] = _to_local_time(aware)
+    retry = dates.isna() & chunk['date'].notna()
+    if retry.any():
+        dates[retry] = pd.to_datetime(chunk['date'][retry], errors='coerce', format='%d/%m/%Y')
+    
+    missing_sample = chunk['sample'].isna()
+    unknown_code = ref_ids.isna()
+    bad_date = dates.isna()
+    future_date = dates > now
+    
+    errors = pd.concat([
+        pd.Series("Missing sample ID.", index=chunk.index[missing_sample], dtype=object),
+        "Unknown analyzer code: " + chunk['code'][unknown_code & ~missing_sample].astype(str),
+        "Invalid date: " + chunk['date'][bad_date & ~missing_sample & ~unknown_code].astype(str),
+        pd.Series(
+            "Exam date cannot be in the future.",
+            index=chunk.index[future_date & ~missing_sample & ~unknown_code],
+            dtype=object
+        ),
+        value_errors,
+        "Unknown unit for " + chunk['code'][unknown_unit].astype(str) + ": " + chunk['unit'][unknown_unit].astype(str)
+        if 'unit' in chunk else pd.Series(dtype=object)
+    ])
+    errors = errors[~errors.index.duplicated()].sort_index()
+    
+    keep = ~(missing_sample | unknown_code | bad_date | future_date | unknown_unit) & numbers.notna()
+    rows = chunk[keep].assign(ref_id=ref_ids[keep].astype(int), number=numbers[keep], date=dates[keep])
+    ids = rows['ref_id'].to_numpy()
+    rows['status'] = classify_batch(rows['number'].to_numpy(), REFERENCE_INDEX.min_array[ids], REFERENCE_INDEX.max_array[ids])
+    return rows, errors
+
+def derive_chunk(rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds the derived analytes of each sample to prepared rows.
+    
+    Derived rows take the patient, date, sex and age of the first row of
+    their sample and are placed after its last row, so samples stay contiguous.
+    Results present in the file are kept over derived ones.
+    
+    Args:
+        rows: Valid rows from prepare_chunk, samples contiguous.
+    
+    Returns:
+        The rows with the derived rows inserted.
+    """
+    if rows.empty:
+        return rows
+    
+    ids = rows['ref_id'].to_numpy()
+    frame = pd.DataFrame({
+        'sample': rows['sample'].to_numpy(),
+        'category': REFERENCE_INDEX.category_array[ids],
+        'exam': REFERENCE_INDEX.exam_array[ids],
+        'value': rows['number'].to_numpy()
+    })
+    firsts = rows.drop_duplicates('sample').set_index('sample')
+    optional = [field for field in PATIENT_FIELDS if field in rows]
+    derived = DERIVED_ENGINE.derive_frame(frame, 'sample', firsts[optional] if optional else None)
+    if derived.empty:
+        return rows
+    
+    info = firsts.reindex(derived['sample'])
+    derived = classify_derived(
+        derived,
+        info['sex'].to_numpy() if 'sex' in info else None,
+        pd.to_numeric(info['age'], errors='coerce').to_numpy() if 'age' in info else None
+    )
+    extra = info.reset_index()[['sample', 'patient', 'date', 'line'] + optional].assign(
+        ref_id=derived['ref_id'].to_numpy(),
+        number=derived['value'].to_numpy(),
+        status=derived['status'].to_numpy()
+    )
+    
+    last = pd.Series(np.arange(len(rows))).groupby(rows['sample'].to_numpy()).max()
+    order = np.r_[np.arange(len(rows)), last.reindex(derived['sample']).to_numpy() + 0.5]
+    combined = pd.concat([rows, extra], ignore_index=True)
+    return combined.iloc[np.argsort(order, kind='stable')]
+
+def _sample_starts(samples: np.ndarray) -> List[int]:
+    """Returns the positions where a new sample starts in an array of contiguous sample IDs."""
+    if len(samples) == 0:
+        return []
+    return np.flatnonzero(np.r_[True, samples[1:] != samples[:-1]]).tolist()
+
+def sample_ids(rows: pd.DataFrame) -> List[str]:
+    """Returns the sample ID of each record build_records yields for the same rows, in order."""
+    samples = rows['sample'].to_numpy()
+    return samples[_sample_starts(samples)].tolist()
+
+def build_records(rows: pd.DataFrame, exam_type: str = INGEST_EXAM_TYPE) -> Iterator[CompleteExamResult]:
+    """
+    Groups prepared rows into one record per sample.
+    
+    The patient and date of a record are taken from the first row of its
+    sample; a result repeated within a sample keeps its last value.
+    
+    Args:
+        rows: Valid rows from prepare_chunk, samples contiguous.
+        exam_type: Exam type of the records.
+    
+    Yields:
+        CompleteExamResult records, in file order.
+    """
+    if rows.empty:
+        return
+    
+    ids = rows['ref_id'].to_numpy()
+    samples = rows['sample'].to_numpy()
+    patients = rows['patient'].to_numpy()
+    numbers = rows['number'].tolist()
+    statuses = rows['status'].tolist()
+    units = REFERENCE_INDEX.unit_array[ids].tolist()
+    labels = REFERENCE_INDEX.label_array[ids].tolist()
+    keys = [REFERENCE_INDEX.key(ref_id) for ref_id in ids.tolist()]
+    
+    starts = _sample_starts(samples)
+    dates = [date.to_pydatetime() for date in rows['date'].iloc[starts]]
+    for n, (start, end) in enumerate(zip(starts, starts[1:] + [len(rows)])):
+        results: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for i in range(start, end):
+            category, exam = keys[i]
+            results.setdefault(category, {})[exam] = {
+                'value': numbers[i],
+                'unit': units[i],
+                'reference': labels[i],
+                'status': statuses[i]
+            }
+        patient = patients[start]
+        yield CompleteExamResult.from_trusted({
+            'exam_type': exam_type,
+            'date': dates[n],
+            'results': results,
+            'patient_id': patient if isinstance(patient, str) else None
+        })
+
+def ingest_results(
+    source: Any,
+    store: ExamHistoryStore,
+    exam_type: str = INGEST_EXAM_TYPE,
+    columns: Optional[Mapping[str, str]] = None,
+    sep: Optional[str] = None,
+    chunk_size: int = INGEST_CHUNK_SIZE,
+    codes: Mapping[str, Tuple[str, str]] = ANALYZER_CODES,
+    progress: Optional[IngestProgress] = None
+) -> IngestReport:
+    """
+    Ingests a CSV/TSV result file into the exam history.
+    
+    Invalid rows are reported and skipped; every chunk is committed on its
+    own, so an error in the file keeps the records of the previous chunks.
+    Samples already in the history (same sample ID, patient, date and
+    results) are skipped and counted as duplicates, so importing a file
+    twice is harmless.
+    
+    Args:
+        source: File path or file object.
+        store: History store receiving the records.
+        exam_type: Exam type of the records.
+        columns: Mapping of field to file column (see DEFAULT_COLUMNS).
+        sep: Column separator; guessed from the file name if None.
+        chunk_size: Rows read per chunk.
+        codes: Mapping of analyzer code to (category, exam).
+        progress: Called with (rows read, records written) after each chunk.
+    
+    Returns:
+        IngestReport with counts and the first row errors as (line, message).
+    
+    Raises:
+        ValueError: If a code maps to an exam without reference range, or
+            the file lacks one of the columns.
+    """
+    start = time.perf_counter()
+    code_ids: Dict[str, int] = {}
+    for code, (category, exam) in codes.items():
+        ref_id = REFERENCE_INDEX.get_id(category, exam)
+        if ref_id is None:
+            raise ValueError(f"Analyzer code {code} maps to unknown exam: {category} / {exam}")
+        code_ids[code.upper()] = ref_id
+    
+    now = datetime.now()
+    errors: List[Tuple[int, str]] = []
+    rows = records = values = error_count = samples = 0
+    
+    for chunk in read_result_chunks(source, columns, sep, chunk_size):
+        valid, chunk_errors = prepare_chunk(chunk, code_ids, now)
+        
+        error_count += len(chunk_errors)
+        if len(errors) < MAX_REPORTED_ERRORS:
+            lines = chunk['line'][chunk_errors.index].tolist()
+            errors.extend(zip(lines, chunk_errors.tolist()))
+            del errors[MAX_REPORTED_ERRORS:]
+        
+        rows += len(chunk)
+        values += len(valid)
+        derived = derive_chunk(valid)
+        built = list(build_records(derived, exam_type))
+        samples += len(built)
+        # The sample ID is part of the identity: distinct samples with equal results are all kept
+        records += len(store.append_many(built, skip_existing=True, source_ids=sample_ids(derived)))
+        if progress is not None:
+            progress(rows, records)
+    
+    elapsed = time.perf_counter() - start
+    logging.info(
+        f"Result file ingested: {rows} rows, {records} records, {samples - records} duplicates, "
+        f"{error_count} errors in {elapsed:.1f}s"
+    )
+    return IngestReport(rows, records, values, rows - values, errors, error_count, elapsed, samples - records)
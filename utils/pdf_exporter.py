@@ -1,23 +1,155 @@
 """
 Exports exam results to PDF.
 """
+import functools
 import logging
+import os
 import tempfile
-from typing import Dict, List, Any, Optional
-import io
+from types import MappingProxyType
+from typing import BinaryIO, Dict, List, Any, Mapping, NamedTuple, Optional, Tuple
 
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle, StyleSheet1
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 
-from utils.formatter import get_status_from_values
+from utils.cache import BytesCache, stable_hash
+from utils.formatter import classify_results, get_reference_text, get_value_text
+from utils.reference_index import REFERENCE_INDEX
+from utils.units import UNIT_CONVENTIONAL, UNIT_REGISTRY
+
+# Spooled exports stay in memory up to this size and roll over to a temporary file above it
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+class _BytesSink:
+    """
+    Write-only file object that keeps the written chunks without copying them.
+    
+    ReportLab writes a finished document in a single call, so export() returns
+    that buffer itself instead of the copy BytesIO.getvalue() would make.
+    """
+    
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+    
+    def write(self, data: bytes) -> int:
+        self._chunks.append(data)
+        return len(data)
+    
+    def flush(self) -> None:
+        pass
+    
+    def getvalue(self) -> bytes:
+        if len(self._chunks) == 1:
+            return self._chunks[0]
+        return b"".join(self._chunks)
+
+class PDFStyleRegistry(NamedTuple):
+    """Styles and table templates shared by every PDFExporter; never mutated."""
+    styles: StyleSheet1
+    table_style: TableStyle
+    column_widths: Mapping[str, Tuple[float, ...]]
+
+@functools.lru_cache(maxsize=None)
+def get_style_registry() -> PDFStyleRegistry:
+    """
+    Returns the process-wide style registry, building it on first use.
+    
+    Returns:
+        PDFStyleRegistry instance.
+    """
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(
+        name='CatHeader', 
+        parent=styles['Heading2'], 
+        spaceAfter=10, 
+        spaceBefore=20
+    ))
+    
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 14),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ])
+    
+    column_widths = MappingProxyType({
+        'portrait': (1.9 * inch, 1.3 * inch, 1.9 * inch, 0.9 * inch),
+        'landscape': (3 * inch, 2 * inch, 2 * inch, 1 * inch)
+    })
+    
+    return PDFStyleRegistry(styles, table_style, column_widths)
+
+# Rendered PDFs shared across reruns and sessions. They hold patient results,
+# so they are only spilled to disk (for warm restarts) into a directory
+# chosen explicitly through LAB_EXAMS_PDF_CACHE_DIR
+PDF_CACHE_DIR = os.environ.get('LAB_EXAMS_PDF_CACHE_DIR') or None
+PDF_CACHE = BytesCache(
+    max_bytes=32 * 1024 * 1024,
+    disk_dir=PDF_CACHE_DIR,
+    disk_max_bytes=256 * 1024 * 1024
+)
+
+def pdf_cache_key(
+    exam_type: str,
+    date: str,
+    results: Dict,
+    orientation: str = "portrait",
+    unit_system: str = UNIT_CONVENTIONAL
+) -> str:
+    """
+    Returns the cache key of a rendered PDF.
+    
+    Args:
+        exam_type: Type of exam.
+        date: Date string.
+        results: Dictionary with exam results.
+        orientation: 'portrait' or 'landscape'.
+        unit_system: Unit system of the values and ranges shown.
+        
+    Returns:
+        Hex digest identifying the PDF content.
+    """
+    key = (REFERENCE_INDEX.fingerprint, exam_type, date, results, orientation)
+    if unit_system != UNIT_CONVENTIONAL:
+        key += (unit_system, UNIT_REGISTRY.fingerprint)
+    return stable_hash(*key)
+
+def get_pdf_bytes(
+    exam_type: str,
+    date: str,
+    results: Dict,
+    orientation: str = "portrait",
+    unit_system: str = UNIT_CONVENTIONAL
+) -> bytes:
+    """
+    Returns the PDF of a result set, rendering it only on a cache miss.
+    
+    Args:
+        exam_type: Type of exam.
+        date: Date string.
+        results: Dictionary with exam results.
+        orientation: 'portrait' or 'landscape'.
+        unit_system: Unit system of the values and ranges shown.
+        
+    Returns:
+        PDF as bytes.
+    """
+    def render() -> bytes:
+        exporter = PDFExporter(exam_type, date, results, unit_system)
+        exporter.set_orientation(orientation)
+        return exporter.export()
+    
+    return PDF_CACHE.get_or_set(pdf_cache_key(exam_type, date, results, orientation, unit_system), render)
 
 class PDFExporter:
     """Exports exam results to a PDF file."""
     
-    def __init__(self, exam_type: str, date: str, results: Dict) -> None:
+    def __init__(self, exam_type: str, date: str, results: Dict, unit_system: str = UNIT_CONVENTIONAL) -> None:
         """
         Initialize the PDF exporter.
         
@@ -25,23 +157,16 @@ class PDFExporter:
             exam_type: Type of exam.
             date: Date string.
             results: Dictionary with exam results.
+            unit_system: Unit system to show values and ranges in.
         """
         self.exam_type = exam_type
         self.date = date
         self.results = results
-        self.styles = getSampleStyleSheet()
-        self._setup()
+        self.unit_system = unit_system
+        self._registry = get_style_registry()
+        self.styles = self._registry.styles
         self.orientation: str = "portrait"
     
-    def _setup(self) -> None:
-        """Configure PDF styles."""
-        self.styles.add(ParagraphStyle(
-            name='CatHeader', 
-            parent=self.styles['Heading2'], 
-            spaceAfter=10, 
-            spaceBefore=20
-        ))
-    
     def set_orientation(self, orientation: str) -> None:
         """
         Define the PDF orientation.
@@ -63,11 +188,50 @@ class PDFExporter:
         Returns:
             PDF as bytes.
         """
-        buffer = io.BytesIO()
+        sink = _BytesSink()
+        self.export_to(sink)
+        return sink.getvalue()
+    
+    def export_spooled(self, max_size: int = SPOOL_MAX_SIZE) -> tempfile.SpooledTemporaryFile:
+        """
+        Exports the results to a spooled temporary file.
+        
+        The file stays in memory up to max_size bytes and rolls over to disk
+        above it, so a large report is not kept in memory once exported.
+        While it is built, ReportLab still holds the whole document in memory
+        (see export_to).
+        
+        Args:
+            max_size: Rollover threshold in bytes.
+            
+        Returns:
+            SpooledTemporaryFile positioned at the start of the PDF; the
+            caller is responsible for closing it.
+        """
+        spool = tempfile.SpooledTemporaryFile(max_size=max_size, mode='w+b')
+        try:
+            self.export_to(spool)
+        except Exception:
+            spool.close()
+            raise
+        spool.seek(0)
+        return spool
+    
+    def export_to(self, fileobj: BinaryIO) -> None:
+        """
+        Exports the results as a PDF written to a caller-supplied file object.
+        
+        ReportLab renders the whole document in memory and writes it with one
+        write() call once the last page is laid out; output is not streamed
+        page by page, so peak memory still includes one full copy of the PDF.
+        
+        Args:
+            fileobj: Writable binary file object.
+        """
         pagesize = A4 if self.orientation == "portrait" else (A4[1], A4[0])
         
         doc = SimpleDocTemplate(
-            buffer, 
+            fileobj, 
             pagesize=pagesize,
             rightMargin=72, 
             leftMargin=72,
@@ -84,11 +248,8 @@ class PDFExporter:
                 self._add_table(story, data_exams)
                 
         doc.build(story)
-        pdf_bytes = buffer.getvalue()
-        buffer.close()
         
         logging.info("PDF exported")
-        return pdf_bytes
     
     def _add_header(self, story: List[Any]) -> None:
         """Add the header to the PDF."""
@@ -109,27 +270,18 @@ class PDFExporter:
         """
         table_data: List[List[str]] = [["Exame", "Resultado", "Referência", "Status"]]
         
-        for exam_name, vals in data_exams.items():
-            st: str = get_status_from_values(vals['value'], vals['reference'])
+        statuses = classify_results(data_exams)
+        for (exam_name, vals), st in zip(data_exams.items(), statuses):
             table_data.append([
                 exam_name, 
-                f"{vals['value']} {vals['unit']}", 
-                f"{vals['reference']} {vals['unit']}", 
+                get_value_text(vals, self.unit_system),
+                get_reference_text(vals, separator="\n", unit_system=self.unit_system),
                 st
             ])
         
-        colw = [2 * inch, 1.5 * inch, 1.5 * inch, 1 * inch] if self.orientation == "portrait" else [3 * inch, 2 * inch, 2 * inch, 1 * inch]
+        colw = list(self._registry.column_widths[self.orientation])
         tbl = Table(table_data, colWidths=colw)
-        
-        tbl.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 14),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
+        tbl.setStyle(self._registry.table_style)
         
         story.append(tbl)
         story.append(Spacer(1, 20))
\ No newline at end of file
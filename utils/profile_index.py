@@ -0,0 +1,149 @@
+"""
+In-memory index of profile summaries used for profile listings.
+"""
+import bisect
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from models.exam import as_datetime
+
+def summarize_profile(name: str, data: Dict[str, Any], is_favorite: bool) -> Dict[str, Any]:
+    """
+    Builds the listing summary of a stored profile without model validation.
+    
+    Args:
+        name: Profile name.
+        data: Profile dictionary as kept by the profile store.
+        is_favorite: Whether the profile is a favorite.
+    
+    Returns:
+        Summary dictionary with name, description, counts, flags and last_used.
+    """
+    categories = data.get('categories', {})
+    return {
+        'name': name,
+        'description': data.get('description', ""),
+        'exam_count': sum(len(exams) for exams in categories.values()),
+        'category_count': len([cat for cat, exams in categories.items() if exams]),
+        'is_default': bool(data.get('is_default', False)),
+        'is_favorite': is_favorite,
+        'last_used': as_datetime(data['last_used'])
+    }
+
+def _discard_sorted(items: List[Any], item: Any) -> None:
+    """Removes an item from a sorted list if present, using binary search."""
+    i = bisect.bisect_left(items, item)
+    if i < len(items) and items[i] == item:
+        del items[i]
+
+class ProfileSummaryIndex:
+    """
+    Profile summaries kept up to date by the profile manager's mutations.
+    
+    Besides the summaries themselves, the index keeps sorted orderings so the
+    common listings never sort the whole profile set: (last_used, name) pairs
+    for recency, and the names partitioned into favorites and the rest.
+    Updates locate their entries by binary search, in O(log n); inserting
+    into or deleting from the sorted lists still shifts the entries after
+    them, an O(n) memmove that is cheap next to re-sorting at these sizes.
+    """
+    
+    def __init__(self) -> None:
+        self._summaries: Dict[str, Dict[str, Any]] = {}
+        self._by_recency: List[Tuple[datetime, str]] = []
+        self._favorite_names: List[str] = []
+        self._other_names: List[str] = []
+    
+    def _unlink(self, name: str) -> None:
+        """Removes a profile from the sorted orderings."""
+        summary = self._summaries[name]
+        _discard_sorted(self._by_recency, (summary['last_used'], name))
+        _discard_sorted(self._favorite_names if summary['is_favorite'] else self._other_names, name)
+    
+    def _link(self, name: str) -> None:
+        """Adds a profile to the sorted orderings."""
+        summary = self._summaries[name]
+        bisect.insort(self._by_recency, (summary['last_used'], name))
+        bisect.insort(self._favorite_names if summary['is_favorite'] else self._other_names, name)
+    
+    @classmethod
+    def build(cls, items: Iterable[Tuple[str, Dict[str, Any]]], favorites: Set[str]) -> "ProfileSummaryIndex":
+        """
+        Builds an index from the full store content.
+        
+        Args:
+            items: (name, profile dict) pairs.
+            favorites: Names of the favorite profiles.
+        
+        Returns:
+            New ProfileSummaryIndex instance.
+        """
+        index = cls()
+        for name, data in items:
+            index.upsert(name, data, name in favorites)
+        return index
+    
+    def __len__(self) -> int:
+        return len(self._summaries)
+    
+    def __contains__(self, name: str) -> bool:
+        return name in self._summaries
+    
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """Returns a copy of the summary of a profile, or None if absent."""
+        summary = self._summaries.get(name)
+        return dict(summary) if summary is not None else None
+    
+    def upsert(self, name: str, data: Dict[str, Any], is_favorite: bool) -> None:
+        """Adds or replaces the summary of a profile."""
+        if name in self._summaries:
+            self._unlink(name)
+        self._summaries[name] = summarize_profile(name, data, is_favorite)
+        self._link(name)
+    
+    def remove(self, name: str) -> None:
+        """Removes the summary of a profile if present."""
+        if name in self._summaries:
+            self._unlink(name)
+            del self._summaries[name]
+    
+    def set_favorite(self, name: str, favorite: bool) -> None:
+        """Updates the favorite flag of a profile."""
+        if name in self._summaries:
+            self._unlink(name)
+            self._summaries[name]['is_favorite'] = favorite
+            self._link(name)
+    
+    def touch(self, name: str, last_used: datetime) -> None:
+        """Updates the last_used timestamp of a profile."""
+        if name in self._summaries:
+            self._unlink(name)
+            self._summaries[name]['last_used'] = last_used
+            self._link(name)
+    
+    def listing(self) -> List[Dict[str, Any]]:
+        """Returns copies of all summaries, safe for the caller to sort or modify."""
+        return [dict(summary) for summary in self._summaries.values()]
+    
+    def recent(self, k: int) -> List[Dict[str, Any]]:
+        """
+        Returns the k most recently used profiles, most recent first.
+        
+        Args:
+            k: Number of profiles.
+            
+        Returns:
+            Copies of the summaries.
+        """
+        if k <= 0:
+            return []
+        return [dict(self._summaries[name]) for _, name in reversed(self._by_recency[-k:])]
+    
+    def ordered_listing(self) -> List[Dict[str, Any]]:
+        """
+        Returns all profiles with favorites first, each group ordered by name.
+        
+        Returns:
+            Copies of the summaries.
+        """
+        return [dict(self._summaries[name]) for name in self._favorite_names + self._other_names]
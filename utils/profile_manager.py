@@ -1,46 +1,184 @@
 """
 Management of exam profiles: creation, retrieval, deletion, and favorites.
 """
+import atexit
+import functools
 import logging
 import json
+import threading
+import time
+import weakref
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional, Any, Set
-import streamlit as st
+from types import MappingProxyType
+from typing import BinaryIO, Dict, Iterator, List, Mapping, Optional, Any, Set, Tuple
 
-from models.exam import ExamProfile
-from data.defaults import CHECKUP_CATEGORIES, REFERENCE_RANGES, DEFAULT_DESCRIPTIONS
+from models.exam import CompleteExamResult, ExamProfile
+from data.defaults import CHECKUP_CATEGORIES, DERIVED_ANALYTES, REFERENCE_RANGES, DEFAULT_DESCRIPTIONS
+from utils.backup import BACKUP_CHUNK_SIZE, BackupFormatError, ImportReport, ProgressCallback, open_backup
+from utils.history_store import ExamHistoryStore
+from utils.profile_index import ProfileSummaryIndex
+from utils.profile_store import ProfileStore, SessionStateProfileStore
+
+# Managers over shared stores; their buffered touches are flushed when the process exits
+_SHARED_MANAGERS: "weakref.WeakSet[ExamProfileManager]" = weakref.WeakSet()
+
+@atexit.register
+def _flush_shared_managers() -> None:
+    """Writes the touches still buffered by managers over shared stores."""
+    for manager in list(_SHARED_MANAGERS):
+        try:
+            manager.flush()
+        except Exception as e:
+            logging.warning(f"Profile touches lost at exit: {e}")
+
+@functools.lru_cache(maxsize=None)
+def get_default_profiles() -> Mapping[str, Mapping[str, Any]]:
+    """
+    Returns the default exam profiles, built and validated once per process.
+    
+    The profiles are read-only mappings shared by every session; a session
+    store replaces its reference with a private copy when it modifies one.
+    They hold the measured exams of their categories only: derived analytes
+    are added to a profile by choice.
+    
+    Returns:
+        Read-only mapping of profile name to read-only profile data.
+    """
+    profiles: Dict[str, Mapping[str, Any]] = {}
+    for pf_name, cats in CHECKUP_CATEGORIES.items():
+        cat_map: Dict[str, List[str]] = {}
+        for cat in cats:
+            if cat in REFERENCE_RANGES:
+                derived = DERIVED_ANALYTES.get(cat, {})
+                cat_map[cat] = [exam for exam in REFERENCE_RANGES[cat] if exam not in derived]
+        
+        pf = ExamProfile(
+            name=pf_name,
+            categories=cat_map,
+            description=DEFAULT_DESCRIPTIONS.get(pf_name, ""),
+            is_default=True
+        )
+        
+        p_dict = pf.to_trusted_dict()
+        p_dict['categories'] = MappingProxyType(
+            {cat: tuple(exams) for cat, exams in p_dict['categories'].items()}
+        )
+        profiles[pf_name] = MappingProxyType(p_dict)
+        logging.debug(f"Default profile built: {pf_name}")
+        
+    return MappingProxyType(profiles)
+
+def profile_to_dict(p_dict: Mapping[str, Any]) -> Dict[str, Any]:
+    """Returns a plain, JSON-friendly copy of stored profile data."""
+    output = dict(p_dict)
+    output['categories'] = {cat: list(exams) for cat, exams in p_dict['categories'].items()}
+    return output
 
 class ExamProfileManager:
     """Manages exam profiles: creation, retrieval, deletion, and marking as favorite."""
     
-    def __init__(self) -> None:
-        """Initialize the profile manager and load default profiles."""
-        if 'profiles' not in st.session_state:
-            st.session_state.profiles = {}
-            
-        if 'favorite_profiles' not in st.session_state:
-            st.session_state.favorite_profiles = set()
+    # last_used touches are buffered and written in one batch when either limit is reached;
+    # over shared stores a timer enforces the interval even if the session makes no more calls
+    TOUCH_FLUSH_INTERVAL: float = 30.0
+    TOUCH_FLUSH_SIZE: int = 50
+    
+    def __init__(self, store: Optional[ProfileStore] = None) -> None:
+        """
+        Initialize the profile manager and load default profiles.
+        
+        Args:
+            store: Storage backend; defaults to the per-session state store.
+        """
+        self._store = store if store is not None else SessionStateProfileStore()
+        self._index: Optional[ProfileSummaryIndex] = None
+        self._index_revision: int = -1
+        self._pending_touches: Dict[str, datetime] = {}
+        self._last_flush: float = time.monotonic()
+        self._touch_lock = threading.RLock()
+        self._flush_timer: Optional[threading.Timer] = None
+        if self._store.shared:
+            _SHARED_MANAGERS.add(self)
             
         # Load default profiles if none exist
-        if not st.session_state.profiles:
+        if not len(self._store):
             self.load_default_profiles()
     
+    def _summary_index(self) -> ProfileSummaryIndex:
+        """
+        Returns the profile summary index, rebuilding it if the store changed.
+        
+        The index is updated incrementally by this manager's own mutations;
+        a full rebuild only happens when the store was written elsewhere
+        (e.g., by another session sharing the same store).
+        """
+        revision = self._store.revision()
+        if self._index is None or revision != self._index_revision:
+            self._index = ProfileSummaryIndex.build(self._store.items(), self._store.favorites())
+            self._index_revision = revision
+            for name, last_used in self._pending_touches.items():
+                self._index.touch(name, last_used)
+        return self._index
+    
+    @contextmanager
+    def _indexed_write(self) -> Iterator[ProfileSummaryIndex]:
+        """
+        Wraps a single store write together with the matching index update.
+        
+        If any other write reached the store in the meantime, the index is
+        left to be rebuilt on its next use.
+        
+        Yields:
+            The up-to-date summary index.
+        """
+        index = self._summary_index()
+        previous_revision = self._index_revision
+        yield index
+        revision = self._store.revision()
+        self._index_revision = revision if revision == previous_revision + 1 else -1
+    
+    def flush(self) -> None:
+        """Writes the buffered last_used touches to the store in one batch."""
+        with self._touch_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if self._pending_touches:
+                with self._indexed_write():
+                    self._store.touch_many(self._pending_touches)
+                logging.debug(f"Profile touches flushed: {len(self._pending_touches)}")
+                self._pending_touches = {}
+            self._last_flush = time.monotonic()
+    
+    def _maybe_flush(self) -> None:
+        """
+        Flushes the buffered touches if the size or time limit was reached.
+        
+        Otherwise, over a shared store, makes sure a timer flushes them once
+        the interval has passed, so the touches of a session that ends are
+        not lost.
+        """
+        with self._touch_lock:
+            if (len(self._pending_touches) >= self.TOUCH_FLUSH_SIZE
+                    or time.monotonic() - self._last_flush >= self.TOUCH_FLUSH_INTERVAL):
+                self.flush()
+            elif self._pending_touches and self._store.shared and self._flush_timer is None:
+                delay = max(self.TOUCH_FLUSH_INTERVAL - (time.monotonic() - self._last_flush), 0.0)
+                self._flush_timer = threading.Timer(delay, self._flush_on_timer)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+    
+    def _flush_on_timer(self) -> None:
+        """Timer callback: flushes the buffered touches from the timer thread."""
+        try:
+            self.flush()
+        except Exception as e:
+            logging.warning(f"Scheduled flush of profile touches failed: {e}")
+    
     def load_default_profiles(self) -> None:
-        """Loads the default exam profiles."""
-        for pf_name, cats in CHECKUP_CATEGORIES.items():
-            cat_map: Dict[str, List[str]] = {}
-            for cat in cats:
-                if cat in REFERENCE_RANGES:
-                    cat_map[cat] = list(REFERENCE_RANGES[cat].keys())
-            
-            pf = ExamProfile(
-                name=pf_name,
-                categories=cat_map,
-                description=DEFAULT_DESCRIPTIONS.get(pf_name, ""),
-                is_default=True
-            )
-            
-            st.session_state.profiles[pf_name] = pf.dict()
+        """Loads the default exam profiles (shared, not copied, into the store)."""
+        for pf_name, p_dict in get_default_profiles().items():
+            self._store.put(pf_name, p_dict)
             logging.debug(f"Default profile loaded: {pf_name}")
     
     def create_profile(self, name: str, categories: Dict[str, List[str]], desc: str = "") -> ExamProfile:
@@ -58,7 +196,7 @@ class ExamProfileManager:
         Raises:
             ValueError: If a profile with the same name already exists.
         """
-        if name in st.session_state.profiles:
+        if name in self._store:
             logging.error(f"Profile '{name}' already exists.")
             raise ValueError("Profile with this name already exists.")
             
@@ -69,13 +207,20 @@ class ExamProfileManager:
             is_default=False
         )
         
-        st.session_state.profiles[name] = pf.dict()
+        p_dict = pf.to_trusted_dict()
+        with self._indexed_write() as index:
+            self._store.put(name, p_dict)
+            index.upsert(name, p_dict, False)
         logging.info(f"Profile created: {name}")
         return pf
     
     def get_profile(self, name: str) -> Optional[ExamProfile]:
         """
-        Returns a profile by name.
+        Returns a profile by name and records its use.
+        
+        The read itself does not write to the store: the new last_used is
+        buffered and flushed with other touches in a later batch, while the
+        summary index reflects it immediately.
         
         Args:
             name: Profile name.
@@ -83,35 +228,52 @@ class ExamProfileManager:
         Returns:
             ExamProfile instance if found, otherwise None.
         """
-        if name not in st.session_state.profiles:
+        p_dict = self._store.get(name)
+        if p_dict is None:
             return None
             
-        p_dict = st.session_state.profiles[name]
-        p = ExamProfile(**p_dict)
+        p = ExamProfile.from_trusted(p_dict)
         p.update_last_used()
         
-        # Update the session state with the new last_used timestamp
-        st.session_state.profiles[name] = p.dict()
+        # Buffer the new last_used timestamp
+        with self._touch_lock:
+            self._pending_touches[name] = p.last_used
+            self._summary_index().touch(name, p.last_used)
+            self._maybe_flush()
         
         return p
     
     def get_all_profiles(self) -> List[Dict[str, Any]]:
         """
         Returns a list with all profiles and their metadata.
+        
+        Served from the summary index, so listings do not revalidate models.
         """
-        output = []
-        for n, p_dict in st.session_state.profiles.items():
-            p = ExamProfile(**p_dict)
-            output.append({
-                'name': p.name,
-                'description': p.description,
-                'exam_count': p.get_exam_count(),
-                'category_count': p.get_category_count(),
-                'is_default': p.is_default,
-                'is_favorite': (n in st.session_state.favorite_profiles),
-                'last_used': p.last_used
-            })
-        return output
+        self._maybe_flush()
+        return self._summary_index().listing()
+    
+    def recent(self, k: int) -> List[Dict[str, Any]]:
+        """
+        Returns the k most recently used profiles, most recent first.
+        
+        Args:
+            k: Number of profiles.
+            
+        Returns:
+            List of profile metadata, in the same format as get_all_profiles.
+        """
+        self._maybe_flush()
+        return self._summary_index().recent(k)
+    
+    def ordered_listing(self) -> List[Dict[str, Any]]:
+        """
+        Returns all profiles with favorites first, then by name.
+        
+        Returns:
+            List of profile metadata, in the same format as get_all_profiles.
+        """
+        self._maybe_flush()
+        return self._summary_index().ordered_listing()
     
     def delete_profile(self, name: str) -> None:
         """
@@ -123,19 +285,20 @@ class ExamProfileManager:
         Raises:
             ValueError: If the profile is not found or is a default profile.
         """
-        pf = self.get_profile(name)
-        if not pf:
+        p_dict = self._store.get(name)
+        if p_dict is None:
             logging.error("Profile not found.")
             raise ValueError("Profile not found.")
             
-        if pf.is_default:
+        if p_dict.get('is_default', False):
             logging.error("Cannot delete default profiles.")
             raise ValueError("Cannot delete default profiles.")
             
-        del st.session_state.profiles[name]
-        
-        if name in st.session_state.favorite_profiles:
-            st.session_state.favorite_profiles.remove(name)
+        with self._touch_lock:
+            self._pending_touches.pop(name, None)
+        with self._indexed_write() as index:
+            self._store.delete(name)
+            index.remove(name)
             
         logging.info(f"Profile deleted: {name}")
     
@@ -149,13 +312,267 @@ class ExamProfileManager:
         Raises:
             ValueError: If the profile doesn't exist.
         """
-        if name not in st.session_state.profiles:
+        if name not in self._store:
             logging.error("Profile does not exist.")
             raise ValueError("Profile does not exist.")
             
-        if name in st.session_state.favorite_profiles:
-            st.session_state.favorite_profiles.remove(name)
-            logging.debug(f"Profile removed from favorites: {name}")
+        favorite = name not in self._store.favorites()
+        
+        with self._indexed_write() as index:
+            self._store.set_favorite(name, favorite)
+            index.set_favorite(name, favorite)
+        
+        if favorite:
+            logging.debug(f"Profile marked as favorite: {name}")
         else:
-            st.session_state.favorite_profiles.add(name)
-            logging.debug(f"Profile marked as favorite: {name}")
\ No newline at end of file
+            logging.debug(f"Profile removed from favorites: {name}")
+    
+    def iter_export(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Yields every profile in the backup format, one at a time.
+        
+        Yields:
+            (name, plain profile dict) pairs.
+        """
+        self.flush()
+        for name, p_dict in self._store.items():
+            yield name, profile_to_dict(p_dict)
+    
+    def favorite_names(self) -> List[str]:
+        """Returns the names of the favorite profiles, sorted."""
+        return sorted(self._store.favorites())
+    
+    def backup_checkpoint(self) -> int:
+        """
+        Returns the store revision a backup taken now corresponds to.
+        
+        Buffered touches are flushed first, so they are covered by the backup.
+        """
+        self.flush()
+        return self._store.revision()
+    
+    def iter_changes(self, since: int) -> Iterator[Tuple[str, Dict[str, Any], bool]]:
+        """
+        Yields the profiles created or changed after a store revision.
+        
+        Args:
+            since: Store revision of the previous backup.
+        
+        Yields:
+            (name, plain profile dict, is favorite) triples.
+        """
+        for name, p_dict, favorite in self._store.changes_since(since):
+            yield name, profile_to_dict(p_dict), favorite
+    
+    def deleted_since(self, since: int) -> List[str]:
+        """Returns the names of the profiles deleted after a store revision."""
+        return self._store.tombstones_since(since)
+    
+    def export_data(self) -> Dict[str, Any]:
+        """
+        Returns all profiles and favorites in the backup format.
+        
+        Returns:
+            Dictionary with 'profiles' (name -> profile dict) and 'favorite_profiles'.
+        """
+        self.flush()
+        return {
+            'profiles': {name: profile_to_dict(p_dict) for name, p_dict in self._store.items()},
+            'favorite_profiles': sorted(self._store.favorites())
+        }
+    
+    def import_data(self, profiles: Dict[str, Dict[str, Any]], favorites: List[str]) -> None:
+        """
+        Replaces all profiles and favorites with imported data.
+        
+        Imported data is untrusted: every profile is validated first, and
+        nothing is replaced if any profile is invalid.
+        
+        Args:
+            profiles: Dictionary mapping profile names to profile dicts.
+            favorites: Names of the favorite profiles.
+            
+        Raises:
+            pydantic.ValidationError: If a profile is invalid.
+        """
+        validated = {name: ExamProfile(**p_dict).to_trusted_dict() for name, p_dict in profiles.items()}
+        self._pending_touches = {}
+        self._store.replace_all(validated, favorites)
+        self._index = None
+        logging.info(f"Profiles imported: {len(profiles)}")
+    
+    def import_backup(
+        self,
+        fileobj: BinaryIO,
+        batch_size: int = 500,
+        progress: Optional[ProgressCallback] = None,
+        chunk_size: int = BACKUP_CHUNK_SIZE,
+        history_store: Optional[ExamHistoryStore] = None
+    ) -> ImportReport:
+        """
+        Imports a backup file (JSON or compact, full or delta) incrementally.
+        
+        Profiles are decoded and validated one at a time and written to the
+        store in batches; invalid profiles are reported and skipped.
+        
+        A full backup replaces the current profiles: profiles absent from it
+        are removed and the favorites replaced only once the whole file was
+        read, so a truncated or corrupt file never deletes data (profiles
+        imported before the error are kept). A stored profile whose backup
+        record is invalid is reported and left untouched. A delta backup is applied on
+        top of the current profiles: changed profiles are written with their
+        favorite flag and tombstoned profiles are deleted.
+        
+        Exam records of compact backups are validated and restored into the
+        history store; records it already holds are recognized by identity
+        and skipped (see ExamHistoryStore.restore_many).
+        
+        Once a backup with a checkpoint is imported, the store (and history)
+        revisions are advanced to it, so later changes are carried by a delta
+        backup taken from it.
+        
+        Args:
+            fileobj: Seekable binary file object with the backup.
+            batch_size: Profiles or exam records written to a store per write.
+            progress: Called with (bytes read, profiles imported) after each batch.
+            chunk_size: Bytes read from the file at a time.
+            history_store: Store receiving exam records; records are skipped if None.
+        
+        Returns:
+            ImportReport with counts and per-record errors.
+        """
+        start = time.perf_counter()
+        imported: Set[str] = set()
+        failed: List[Tuple[str, str]] = []
+        favorites: List[str] = []
+        batch: Dict[str, Dict[str, Any]] = {}
+        favorite_flags: Dict[str, bool] = {}
+        deletions: List[str] = []
+        exam_batch: List[Tuple[int, Optional[str], CompleteExamResult]] = []
+        exams = removed = 0
+        reader = None
+        
+        def commit() -> None:
+            nonlocal exams, removed
+            if batch:
+                self._store.put_many(batch)
+                imported.update(batch)
+                batch.clear()
+            if favorite_flags:
+                current = self._store.favorites()
+                self._store.set_favorites(
+                    {name for name in current if favorite_flags.get(name, True)}
+                    | {name for name, favorite in favorite_flags.items() if favorite}
+                )
+                favorite_flags.clear()
+            if deletions:
+                self._store.delete_many(deletions)
+                removed += len(deletions)
+                deletions.clear()
+            if exam_batch:
+                exams += history_store.restore_many(exam_batch)
+                exam_batch.clear()
+            if progress is not None:
+                progress(reader.bytes_read, len(imported))
+        
+        self._pending_touches = {}
+        self._index = None
+        error: Optional[str] = None
+        try:
+            reader = open_backup(fileobj, chunk_size)
+            for event in reader:
+                if event.kind == 'favorites':
+                    favorites = event.value
+                    continue
+                
+                if event.kind == 'favorite':
+                    if event.name in batch or event.name in imported:
+                        favorite_flags[event.name] = event.value
+                    continue
+                
+                if event.kind == 'tombstone':
+                    deletions.append(event.name)
+                    if len(deletions) >= batch_size:
+                        commit()
+                    continue
+                
+                if event.kind == 'exam':
+                    if history_store is None:
+                        continue
+                    try:
+                        exam_batch.append((event.name, event.uid, CompleteExamResult(**event.value)))
+                    except (TypeError, ValueError) as e:
+                        failed.append((f"exame #{event.name}", str(e)))
+                        logging.warning(f"Invalid exam record skipped during import: {event.name}")
+                        continue
+                    if len(exam_batch) >= batch_size:
+                        commit()
+                    continue
+                
+                name, p_dict = event.name, event.value
+                try:
+                    if not isinstance(p_dict, dict):
+                        raise ValueError("Profile must be a JSON object.")
+                    if p_dict.get('name') != name:
+                        raise ValueError("Profile name does not match its key.")
+                    batch[name] = ExamProfile(**p_dict).to_trusted_dict()
+                except (TypeError, ValueError) as e:
+                    failed.append((name, str(e)))
+                    logging.warning(f"Invalid profile skipped during import: {name}")
+                    continue
+                
+                if len(batch) >= batch_size:
+                    commit()
+            commit()
+        except BackupFormatError as e:
+            error = str(e)
+            logging.error(f"Backup import stopped: {error}")
+        
+        n_favorites = 0
+        if error is None and reader.kind == 'full':
+            # Profiles whose backup record is invalid are kept as they are, not deleted
+            rejected = {name for name, _ in failed} - imported
+            stale = [name for name, _ in self._store.items() if name not in imported and name not in rejected]
+            if stale:
+                self._store.delete_many(stale)
+            current_favorites = self._store.favorites()
+            kept_favorites = [name for name in favorites if name in imported] + [
+                name for name in current_favorites if name in rejected
+            ]
+            self._store.set_favorites(kept_favorites)
+            removed = len(stale)
+            n_favorites = len(kept_favorites)
+        elif error is None:
+            n_favorites = len(self._store.favorites())
+        
+        # Changes made from now on must be newer than the restored checkpoint,
+        # or a delta taken from this backup would leave them out
+        checkpoint = reader.meta.get('checkpoint') if error is None else None
+        if checkpoint:
+            self._store.advance_revision(checkpoint.get('profiles', 0))
+            if history_store is not None:
+                history_store.advance_revision(checkpoint.get('exams', 0))
+        
+        report = ImportReport(
+            imported=len(imported),
+            failed=failed,
+            removed=removed,
+            favorites=n_favorites,
+            complete=error is None,
+            error=error,
+            elapsed_seconds=time.perf_counter() - start,
+            exams=exams
+        )
+        logging.info(
+            f"Backup import ({reader.kind if reader is not None else 'unknown'}): {report.imported} imported, "
+            f"{report.exams} exam records, {len(report.failed)} invalid, "
+            f"{report.removed} removed in {report.elapsed_seconds:.2f}s"
+        )
+        return report
+    
+    def clear(self) -> None:
+        """Removes every profile and favorite from the store."""
+        self._pending_touches = {}
+        self._store.clear()
+        self._index = None
+        logging.info("All profiles cleared.")
\ No newline at end of file
@@ -0,0 +1,472 @@
+"""
+Storage backends for exam profiles.
+"""
+import json
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import streamlit as st
+
+from utils.db import SQLiteConnectionPool
+
+class ProfileStore(ABC):
+    """
+    Interface of a profile storage backend.
+    
+    Profiles are stored as the dictionaries produced by ExamProfile.dict(),
+    keyed by profile name. Favorites are kept as a separate set of names.
+    Every write bumps a monotonic revision, which lets readers that cache
+    store content detect writes made by other sessions. The revision is also
+    the change sequence used by delta backups: each profile records the
+    revision of its last change, and deleted profiles leave a tombstone
+    with the revision of their deletion. Restoring a backup advances the
+    revision to the backup's checkpoint, so changes made after a restore are
+    newer than it even in a store that started empty (e.g. a new session).
+    
+    Stored profile data may be a read-only mapping shared between sessions
+    (see get_default_profiles); stores never modify it in place.
+    """
+    
+    # True if the store outlives the session, so buffered writes must reach it after the session ends
+    shared: bool = False
+    
+    @abstractmethod
+    def revision(self) -> int:
+        """Returns the store revision, increased by one on every write."""
+    
+    @abstractmethod
+    def advance_revision(self, revision: int) -> None:
+        """Raises the store revision to at least a value; it is never lowered."""
+    
+    @abstractmethod
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """Returns the profile dictionary of a name, or None if absent."""
+    
+    @abstractmethod
+    def put(self, name: str, data: Dict[str, Any]) -> None:
+        """Creates or replaces a profile."""
+    
+    @abstractmethod
+    def put_many(self, profiles: Dict[str, Dict[str, Any]]) -> None:
+        """Creates or replaces several profiles in one write."""
+    
+    @abstractmethod
+    def touch_many(self, updates: Dict[str, datetime]) -> None:
+        """Sets the last_used timestamp of several profiles in one write."""
+    
+    @abstractmethod
+    def delete(self, name: str) -> None:
+        """Deletes a profile (and its favorite flag) if present."""
+    
+    @abstractmethod
+    def delete_many(self, names: Iterable[str]) -> None:
+        """Deletes several profiles (and their favorite flags) in one write."""
+    
+    @abstractmethod
+    def __contains__(self, name: str) -> bool:
+        ...
+    
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+    
+    @abstractmethod
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Iterates over (name, profile dictionary) pairs."""
+    
+    @abstractmethod
+    def favorites(self) -> Set[str]:
+        """Returns the names of the favorite profiles."""
+    
+    @abstractmethod
+    def set_favorite(self, name: str, favorite: bool) -> None:
+        """Marks or unmarks a profile as favorite."""
+    
+    @abstractmethod
+    def set_favorites(self, names: Iterable[str]) -> None:
+        """Replaces the whole set of favorite profiles."""
+    
+    @abstractmethod
+    def clear(self) -> None:
+        """Removes every profile and favorite."""
+    
+    @abstractmethod
+    def changes_since(self, revision: int) -> Iterator[Tuple[str, Dict[str, Any], bool]]:
+        """Iterates over (name, profile dictionary, is favorite) of profiles changed after a revision."""
+    
+    @abstractmethod
+    def tombstones_since(self, revision: int) -> List[str]:
+        """Returns the names of profiles deleted after a revision and not recreated."""
+    
+    @abstractmethod
+    def replace_all(self, profiles: Dict[str, Dict[str, Any]], favorites: Iterable[str]) -> None:
+        """Replaces the whole store content."""
+
+class SessionStateProfileStore(ProfileStore):
+    """Keeps profiles in the Streamlit session state (one copy per browser session)."""
+    
+    def __init__(self) -> None:
+        """Initialize the session state keys used by the store."""
+        if 'profiles' not in st.session_state:
+            st.session_state.profiles = {}
+        
+        if 'favorite_profiles' not in st.session_state:
+            st.session_state.favorite_profiles = set()
+        
+        if 'profiles_revision' not in st.session_state:
+            st.session_state.profiles_revision = 0
+        
+        if 'profile_seqs' not in st.session_state:
+            st.session_state.profile_seqs = {}
+        
+        if 'profile_tombstones' not in st.session_state:
+            st.session_state.profile_tombstones = {}
+    
+    def _bump(self) -> int:
+        st.session_state.profiles_revision += 1
+        return st.session_state.profiles_revision
+    
+    def _changed(self, names: Iterable[str], revision: int) -> None:
+        """Records the change sequence of written profiles."""
+        for name in names:
+            st.session_state.profile_seqs[name] = revision
+            st.session_state.profile_tombstones.pop(name, None)
+    
+    def _deleted(self, names: Iterable[str], revision: int) -> None:
+        """Leaves tombstones for deleted profiles."""
+        for name in names:
+            st.session_state.profile_seqs.pop(name, None)
+            st.session_state.profile_tombstones[name] = revision
+    
+    def revision(self) -> int:
+        return st.session_state.profiles_revision
+    
+    def advance_revision(self, revision: int) -> None:
+        st.session_state.profiles_revision = max(st.session_state.profiles_revision, revision)
+    
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        return st.session_state.profiles.get(name)
+    
+    def put(self, name: str, data: Dict[str, Any]) -> None:
+        st.session_state.profiles[name] = data
+        self._changed([name], self._bump())
+    
+    def put_many(self, profiles: Dict[str, Dict[str, Any]]) -> None:
+        st.session_state.profiles.update(profiles)
+        self._changed(profiles, self._bump())
+    
+    def touch_many(self, updates: Dict[str, datetime]) -> None:
+        profiles = st.session_state.profiles
+        for name, last_used in updates.items():
+            if name in profiles:
+                # Copy on write: shared default profiles are never modified
+                data = dict(profiles[name])
+                data['last_used'] = last_used
+                profiles[name] = data
+        self._changed([name for name in updates if name in profiles], self._bump())
+    
+    def delete(self, name: str) -> None:
+        self.delete_many([name])
+    
+    def delete_many(self, names: Iterable[str]) -> None:
+        deleted = []
+        for name in names:
+            if st.session_state.profiles.pop(name, None) is not None:
+                deleted.append(name)
+            st.session_state.favorite_profiles.discard(name)
+        self._deleted(deleted, self._bump())
+    
+    def __contains__(self, name: str) -> bool:
+        return name in st.session_state.profiles
+    
+    def __len__(self) -> int:
+        return len(st.session_state.profiles)
+    
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        return iter(list(st.session_state.profiles.items()))
+    
+    def favorites(self) -> Set[str]:
+        return st.session_state.favorite_profiles
+    
+    def set_favorite(self, name: str, favorite: bool) -> None:
+        if favorite:
+            st.session_state.favorite_profiles.add(name)
+        else:
+            st.session_state.favorite_profiles.discard(name)
+        self._changed([name] if name in st.session_state.profiles else [], self._bump())
+    
+    def set_favorites(self, names: Iterable[str]) -> None:
+        previous = st.session_state.favorite_profiles
+        st.session_state.favorite_profiles = set(names)
+        flipped = previous ^ st.session_state.favorite_profiles
+        self._changed([name for name in flipped if name in st.session_state.profiles], self._bump())
+    
+    def clear(self) -> None:
+        removed = list(st.session_state.profiles)
+        st.session_state.profiles = {}
+        st.session_state.favorite_profiles = set()
+        self._deleted(removed, self._bump())
+    
+    def replace_all(self, profiles: Dict[str, Dict[str, Any]], favorites: Iterable[str]) -> None:
+        removed = [name for name in st.session_state.profiles if name not in profiles]
+        st.session_state.profiles = dict(profiles)
+        st.session_state.favorite_profiles = set(favorites)
+        revision = self._bump()
+        self._deleted(removed, revision)
+        self._changed(profiles, revision)
+    
+    def changes_since(self, revision: int) -> Iterator[Tuple[str, Dict[str, Any], bool]]:
+        seqs = st.session_state.profile_seqs
+        favorites = st.session_state.favorite_profiles
+        for name, data in list(st.session_state.profiles.items()):
+            if seqs.get(name, 0) > revision:
+                yield name, data, name in favorites
+    
+    def tombstones_since(self, revision: int) -> List[str]:
+        return sorted(
+            name for name, seq in st.session_state.profile_tombstones.items() if seq > revision
+        )
+
+class SQLiteProfileStore(ProfileStore):
+    """Keeps profiles in a SQLite database shared by every session of the process."""
+    
+    shared = True
+    
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS profiles (
+            name TEXT PRIMARY KEY,
+            description TEXT NOT NULL DEFAULT '',
+            categories TEXT NOT NULL,
+            is_default INTEGER NOT NULL DEFAULT 0,
+            is_favorite INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            last_used TEXT NOT NULL,
+            seq INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_profiles_last_used ON profiles (last_used);
+        CREATE INDEX IF NOT EXISTS idx_profiles_is_default ON profiles (is_default, name);
+        CREATE INDEX IF NOT EXISTS idx_profiles_is_favorite ON profiles (is_favorite, name);
+        CREATE INDEX IF NOT EXISTS idx_profiles_seq ON profiles (seq);
+        CREATE TABLE IF NOT EXISTS profile_tombstones (
+            name TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_tombstones_seq ON profile_tombstones (seq);
+        CREATE TABLE IF NOT EXISTS store_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO store_meta (key, value) VALUES ('revision', 0);
+    """
+    
+    _COLUMNS = "name, description, categories, is_default, created_at, last_used"
+    
+    _UPSERT = (
+        "INSERT INTO profiles (name, description, categories, is_default, created_at, last_used, seq) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET description = excluded.description, "
+        "categories = excluded.categories, is_default = excluded.is_default, "
+        "created_at = excluded.created_at, last_used = excluded.last_used, seq = excluded.seq"
+    )
+    
+    def __init__(self, path: str) -> None:
+        """
+        Open (and create if needed) the profile database.
+        
+        Args:
+            path: Database file path.
+        """
+        self._pool = SQLiteConnectionPool(path)
+        with self._pool.transaction() as conn:
+            for statement in self._SCHEMA.split(';'):
+                if statement.strip():
+                    conn.execute(statement)
+        logging.info(f"SQLite profile store opened: {path}")
+    
+    @staticmethod
+    def _to_row(name: str, data: Dict[str, Any], seq: int) -> Tuple[Any, ...]:
+        return (
+            name,
+            data.get('description', ""),
+            json.dumps({cat: list(exams) for cat, exams in data['categories'].items()}, ensure_ascii=False),
+            int(bool(data.get('is_default', False))),
+            _to_iso(data.get('created_at')),
+            _to_iso(data.get('last_used')),
+            seq
+        )
+    
+    @staticmethod
+    def _from_row(row: Any) -> Dict[str, Any]:
+        return {
+            'name': row['name'],
+            'categories': json.loads(row['categories']),
+            'description': row['description'],
+            'is_default': bool(row['is_default']),
+            'created_at': datetime.fromisoformat(row['created_at']),
+            'last_used': datetime.fromisoformat(row['last_used'])
+        }
+    
+    @staticmethod
+    def _bump(conn: Any) -> int:
+        """Increments the revision inside an open transaction and returns it."""
+        conn.execute("UPDATE store_meta SET value = value + 1 WHERE key = 'revision'")
+        return conn.execute("SELECT value FROM store_meta WHERE key = 'revision'").fetchone()[0]
+    
+    @staticmethod
+    def _forget_tombstones(conn: Any, names: Iterable[str]) -> None:
+        conn.executemany("DELETE FROM profile_tombstones WHERE name = ?", ((name,) for name in names))
+    
+    @staticmethod
+    def _bury(conn: Any, names: Iterable[str], seq: int) -> None:
+        conn.executemany(
+            "INSERT INTO profile_tombstones (name, seq) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET seq = excluded.seq",
+            ((name, seq) for name in names)
+        )
+    
+    def revision(self) -> int:
+        return self._pool.connection().execute(
+            "SELECT value FROM store_meta WHERE key = 'revision'"
+        ).fetchone()[0]
+    
+    def advance_revision(self, revision: int) -> None:
+        with self._pool.transaction() as conn:
+            conn.execute("UPDATE store_meta SET value = MAX(value, ?) WHERE key = 'revision'", (revision,))
+    
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        row = self._pool.connection().execute(
+            f"SELECT {self._COLUMNS} FROM profiles WHERE name = ?", (name,)
+        ).fetchone()
+        return self._from_row(row) if row else None
+    
+    def put(self, name: str, data: Dict[str, Any]) -> None:
+        self.put_many({name: data})
+    
+    def put_many(self, profiles: Dict[str, Dict[str, Any]]) -> None:
+        with self._pool.transaction() as conn:
+            seq = self._bump(conn)
+            conn.executemany(self._UPSERT, (self._to_row(name, data, seq) for name, data in profiles.items()))
+            self._forget_tombstones(conn, profiles)
+    
+    def touch_many(self, updates: Dict[str, datetime]) -> None:
+        with self._pool.transaction() as conn:
+            seq = self._bump(conn)
+            conn.executemany(
+                "UPDATE profiles SET last_used = ?, seq = ? WHERE name = ?",
+                ((_to_iso(last_used), seq, name) for name, last_used in updates.items())
+            )
+    
+    def delete(self, name: str) -> None:
+        self.delete_many([name])
+    
+    def delete_many(self, names: Iterable[str]) -> None:
+        names = list(names)
+        with self._pool.transaction() as conn:
+            seq = self._bump(conn)
+            existing = [
+                name for name in names
+                if conn.execute("SELECT 1 FROM profiles WHERE name = ?", (name,)).fetchone() is not None
+            ]
+            conn.executemany("DELETE FROM profiles WHERE name = ?", ((name,) for name in existing))
+            self._bury(conn, existing, seq)
+    
+    def __contains__(self, name: str) -> bool:
+        row = self._pool.connection().execute(
+            "SELECT 1 FROM profiles WHERE name = ?", (name,)
+        ).fetchone()
+        return row is not None
+    
+    def __len__(self) -> int:
+        return self._pool.connection().execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+    
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        cursor = self._pool.connection().execute(
+            f"SELECT {self._COLUMNS} FROM profiles ORDER BY name"
+        )
+        for row in cursor:
+            yield row['name'], self._from_row(row)
+    
+    def favorites(self) -> Set[str]:
+        rows = self._pool.connection().execute(
+            "SELECT name FROM profiles WHERE is_favorite = 1"
+        ).fetchall()
+        return {row['name'] for row in rows}
+    
+    def set_favorite(self, name: str, favorite: bool) -> None:
+        with self._pool.transaction() as conn:
+            seq = self._bump(conn)
+            conn.execute(
+                "UPDATE profiles SET is_favorite = ?, seq = ? WHERE name = ? AND is_favorite != ?",
+                (int(favorite), seq, name, int(favorite))
+            )
+    
+    def set_favorites(self, names: Iterable[str]) -> None:
+        favorite_names = set(names)
+        with self._pool.transaction() as conn:
+            seq = self._bump(conn)
+            current = {row['name'] for row in conn.execute("SELECT name FROM profiles WHERE is_favorite = 1")}
+            conn.executemany(
+                "UPDATE profiles SET is_favorite = 0, seq = ? WHERE name = ?",
+                ((seq, name) for name in current - favorite_names)
+            )
+            conn.executemany(
+                "UPDATE profiles SET is_favorite = 1, seq = ? WHERE name = ?",
+                ((seq, name) for name in favorite_names - current)
+            )
+    
+    def clear(self) -> None:
+        with self._pool.transaction() as conn:
+            seq = self._bump(conn)
+            conn.execute(
+                "INSERT INTO profile_tombstones (name, seq) SELECT name, ? FROM profiles WHERE true "
+                "ON CONFLICT(name) DO UPDATE SET seq = excluded.seq",
+                (seq,)
+            )
+            conn.execute("DELETE FROM profiles")
+    
+    def replace_all(self, profiles: Dict[str, Dict[str, Any]], favorites: Iterable[str]) -> None:
+        favorite_names = set(favorites)
+        with self._pool.transaction() as conn:
+            seq = self._bump(conn)
+            removed = [
+                row['name'] for row in conn.execute("SELECT name FROM profiles")
+                if row['name'] not in profiles
+            ]
+            self._bury(conn, removed, seq)
+            conn.execute("DELETE FROM profiles")
+            conn.executemany(
+                "INSERT INTO profiles (name, description, categories, is_default, created_at, last_used, seq) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self._to_row(name, data, seq) for name, data in profiles.items())
+            )
+            self._forget_tombstones(conn, profiles)
+            conn.executemany(
+                "UPDATE profiles SET is_favorite = 1 WHERE name = ?",
+                ((name,) for name in favorite_names)
+            )
+    
+    def changes_since(self, revision: int) -> Iterator[Tuple[str, Dict[str, Any], bool]]:
+        cursor = self._pool.connection().execute(
+            f"SELECT {self._COLUMNS}, is_favorite FROM profiles WHERE seq > ? ORDER BY name", (revision,)
+        )
+        for row in cursor:
+            yield row['name'], self._from_row(row), bool(row['is_favorite'])
+    
+    def tombstones_since(self, revision: int) -> List[str]:
+        rows = self._pool.connection().execute(
+            "SELECT name FROM profile_tombstones WHERE seq > ? ORDER BY name", (revision,)
+        ).fetchall()
+        return [row['name'] for row in rows]
+    
+    def close(self) -> None:
+        """Closes the database connections."""
+        self._pool.close()
+
+def _to_iso(value: Any) -> str:
+    """Serializes a datetime (or an ISO string from a JSON backup) to ISO format."""
+    if value is None:
+        return datetime.now().isoformat()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return datetime.fromisoformat(str(value)).isoformat()
@@ -0,0 +1,270 @@
+"""
+Compiled index of reference ranges for fast status classification.
+"""
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data.defaults import REFERENCE_RANGES
+from models.exam import ReferenceRange
+from utils.cache import stable_hash
+
+# Sex codes used by the index: unknown, male, female
+SEX_UNKNOWN, SEX_MALE, SEX_FEMALE = 0, 1, 2
+
+# Accepted spellings of each sex, upper case
+SEX_CODES = {
+    'M': SEX_MALE, 'MASCULINO': SEX_MALE, 'MALE': SEX_MALE,
+    'F': SEX_FEMALE, 'FEMININO': SEX_FEMALE, 'FEMALE': SEX_FEMALE
+}
+
+# Display names of the sexes, used in stratum descriptions
+SEX_LABELS = {SEX_MALE: "Masculino", SEX_FEMALE: "Feminino"}
+
+# Ages are clamped below this bound when searched in the flat interval table
+_AGE_SPAN = 1000.0
+
+def sex_code(sex: Any) -> int:
+    """Returns the sex code of 'M'/'F' (or Masculino/Feminino, any case); SEX_UNKNOWN otherwise."""
+    if isinstance(sex, (int, np.integer)):
+        return int(sex) if sex in (SEX_MALE, SEX_FEMALE) else SEX_UNKNOWN
+    if not isinstance(sex, str):
+        return SEX_UNKNOWN
+    return SEX_CODES.get(sex.strip().upper(), SEX_UNKNOWN)
+
+def sex_codes(sexes: Any) -> np.ndarray:
+    """Vectorized sex_code over an array-like of strings (missing values are unknown)."""
+    values = pd.Series(sexes)
+    if pd.api.types.is_numeric_dtype(values):
+        return np.where(values.isin([SEX_MALE, SEX_FEMALE]), values, SEX_UNKNOWN).astype(np.int64)
+    values = values.astype(object)
+    codes = values.map(SEX_CODES)
+    retry = codes.isna() & values.notna()
+    if retry.any():
+        codes[retry] = values[retry].astype(str).str.strip().str.upper().map(SEX_CODES)
+    return codes.fillna(SEX_UNKNOWN).to_numpy(dtype=np.int64)
+
+def _age_label(age_min: float, age_max: Optional[float]) -> str:
+    """Display label of an age band (e.g., "12 a 18 anos", "70+ anos")."""
+    if age_max is None:
+        return f"{age_min:g}+ anos"
+    return f"{age_min:g} a {age_max:g} anos"
+
+class ReferenceIndex:
+    """
+    Numeric reference bounds precompiled from a reference range table.
+    
+    Every range gets a reference ID: the IDs of the default ranges come first,
+    in table order (get_id), followed by the sex-specific ranges and the age
+    bands. Bounds, labels and units are looked up by ID, so code that carries
+    a resolved ID classifies against the right stratum without knowing it.
+    
+    For each exam and sex the age axis is cut into intervals, each mapped to
+    the most specific range that applies (age band of that sex, then age band
+    for both sexes, then the sex-specific range, then the default range), so
+    resolution is a binary search over a handful of breakpoints.
+    """
+    
+    def __init__(self, ranges: Dict[str, Dict[str, Dict]]) -> None:
+        """
+        Compile the reference table.
+        
+        Args:
+            ranges: Mapping of category -> exam -> reference range dict (see ReferenceRange).
+        """
+        self._ids: Dict[Tuple[str, str], int] = {}
+        self._keys: List[Tuple[str, str]] = []
+        self._mins: List[float] = []
+        self._maxs: List[float] = []
+        self._units: List[str] = []
+        self._labels: List[str] = []
+        self._strata: List[str] = []
+        self._base: List[int] = []
+        # Identifies the compiled table, so reference IDs can be used in persistent cache keys
+        self.fingerprint: str = stable_hash(ranges)
+        
+        for category, exams in ranges.items():
+            for exam_name, ref in exams.items():
+                self._add((category, exam_name), ref['min'], ref['max'], ref['unit'], "")
+        
+        # (base ID, sex code) -> (interval starts, reference IDs); base ID -> ID when age is unknown, by sex
+        self._intervals: Dict[Tuple[int, int], Tuple[List[float], List[int]]] = {}
+        self._ageless: Dict[Tuple[int, int], int] = {}
+        for category, exams in ranges.items():
+            for exam_name, ref in exams.items():
+                self._compile_strata(self._ids[(category, exam_name)], ReferenceRange(**ref), ref)
+        
+        # Column views indexed by reference ID, for classifying arrays of IDs at once
+        self.min_array = np.array(self._mins, dtype=float)
+        self.max_array = np.array(self._maxs, dtype=float)
+        self.unit_array = np.array(self._units, dtype=object)
+        self.label_array = np.array(self._labels, dtype=object)
+        self.base_array = np.array(self._base, dtype=np.int64)
+        self.category_array = np.array([key[0] for key in self._keys], dtype=object)
+        self.exam_array = np.array([key[1] for key in self._keys], dtype=object)
+        
+        # Every interval table flattened into one sorted array keyed by
+        # (base ID * 3 + sex code) * _AGE_SPAN + interval start, for resolve_many
+        n_base = len(self._ids)
+        flat = sorted(
+            ((base * 3 + sex) * _AGE_SPAN + start, ref_id)
+            for (base, sex), (starts, ids) in self._intervals.items()
+            for start, ref_id in zip(starts, ids)
+        )
+        self._flat_keys = np.array([key for key, _ in flat], dtype=float)
+        self._flat_ids = np.array([ref_id for _, ref_id in flat], dtype=np.int64)
+        self._ageless_array = np.array(
+            [self._ageless[(base, sex)] for base in range(n_base) for sex in (SEX_UNKNOWN, SEX_MALE, SEX_FEMALE)],
+            dtype=np.int64
+        )
+    
+    def _add(self, key: Tuple[str, str], ref_min: Any, ref_max: Any, unit: str, stratum: str, base: Optional[int] = None) -> int:
+        """Appends a range and returns its reference ID."""
+        ref_id = len(self._keys)
+        if base is None:
+            self._ids[key] = ref_id
+        self._keys.append(key)
+        self._mins.append(float(ref_min))
+        self._maxs.append(float(ref_max))
+        self._units.append(unit)
+        self._labels.append(f"{ref_min}-{ref_max}")
+        self._strata.append(stratum)
+        self._base.append(ref_id if base is None else base)
+        return ref_id
+    
+    def _compile_strata(self, base: int, ref: ReferenceRange, raw: Dict) -> None:
+        """Adds the sex-specific ranges and age bands of an exam and builds its interval tables."""
+        key, unit = self._keys[base], self._units[base]
+        
+        by_sex = {SEX_UNKNOWN: base, SEX_MALE: base, SEX_FEMALE: base}
+        if ref.gender_specific:
+            by_sex[SEX_MALE] = self._add(key, raw['male_min'], raw['male_max'], unit, SEX_LABELS[SEX_MALE], base)
+            by_sex[SEX_FEMALE] = self._add(key, raw['female_min'], raw['female_max'], unit, SEX_LABELS[SEX_FEMALE], base)
+        
+        bands = []
+        for band, raw_band in zip(ref.age_bands, raw.get('age_bands', [])):
+            sex = sex_code(band.sex)
+            stratum = _age_label(band.age_min, band.age_max)
+            if sex != SEX_UNKNOWN:
+                stratum = f"{SEX_LABELS[sex]}, {stratum}"
+            ref_id = self._add(key, raw_band['min'], raw_band['max'], unit, stratum, base)
+            end = band.age_max if band.age_max is not None else _AGE_SPAN
+            bands.append((band.age_min, end, sex, ref_id))
+        
+        breakpoints = sorted({0.0} | {b[0] for b in bands} | {b[1] for b in bands if b[1] < _AGE_SPAN})
+        for sex in (SEX_UNKNOWN, SEX_MALE, SEX_FEMALE):
+            self._ageless[(base, sex)] = by_sex[sex]
+            starts: List[float] = []
+            ids: List[int] = []
+            for start in breakpoints:
+                matches = [b for b in bands if b[0] <= start < b[1] and b[2] in (SEX_UNKNOWN, sex)]
+                # A band of this sex beats a band for both sexes; the first declared wins ties
+                specific = [b for b in matches if b[2] == sex and sex != SEX_UNKNOWN]
+                chosen = (specific or matches)[0][3] if matches else by_sex[sex]
+                if not ids or ids[-1] != chosen:
+                    starts.append(start)
+                    ids.append(chosen)
+            self._intervals[(base, sex)] = (starts, ids)
+    
+    def __len__(self) -> int:
+        return len(self._keys)
+    
+    def get_id(self, category: str, exam_name: str) -> Optional[int]:
+        """
+        Returns the reference ID of the default range of an exam.
+        
+        Args:
+            category: Exam category.
+            exam_name: Exam name.
+            
+        Returns:
+            Reference ID, or None if the exam has no reference range.
+        """
+        return self._ids.get((category, exam_name))
+    
+    def resolve(self, ref_id: int, sex: Any = None, age: Optional[float] = None) -> int:
+        """
+        Returns the reference ID of the range that applies to a patient.
+        
+        Args:
+            ref_id: Reference ID of the exam (any of its ranges).
+            sex: 'M'/'F' (see sex_code); anything else counts as unknown.
+            age: Age in years at the exam, or None if unknown.
+        
+        Returns:
+            Reference ID of the most specific matching range.
+        """
+        base = self._base[ref_id]
+        sex = sex_code(sex)
+        if age is None or age != age:
+            return self._ageless[(base, sex)]
+        starts, ids = self._intervals[(base, sex)]
+        return ids[bisect_right(starts, max(float(age), 0.0)) - 1]
+    
+    def resolve_many(self, ref_ids: Any, sexes: Any = None, ages: Any = None) -> np.ndarray:
+        """
+        Vectorized resolve over arrays of reference IDs, sexes and ages.
+        
+        Args:
+            ref_ids: Array-like of reference IDs.
+            sexes: Array-like of sexes (strings or sex codes), or None if unknown for all.
+            ages: Array-like of ages in years (NaN if unknown), or None if unknown for all.
+        
+        Returns:
+            Integer array of resolved reference IDs.
+        """
+        base = self.base_array[np.asarray(ref_ids, dtype=np.int64)]
+        sex = np.zeros(len(base), dtype=np.int64) if sexes is None else sex_codes(sexes)
+        table = base * 3 + sex
+        
+        resolved = self._ageless_array[table]
+        if ages is None:
+            return resolved
+        
+        age = np.asarray(ages, dtype=float)
+        known = ~np.isnan(age)
+        query = table[known] * _AGE_SPAN + np.clip(age[known], 0.0, _AGE_SPAN - 1)
+        resolved[known] = self._flat_ids[np.searchsorted(self._flat_keys, query, side='right') - 1]
+        return resolved
+    
+    def key(self, ref_id: int) -> Tuple[str, str]:
+        """Returns the (category, exam) pair of a reference ID."""
+        return self._keys[ref_id]
+    
+    def bounds(self, ref_id: int) -> Tuple[float, float]:
+        """Returns the (min, max) bounds of a reference ID."""
+        return self._mins[ref_id], self._maxs[ref_id]
+    
+    def unit(self, ref_id: int) -> str:
+        """Returns the unit of a reference ID."""
+        return self._units[ref_id]
+    
+    def label(self, ref_id: int) -> str:
+        """Returns the display label of a reference ID (e.g., "70.0-99.0")."""
+        return self._labels[ref_id]
+    
+    def stratum(self, ref_id: int) -> str:
+        """Returns the population of a reference ID (e.g., "Feminino", "70+ anos"); empty for default ranges."""
+        return self._strata[ref_id]
+    
+    def classify(self, value: float, ref_id: int) -> str:
+        """
+        Determines the status (BAIXO, NORMAL, ALTO) of a numeric value.
+        
+        Args:
+            value: Exam value.
+            ref_id: Reference ID.
+            
+        Returns:
+            String representing the status.
+        """
+        if value < self._mins[ref_id]:
+            return "BAIXO"
+        elif value > self._maxs[ref_id]:
+            return "ALTO"
+        return "NORMAL"
+
+# Process-wide index compiled from the default reference ranges
+REFERENCE_INDEX = ReferenceIndex(REFERENCE_RANGES)
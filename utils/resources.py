@@ -0,0 +1,41 @@
+"""
+Process-wide resources shared by every Streamlit session.
+"""
+import os
+from typing import Optional
+import streamlit as st
+
+from utils.history_store import ExamHistoryStore
+from utils.profile_store import ProfileStore, SQLiteProfileStore
+
+# Environment variable selecting the SQLite profile database; unset keeps per-session profiles
+PROFILE_DB_ENV = "LAB_EXAMS_PROFILE_DB"
+
+# Environment variable selecting the exam history database
+HISTORY_DB_ENV = "LAB_EXAMS_HISTORY_DB"
+DEFAULT_HISTORY_DB = os.path.join(os.path.expanduser("~"), ".lab_exams", "history.db")
+
+@st.cache_resource
+def get_profile_store() -> Optional[ProfileStore]:
+    """
+    Returns the shared profile store configured for this process.
+    
+    Returns:
+        SQLiteProfileStore if LAB_EXAMS_PROFILE_DB is set, otherwise None
+        (each session then keeps its own profiles in session state).
+    """
+    path = os.environ.get(PROFILE_DB_ENV)
+    if not path:
+        return None
+    return SQLiteProfileStore(path)
+
+
+@st.cache_resource
+def get_history_store() -> ExamHistoryStore:
+    """
+    Returns the shared exam history store.
+    
+    Returns:
+        ExamHistoryStore at LAB_EXAMS_HISTORY_DB, or ~/.lab_exams/history.db.
+    """
+    return ExamHistoryStore(os.environ.get(HISTORY_DB_ENV, DEFAULT_HISTORY_DB))
@@ -0,0 +1,232 @@
+"""
+Unit conversion between conventional units (as in REFERENCE_RANGES) and SI units.
+
+Results are stored in conventional units; conversions happen at the edges,
+when reading files sent in SI units and when showing results in the unit
+system chosen by the user. Factors and offsets are compiled per reference
+ID, so a column of values is converted with one fancy-indexed multiply-add.
+"""
+from typing import Any, Dict, Mapping, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data.defaults import SI_UNITS
+from utils.cache import stable_hash
+from utils.reference_index import REFERENCE_INDEX, ReferenceIndex
+
+# Unit systems: the conventional units of REFERENCE_RANGES and SI units
+UNIT_CONVENTIONAL, UNIT_SI = 'conventional', 'si'
+
+# Display names of the unit systems
+UNIT_SYSTEM_LABELS = {UNIT_CONVENTIONAL: "Convencional", UNIT_SI: "SI"}
+
+# Significant digits of converted values shown
+DISPLAY_DIGITS = 4
+
+# Decimals kept when values entered in SI units are stored in conventional units
+CANONICAL_DECIMALS = 4
+
+# Common ASCII spellings of units with a micro prefix
+_MICRO_SPELLINGS = {'umol/': 'µmol/', 'ug/': 'µg/', 'uu/': 'µu/', 'ul': 'µl'}
+
+# Unit code of rows without a unit, read as conventional
+_MISSING_UNIT = -2
+
+def normalize_unit(unit: Any) -> str:
+    """Returns a unit in a canonical spelling for comparison (lower case, no spaces, 'µ' for micro)."""
+    if not isinstance(unit, str):
+        return ""
+    text = unit.strip().lower().replace(" ", "").replace("μ", "µ")
+    for ascii_spelling, micro in _MICRO_SPELLINGS.items():
+        if text.startswith(ascii_spelling) or f"/{ascii_spelling}" in text:
+            text = text.replace(ascii_spelling, micro)
+    return text
+
+def format_value(value: float, digits: int = DISPLAY_DIGITS) -> str:
+    """Formats a converted value with the given significant digits, without exponent or trailing zeros."""
+    if value != value:
+        return "N/A"
+    return np.format_float_positional(value, precision=digits, unique=False, fractional=False, trim='-')
+
+class UnitRegistry:
+    """
+    Conversion factors between unit systems, compiled per reference ID.
+    
+    A value in conventional units converts to SI as value * factor + offset
+    (the offset is only used by affine scales such as HbA1c in mmol/mol).
+    Every range of an exam (sex- and age-specific ones included) shares its
+    factor, so arrays of resolved reference IDs index the factors directly.
+    """
+    
+    def __init__(self, conversions: Mapping[str, Mapping[str, Mapping[str, Any]]], index: ReferenceIndex) -> None:
+        """
+        Compile the conversion table.
+        
+        Args:
+            conversions: Mapping of category -> exam -> {'unit', 'factor', 'offset'}.
+            index: Reference index whose IDs the factors are indexed by.
+        
+        Raises:
+            ValueError: If an exam has no reference range or a factor is not positive.
+        """
+        self._index = index
+        self.fingerprint: str = stable_hash(conversions)
+        
+        factors = np.ones(len(index))
+        offsets = np.zeros(len(index))
+        si_units = index.unit_array.copy()
+        for category, exams in conversions.items():
+            for exam_name, spec in exams.items():
+                base = index.get_id(category, exam_name)
+                if base is None:
+                    raise ValueError(f"SI unit declared for unknown exam: {category} / {exam_name}")
+                if spec['factor'] <= 0:
+                    raise ValueError(f"Conversion factor must be positive: {category} / {exam_name}")
+                ids = index.base_array == base
+                factors[ids] = spec['factor']
+                offsets[ids] = spec.get('offset', 0.0)
+                si_units[ids] = spec['unit']
+        
+        self._factors: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+            UNIT_CONVENTIONAL: (np.ones(len(index)), np.zeros(len(index))),
+            UNIT_SI: (factors, offsets)
+        }
+        self._units: Dict[str, np.ndarray] = {UNIT_CONVENTIONAL: index.unit_array, UNIT_SI: si_units}
+        
+        # Normalized units numbered, so the units of a column are compared as integers
+        self._vocabulary: Dict[str, int] = {}
+        self._unit_codes: Dict[str, np.ndarray] = {
+            system: np.array([self._code(normalize_unit(unit)) for unit in units], dtype=np.int64)
+            for system, units in self._units.items()
+        }
+    
+    def _code(self, unit: str) -> int:
+        """Returns the vocabulary number of a normalized unit, adding it if new."""
+        return self._vocabulary.setdefault(unit, len(self._vocabulary))
+    
+    def _system(self, system: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the (factors, offsets) of a unit system."""
+        try:
+            return self._factors[system]
+        except KeyError:
+            raise ValueError(f"Unknown unit system: {system}") from None
+    
+    def unit(self, ref_id: int, system: str = UNIT_CONVENTIONAL) -> str:
+        """Returns the unit of a reference ID in a unit system."""
+        self._system(system)
+        return self._units[system][ref_id]
+    
+    def unit_array(self, system: str = UNIT_CONVENTIONAL) -> np.ndarray:
+        """Returns the units of every reference ID in a unit system, indexed by ID."""
+        self._system(system)
+        return self._units[system]
+    
+    def convert(self, values: Any, ref_ids: Any, system: str) -> np.ndarray:
+        """
+        Converts values from conventional units to a unit system.
+        
+        Args:
+            values: Array-like of values in conventional units.
+            ref_ids: Array-like of reference IDs (or one ID for all values).
+            system: Target unit system.
+        
+        Returns:
+            Float array of converted values.
+        """
+        factors, offsets = self._system(system)
+        ids = np.asarray(ref_ids, dtype=np.int64)
+        return np.asarray(values, dtype=float) * factors[ids] + offsets[ids]
+    
+    def to_conventional(self, values: Any, ref_ids: Any, system: str) -> np.ndarray:
+        """
+        Converts values from a unit system to conventional units.
+        
+        Args:
+            values: Array-like of values in the unit system.
+            ref_ids: Array-like of reference IDs (or one ID for all values).
+            system: Source unit system.
+        
+        Returns:
+            Float array of values in conventional units.
+        """
+        factors, offsets = self._system(system)
+        ids = np.asarray(ref_ids, dtype=np.int64)
+        return (np.asarray(values, dtype=float) - offsets[ids]) / factors[ids]
+    
+    def to_canonical(self, values: Any, ref_ids: Any, units: Any) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Converts values read with their own units (conventional or SI) to conventional units.
+        
+        Distinct unit strings are normalized once and compared as integers
+        with the conventional and SI units of each row's exam.
+        
+        Args:
+            values: Array-like of values.
+            ref_ids: Array-like of reference IDs.
+            units: Array-like of unit strings; missing units count as conventional.
+        
+        Returns:
+            (values, recognized): converted values (NaN where the unit is not
+            recognized) and a boolean array marking the recognized units.
+        """
+        ids = np.asarray(ref_ids, dtype=np.int64)
+        codes, uniques = pd.factorize(pd.Series(units, dtype=object))
+        normalized = [normalize_unit(unit) for unit in uniques]
+        # -1 marks units outside the vocabulary; missing values factorize to -1,
+        # which picks the trailing _MISSING_UNIT entry
+        unique_codes = np.array(
+            [self._vocabulary.get(unit, -1) if unit else _MISSING_UNIT for unit in normalized] + [_MISSING_UNIT],
+            dtype=np.int64
+        )
+        row_codes = unique_codes[codes]
+        
+        missing = row_codes == _MISSING_UNIT
+        conventional = missing | (row_codes == self._unit_codes[UNIT_CONVENTIONAL][ids])
+        si = ~conventional & (row_codes == self._unit_codes[UNIT_SI][ids])
+        
+        factors, offsets = self._factors[UNIT_SI]
+        values = np.asarray(values, dtype=float)
+        converted = np.where(si, (values - offsets[ids]) / factors[ids], values)
+        recognized = conventional | si
+        converted[~recognized] = np.nan
+        return converted, recognized
+    
+    def label(self, ref_id: int, system: str = UNIT_CONVENTIONAL) -> str:
+        """Returns the display label of a reference ID in a unit system (e.g., "3.885-5.494")."""
+        if system == UNIT_CONVENTIONAL:
+            return self._index.label(ref_id)
+        low, high = self.convert(np.array(self._index.bounds(ref_id)), ref_id, system)
+        return f"{format_value(low)}-{format_value(high)}"
+    
+    def convert_frame(self, df: pd.DataFrame, system: str) -> pd.DataFrame:
+        """
+        Converts the 'value' and 'unit' columns of a history frame to a unit system.
+        
+        Args:
+            df: Frame with 'category', 'exam' and 'value' columns, values in conventional units.
+            system: Target unit system.
+        
+        Returns:
+            Copy of the frame with converted values and units; exams without
+            reference range are left as they are.
+        """
+        self._system(system)
+        if df.empty or system == UNIT_CONVENTIONAL:
+            return df.copy()
+        
+        pairs = pd.MultiIndex.from_frame(df[['category', 'exam']])
+        uniques = pairs.unique()
+        lookup = np.array([self._index.get_id(category, exam) for category, exam in uniques], dtype=object)
+        ids = lookup[uniques.get_indexer(pairs)]
+        known = pd.notna(ids)
+        ids = np.where(known, ids, 0).astype(np.int64)
+        
+        out = df.copy()
+        out['value'] = np.where(known, self.convert(df['value'].to_numpy(), ids, system), df['value'].to_numpy())
+        if 'unit' in out:
+            out['unit'] = np.where(known, self._units[system][ids], df['unit'].to_numpy())
+        return out
+
+# Process-wide registry compiled from the default SI units
+UNIT_REGISTRY = UnitRegistry(SI_UNITS, REFERENCE_INDEX)